@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from enum import Enum
+from typing import Any, List, Tuple
+from aio_pika import Message
+
+
+class OverflowPolicy(str, Enum):
+    # Lose the new event, the caller never waits
+    DROP = "drop"
+    # Wait for room, the caller is slowed down to the broker's pace
+    BLOCK = "block"
+
+
+class EventBuffer:
+    """Bounded in-process queue of events published by a background task
+
+    `put` returns without a broker round trip. The drain task takes up to
+    `batch_size` events at a time and publishes them together, waiting for
+    their confirms once per batch when the publisher has a `flush`
+    (EventPublisher does).
+    """
+
+    def __init__(self, publisher: Any, max_size: int = 10000, batch_size: int = 100,
+                 overflow: OverflowPolicy | str = OverflowPolicy.DROP):
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.overflow = OverflowPolicy(overflow)
+        self.dropped = 0
+        self._queue: asyncio.Queue[Tuple[Message, str]] = asyncio.Queue(max_size)
+        self._drain_task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, message: Message, routing_key: str) -> bool:
+        """Queues an event, returns False if it was dropped"""
+        if self._drain_task is None:
+            self._drain_task = asyncio.create_task(self._drain())
+
+        if self.overflow == OverflowPolicy.BLOCK:
+            await self._queue.put((message, routing_key))
+            return True
+        try:
+            self._queue.put_nowait((message, routing_key))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logging.warning(f"Event buffer full, dropped event {routing_key} ({self.dropped} dropped so far)")
+            return False
+        return True
+
+    def _take_batch(self, first: Tuple[Message, str]) -> List[Tuple[Message, str]]:
+        batch = [first]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _publish(self, batch: List[Tuple[Message, str]]):
+        try:
+            for message, routing_key in batch:
+                await self.publisher.publish(message, routing_key=routing_key)
+            if hasattr(self.publisher, "flush"):
+                await self.publisher.flush()
+        except Exception as e:
+            logging.error(f"Failed to publish {len(batch)} buffered events: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _drain(self):
+        while True:
+            batch = self._take_batch(await self._queue.get())
+            await self._publish(batch)
+
+    async def flush(self):
+        """Waits until every event queued so far is published"""
+        if self._drain_task is not None:
+            await self._queue.join()
+
+    async def close(self, timeout: float | None = 30):
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Event buffer closed with {len(self)} events unpublished")
+        finally:
+            if self._drain_task is not None:
+                self._drain_task.cancel()
+                self._drain_task = None
@@ -1,44 +1,109 @@
-from typing import Any, Annotated, Callable, Type
+from typing import Any, Annotated, Callable, Sequence, Type
 from functools import wraps
 from pydantic import BaseModel, Field, ConfigDict
 import re
 import yaml
 import asyncio
-from aio_pika import Exchange, Channel
-from events_initialization import (
-    EventType, get_event_routing_key, MAX_RETRIES, get_event_queue_name,
-    create_event, create_event_exchange, create_attempt_queues_event
-)
-from message.creation import (
-    create_event_message, delete_event_message, notify_event_message, update_event_message
+from aio_pika import Exchange, Channel, Message
+from event_driven.events_initialization import EventType, MAX_RETRIES, get_event_queue_name
+from event_driven.message.creation import (
+    create_event_message, delete_event_message, notify_event_message, update_event_message,
+    EVENT_TYPE_HEADER, EVENT_KEY_HEADER
 )
 from pydantic import create_model
-from utils import all_except_event_key_optional_overrides, event_key_optional_overrides
+from event_driven.utils import all_except_event_key_optional_overrides, event_key_optional_overrides, get_event_key_value
+from event_driven.runtime import ServiceRuntime, get_runtime, runtime_for_file
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.requests import Request
 from starlette.responses import Response, JSONResponse
-import os
+from starlette.types import ASGIApp, Receive, Scope, Send
+from event_driven.event_buffer import EventBuffer, OverflowPolicy
+from event_driven.topology import Topology, TopologySyncResult, event_topology, sync_topology, topology_registry
+from event_driven.retry import DelayedRetry, retry_tiers_topology
+
+EVENT_MESSAGES = {
+    EventType.CREATE: create_event_message,
+    EventType.UPDATE: update_event_message,
+    EventType.DELETE: delete_event_message,
+}
 
 class SendEventMiddleware(BaseHTTPMiddleware):
+    """Publishes the events endpoints emitted with `emit_event`, off the request path
+
+    Events of responses with a status below 400 are queued in a bounded
+    EventBuffer and published in batches by a background task, so a request
+    never waits on the broker. When the buffer is full, overflow="drop" loses
+    the event and overflow="block" makes the request wait for room. The
+    buffer is flushed on application shutdown.
+
+    Publishes with `publisher`, or the publisher of the default ServiceRuntime,
+    which is started once the app's startup handlers have run. An app whose
+    publisher cannot start fails its startup instead of dropping every event.
+    """
+
+    def __init__(self, app: ASGIApp, publisher: Any | None = None, max_buffer: int = 10000,
+                 batch_size: int = 100, overflow: OverflowPolicy | str = OverflowPolicy.DROP):
+        super().__init__(app)
+        self.publisher = publisher
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.overflow = OverflowPolicy(overflow)
+        self.buffer: EventBuffer | None = None
+
+    async def get_buffer(self) -> EventBuffer:
+        if self.buffer is None:
+            # Resolved on first use, so the runtime may be initialized after the app is built
+            publisher = self.publisher
+            if publisher is None:
+                runtime = get_runtime()
+                await runtime.start()
+                publisher = runtime.exchange()
+            self.buffer = EventBuffer(publisher, self.max_buffer, self.batch_size, self.overflow)
+        return self.buffer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "lifespan":
+            await self.app(scope, self._flush_on_shutdown(receive), self._start_after_startup(send))
+            return
+        await super().__call__(scope, receive, send)
+
+    def _start_after_startup(self, send: Send) -> Send:
+        async def send_after_start(message):
+            # After the app's startup handlers, they may set up the runtime. An
+            # error here is reported by the app as a failed startup
+            if message["type"] == "lifespan.startup.complete":
+                await self.get_buffer()
+            await send(message)
+        return send_after_start
+
+    def _flush_on_shutdown(self, receive: Receive) -> Receive:
+        async def receive_with_flush():
+            message = await receive()
+            # Before the app's shutdown handlers run, they may close the publisher
+            if message["type"] == "lifespan.shutdown" and self.buffer is not None:
+                await self.buffer.close()
+            return message
+        return receive_with_flush
+
     async def dispatch(
         self, request: Request, call_next: RequestResponseEndpoint
     ) -> Response:
-        # Read .env[SERVICE_NAME]
-        service_name = os.getenv('SERVICE_NAME')
-        result = await call_next(request)
-        # Check if the result is base model and have __event_type__ field
-        if isinstance(result, BaseModel) and hasattr(result, '__event_type__'):
-            # Get event type from __event_type__ field
-            event_type = result.__event_type__
-            if event_type == EventType.CREATE:
-                message = create_event_message(service_name, 0, result.model_dump())
-            elif event_type == EventType.UPDATE:
-                message = update_event_message(service_name, 0, result.model_dump())
-            elif event_type == EventType.DELETE:
-                message = delete_event_message(service_name, 0, result.model_dump())
-                
-            
-        
+        response = await call_next(request)
+        events = getattr(request.state, 'events', None)
+        if events and response.status_code < 400:
+            buffer = await self.get_buffer()
+            for event, event_type in events:
+                message, routing_key = event.build_event(event_type, event.event_runtime())
+                await buffer.put(message, routing_key)
+        return response
+
+def emit_event(request: Request, event: BaseModel, event_type: EventType):
+    """Marks a create, update or delete event to be published by SendEventMiddleware after the response"""
+    if event_type not in EVENT_MESSAGES:
+        raise ValueError(f"Only create, update and delete events can be emitted, got {event_type}")
+    if not hasattr(request.state, 'events'):
+        request.state.events = []
+    request.state.events.append((event, event_type))
 
 
 class NotifyEvent(BaseModel):
@@ -66,64 +131,83 @@ def read_service_config(config_path: str):
         return yaml.safe_load(f)
 
 def get_event_name_wrapper(override_name: str | None = None):
+    # Computed once per class, it is part of every publish
+    names = {}
+
     def get_event_name(cls):
-        # Return name in snake_case format
-        name = override_name if override_name is not None else cls.__name__
-        name = re.sub('([a-z0-9])([A-Z])', r'\1_\2', name)
-        return name.lower()
+        name = names.get(cls)
+        if name is None:
+            # Return name in snake_case format
+            name = override_name if override_name is not None else cls.__name__
+            name = names[cls] = re.sub('([a-z0-9])([A-Z])', r'\1_\2', name).lower()
+        return name
 
     return get_event_name
 
-async def on_update(self, events_exchange: Exchange, config_path: str= "config.yaml"):       
-    config = self.read_service_config(config_path)
-        
-    routing_key = get_event_routing_key(EventType.UPDATE, self.get_event_name())
-    message_data = self.model_dump()
-        
+def event_headers(self, event_type: EventType) -> dict:
+    headers = {EVENT_TYPE_HEADER: event_type.value}
+    event_key = get_event_key_value(self)
+    if event_key is not None:
+        headers[EVENT_KEY_HEADER] = str(event_key)
+    return headers
+
+def event_runtime(cls, config_path: str | None = None) -> ServiceRuntime:
+    """Runtime to publish with: read from an explicit config file, else bound to the class, else the process default"""
+    if config_path is not None:
+        return runtime_for_file(config_path)
+    runtime = getattr(cls, '__event_runtime__', None)
+    return runtime if runtime is not None else get_runtime()
+
+def bind_runtime(cls, runtime: ServiceRuntime | None):
+    cls.__event_runtime__ = runtime
+
+def build_event(self, event_type: EventType, runtime: ServiceRuntime) -> tuple[Message, str]:
+    """Message and routing key of this object's create, update or delete event"""
+    routing_key = runtime.routing_key(event_type, self.get_event_name())
     # Add necessary headers for event_store
-    message = update_event_message(config['service_name'], 0, message_data)
-        
-    await events_exchange.publish(
-        message,
-        routing_key=routing_key
-    )
+    message = EVENT_MESSAGES[event_type](runtime.service_name, 0, self.model_dump(), self.event_headers(event_type))
+    return message, routing_key
 
-async def on_create(self, events_exchange: Exchange, config_path: str= "config.yaml"):
-    config = self.read_service_config(config_path)
-        
-    routing_key = get_event_routing_key(EventType.CREATE, self.get_event_name())
-    message = self.model_dump()
-        
-    # Add necessary headers for event_store
-    message = create_event_message(config['service_name'], 0, message)
-        
-    await events_exchange.publish(
-        message,
-        routing_key=routing_key
-    )
+async def on_update(self, events_exchange: Exchange | None = None, config_path: str | None = None):
+    runtime = self.event_runtime(config_path)
+    message, routing_key = self.build_event(EventType.UPDATE, runtime)
 
-async def on_delete(self, events_exchange: Exchange, config_path: str= "config.yaml"):
-    config = self.read_service_config(config_path)
-        
-    routing_key = get_event_routing_key(EventType.DELETE, self.get_event_name())
-    message = self.model_dump()
-        
-    message = delete_event_message(config['service_name'], 0, message)
-        
-    await events_exchange.publish(
-        message,
-        routing_key=routing_key
-    )
+    await runtime.publish(message, routing_key, events_exchange)
+
+async def on_create(self, events_exchange: Exchange | None = None, config_path: str | None = None):
+    runtime = self.event_runtime(config_path)
+    message, routing_key = self.build_event(EventType.CREATE, runtime)
+
+    await runtime.publish(message, routing_key, events_exchange)
+
+async def on_delete(self, events_exchange: Exchange | None = None, config_path: str | None = None):
+    runtime = self.event_runtime(config_path)
+    message, routing_key = self.build_event(EventType.DELETE, runtime)
+
+    await runtime.publish(message, routing_key, events_exchange)
+
+def add_to_outbox(self, session, event_type: EventType, config_path: str | None = None):
+    """Writes this object's event to the outbox in `session`'s transaction
 
-async def subscribe_to_events(cls, channel: Channel, events_exchange: Exchange, callback: Callable, event_type: EventType, config_path: str= "config.yaml"):
-    config = cls.read_service_config(config_path)
+    Nothing is sent to RabbitMQ here, an OutboxRelay publishes the event once
+    the transaction commits.
+    """
+    from event_driven.outbox import add_to_outbox as add_message
+
+    message, routing_key = self.build_event(event_type, self.event_runtime(config_path))
+    return add_message(session, message, routing_key)
+
+async def subscribe_to_events(cls, channel: Channel, events_exchange: Exchange, callback: Callable, event_type: EventType, config_path: str | None = None,
+                              retry: DelayedRetry | None = None):
+    """Consumes one queue until cancelled. Subscriber consumes many over shared channels"""
+    service_name = cls.event_runtime(config_path).service_name
 
-    from common_model.message.processing import process_message
+    from event_driven.message.processing import process_message
 
     async def process_message_wrapper(message):
-        await process_message(events_exchange, message, callback, cls, config['service_name'], MAX_RETRIES)
+        await process_message(events_exchange, message, callback, cls, service_name, MAX_RETRIES, retry=retry)
     
-    queue_name = get_event_queue_name(event_type, cls.get_event_name(), config['service_name'])
+    queue_name = get_event_queue_name(event_type, cls.get_event_name(), service_name)
     queue = await channel.get_queue(queue_name)
     await queue.consume(process_message_wrapper)
     
@@ -135,50 +219,55 @@ async def subscribe_to_events(cls, channel: Channel, events_exchange: Exchange,
 def on_notify(event_name: str):
     def decorator(func):
         @wraps(func)
-        async def wrapper(self, events_exchange: Exchange, *args, config_path: str= "config.yaml", **kwargs):
+        async def wrapper(self, events_exchange: Exchange | None, *args, config_path: str | None = None, **kwargs):
             result = await func(self, *args, **kwargs)
             
-            config = self.read_service_config(config_path)
+            runtime = self.event_runtime(config_path)
             
-            routing_key = get_event_routing_key(EventType.NOTIFY, self.get_event_name())
+            routing_key = runtime.routing_key(EventType.NOTIFY, self.get_event_name())
 
-            message = notify_event_message(config['service_name'], 0, event_name, result)
+            message = notify_event_message(runtime.service_name, 0, event_name, result, self.event_headers(EventType.NOTIFY))
             
-            await events_exchange.publish(
-                message,
-                routing_key=routing_key
-            )
+            await runtime.publish(message, routing_key, events_exchange)
             
             return result
         return wrapper
     return decorator
 
-async def sync_schema(cls, channel, event_types: set[EventType] | None = None, config_path: str= "config.yaml"):
+def schema_topology(cls, event_types: set[EventType] | None = None, config_path: str | None = None,
+                    retry_tiers: Sequence[int] | None = None) -> Topology:
+    """Exchanges, queues and bindings `sync_schema` declares for this class"""
+    service_to = cls.event_runtime(config_path).service_name
+    # Define event types to create. If None - all types are created
+    types_to_create = event_types if event_types is not None else set(EventType)
+    if retry_tiers is None:
+        return event_topology(cls.get_event_name(), service_to, types_to_create, MAX_RETRIES)
+    # Shared delay queues replace the attempt queues of every event type
+    return event_topology(cls.get_event_name(), service_to, types_to_create, 0).merge(retry_tiers_topology(retry_tiers))
+
+async def sync_schema(cls, channel, event_types: set[EventType] | None = None, config_path: str | None = None,
+                      fingerprint_path: str | None = None, force: bool = False,
+                      retry_tiers: Sequence[int] | None = None) -> TopologySyncResult:
     """Creates necessary exchanges and queues for specified event types
     
     Args:
-        channel: RabbitMQ channel
-        service_to: Service name to send events to
+        channel: RabbitMQ channel, or a list of channels to declare over concurrently
         event_types: Set of event types to create. If None - all types are created
+        config_path: Config file to read the service name from, instead of the class runtime
+        fingerprint_path: File caching the fingerprint of the last declared topology, declaring is skipped while it matches
+        force: Declare even if the fingerprint matches
+        retry_tiers: Declare these shared delay queues (see DelayedRetry) instead of attempt queues
     """
-    service_to = cls.read_service_config(config_path)['service_name']
+    return await sync_topology(channel, cls.schema_topology(event_types, config_path, retry_tiers), fingerprint_path, force)
 
-    # Create exchange
-    await create_event_exchange(channel)
-    
-    # Define event types to create
-    types_to_create = event_types if event_types is not None else set(EventType)
-
-    # For each selected event type, create queues
-    for event_type in types_to_create:
-        await create_event(
-            channel=channel,
-            entity=cls.get_event_name(),
-            service_to=service_to,
-            event_type=event_type
-        )
-
-        await create_attempt_queues_event(channel, event_type, cls.get_event_name(), service_to, MAX_RETRIES)
+async def sync_schemas(channels, event_classes: list[type[BaseModel]], event_types: set[EventType] | None = None,
+                       config_path: str | None = None, fingerprint_path: str | None = None,
+                       force: bool = False, retry_tiers: Sequence[int] | None = None) -> TopologySyncResult:
+    """`sync_schema` of many event classes as one topology, declared in a single concurrent pass"""
+    topology = Topology()
+    for event_class in event_classes:
+        topology.merge(event_class.schema_topology(event_types, config_path, retry_tiers))
+    return await sync_topology(channels, topology, fingerprint_path, force)
 
 def generate_crud_classes(base_class: type[BaseModel]):
     module = base_class.__module__
@@ -224,21 +313,34 @@ def generate_crud_classes(base_class: type[BaseModel]):
     
     return CreateModel, UpdateModel, DeleteModel, ReadModel
 
-def event_object(override_name: str | None = None) -> Callable[[Type[BaseModel]], Type[BaseModel]]:
+def event_object(override_name: str | None = None, runtime: ServiceRuntime | None = None) -> Callable[[Type[BaseModel]], Type[BaseModel]]:
     def event_object_internals(cls: Type[BaseModel]) -> Type[BaseModel]:
-        """Decorator for event objects that validates they have an event key field"""
+        """Decorator for event objects that validates they have an event key field
+
+        Events are published with `runtime`, or the process default runtime when None.
+        """
         # Add key to check event type
         cls.__annotations__['__event_type__'] = EventType
         setattr(cls, '__event_type__', Field(..., exclude=True))
         # Add methods to the class
         setattr(cls, 'read_service_config', staticmethod(read_service_config))
         setattr(cls, 'get_event_name', classmethod(get_event_name_wrapper(override_name)))
+        # Generated CRUD classes keep the runtime bound to their base
+        if runtime is not None or not hasattr(cls, '__event_runtime__'):
+            setattr(cls, '__event_runtime__', runtime)
+        setattr(cls, 'event_runtime', classmethod(event_runtime))
+        setattr(cls, 'bind_runtime', classmethod(bind_runtime))
+        setattr(cls, 'event_headers', event_headers)
+        setattr(cls, 'build_event', build_event)
         setattr(cls, 'on_update', on_update)
         setattr(cls, 'on_create', on_create)
         setattr(cls, 'on_delete', on_delete)
+        setattr(cls, 'add_to_outbox', add_to_outbox)
         setattr(cls, 'on_notify', staticmethod(on_notify))
         setattr(cls, 'subscribe_to_events', classmethod(subscribe_to_events))
+        setattr(cls, 'schema_topology', classmethod(schema_topology))
         setattr(cls, 'sync_schema', classmethod(sync_schema))
 
+        topology_registry.add_event_object(cls)
         return cls
     return event_object_internals
\ No newline at end of file
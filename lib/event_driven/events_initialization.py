@@ -19,6 +19,11 @@ MAX_QUEUE_SIZE = 100 * 1024 * 1024
 # Max number of messages in queue
 MAX_QUEUE_LENGTH = 10000
 
+# Highest priority to pass as max_priority when opting a task queue into
+# priorities (x-max-priority). RabbitMQ keeps a sub-queue per level, so keep
+# it small
+MAX_TASK_PRIORITY = 10
+
 class EventType(Enum):
     CREATE = "create"
     UPDATE = "update"
@@ -45,6 +50,13 @@ def get_event_dead_queue_name(event_type: EventType, entity: str, service_to: st
 def get_event_routing_key(event_type: EventType, entity: str):
     return f"routing.event.{event_type.value}.{entity}.#"
 
+def parse_event_routing_key(routing_key: str) -> tuple[str, str] | None:
+    """Returns (event_type, entity) of an event routing key, None for other keys"""
+    parts = routing_key.split(".")
+    if len(parts) < 4 or parts[0] != "routing" or parts[1] != "event":
+        return None
+    return parts[2], parts[3]
+
 def get_dead_event_routing_key(event_type: EventType, entity: str, service_to: str):
     return f"dead.routing.{event_type.value}.{entity}.to.{service_to}"
 
@@ -60,6 +72,17 @@ def get_task_dead_queue_name(action: str, entity: str):
 def get_task_dead_routing_key(action: str, entity: str):
     return f"dead.routing.{action}.{entity}"
 
+def get_named_task_routing_key(task_name: str):
+    # task.exchange is direct: the service binds this key for each task it
+    # loaded, to the task's dedicated queue or else to the shared tasks queue
+    return f"routing.task.{task_name}"
+
+def get_dedicated_task_queue_name(task_name: str):
+    return f"tasks.{task_name}"
+
+def get_dedicated_task_routing_key(task_name: str):
+    return f"routing.dedicated.{task_name}"
+
 def get_event_store_queue_name():
     return "event.store"
 
@@ -158,7 +181,16 @@ async def create_attempt_queues_task(channel, action: str, entity: str, attempts
         })
         await queue.bind(task_exchange, routing_key)
 
-async def create_task(channel, action: str, entity: str):
+def task_queue_arguments(max_priority: int | None = None) -> dict:
+    """Arguments enabling priorities on a task queue, none by default
+
+    Queue arguments cannot change after declaration: redeclaring an existing
+    queue with another x-max-priority fails with PRECONDITION_FAILED, so
+    priorities are opt-in and need the queue deleted first.
+    """
+    return {'x-max-priority': max_priority} if max_priority else {}
+
+async def create_task(channel, action: str, entity: str, max_priority: int | None = None):
     queue_name = get_task_queue_name(action, entity)
     routing_key = get_task_routing_key(action, entity)
 
@@ -182,7 +214,8 @@ async def create_task(channel, action: str, entity: str):
             'x-message-ttl': QUEUE_MESSAGE_TTL,
             'x-max-length': MAX_QUEUE_LENGTH,
             'x-max-length-bytes': MAX_QUEUE_SIZE,
-            'x-overflow': 'reject-publish'
+            'x-overflow': 'reject-publish',
+            **task_queue_arguments(max_priority)
         }
     )
 
@@ -9,3 +9,13 @@ class TechnicalException(Exception): # NACK events
 
 class ExternalServiceException(TechnicalException):
     pass
+
+class TaskFailedException(Exception): # Raised by submit_task when the task fails
+    def __init__(self, task_name: str, error: str | None, task_id: str | None = None):
+        super().__init__(f"Task {task_name} failed: {error}")
+        self.task_name = task_name
+        self.error = error
+        self.task_id = task_id
+
+class PublishException(TechnicalException): # Broker did not confirm a publish
+    pass
@@ -0,0 +1,144 @@
+import gzip
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional, json is the fallback for decoding
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional, MessagePack is unavailable without it
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional, zstd is unavailable without it
+    zstandard = None
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+GZIP_ENCODING = "gzip"
+ZSTD_ENCODING = "zstd"
+
+# Below this, compression costs more CPU than it saves on the wire
+DEFAULT_COMPRESS_THRESHOLD = 4096
+
+
+class CodecError(ValueError):
+    """Body in a format or encoding this process cannot read or write"""
+
+
+def _json_dumps(value: Any) -> bytes:
+    # Not orjson: it rejects non-str keys json.dumps accepts, and would change
+    # the bytes existing producers send
+    return json.dumps(value).encode()
+
+
+def _json_loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class CodecRegistry:
+    """Serializers by content_type and compressors by content_encoding
+
+    Consumers decode with the content_type and content_encoding of each
+    message, so producers can change format without coordinating, as long
+    as every consumer has the codecs they use.
+    """
+
+    def __init__(self):
+        self.serializers: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {}
+        self.compressors: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {}
+
+    def register_serializer(self, content_type: str, dumps: Callable[[Any], bytes], loads: Callable[[bytes], Any]):
+        self.serializers[content_type] = (dumps, loads)
+
+    def register_compressor(self, content_encoding: str, compress: Callable[[bytes], bytes],
+                            decompress: Callable[[bytes], bytes]):
+        self.compressors[content_encoding] = (compress, decompress)
+
+    def serializer(self, content_type: str):
+        try:
+            return self.serializers[content_type]
+        except KeyError:
+            raise CodecError(f"No serializer for content type {content_type}") from None
+
+    def compressor(self, content_encoding: str):
+        try:
+            return self.compressors[content_encoding]
+        except KeyError:
+            raise CodecError(f"No compressor for content encoding {content_encoding}") from None
+
+    def encode(self, value: Any, content_type: str = JSON_CONTENT_TYPE, compression: str | None = None,
+               compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD) -> Tuple[bytes, str | None]:
+        """Body and content_encoding (None when left uncompressed) of `value`"""
+        dumps, _ = self.serializer(content_type)
+        body = dumps(value)
+        if compression is None or len(body) < compress_threshold:
+            return body, None
+        compress, _ = self.compressor(compression)
+        return compress(body), compression
+
+    def decode(self, body: bytes, content_type: str | None = JSON_CONTENT_TYPE,
+               content_encoding: str | None = None) -> Any:
+        if content_encoding:
+            _, decompress = self.compressor(content_encoding)
+            try:
+                body = decompress(body)
+            except Exception as e:
+                # Each library has its own errors (EOFError, zlib.error, ZstdError)
+                raise CodecError(f"Corrupt {content_encoding} body: {e}") from e
+        # Messages without a content type predate this registry and are JSON
+        _, loads = self.serializer(content_type or JSON_CONTENT_TYPE)
+        return loads(body)
+
+
+codecs = CodecRegistry()
+codecs.register_serializer(JSON_CONTENT_TYPE, _json_dumps, _json_loads)
+codecs.register_compressor(GZIP_ENCODING, lambda data: gzip.compress(data, compresslevel=6), gzip.decompress)
+if msgpack is not None:
+    codecs.register_serializer(MSGPACK_CONTENT_TYPE, msgpack.packb, lambda data: msgpack.unpackb(data, raw=False))
+if zstandard is not None:
+    codecs.register_compressor(
+        ZSTD_ENCODING,
+        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+        # Frames written by compress() carry their content size, no max_output_size needed
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+
+@dataclass(frozen=True)
+class WireFormat:
+    """How producers encode message bodies"""
+    content_type: str = JSON_CONTENT_TYPE
+    compression: str | None = None
+    compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD
+
+    def __post_init__(self):
+        # Fail at configuration time rather than on the first publish
+        codecs.serializer(self.content_type)
+        if self.compression is not None:
+            codecs.compressor(self.compression)
+
+    def encode(self, value: Any) -> Tuple[bytes, str | None]:
+        return codecs.encode(value, self.content_type, self.compression, self.compress_threshold)
+
+
+# Plain JSON stays the default, consumers that predate codecs can read it
+_default_wire_format = WireFormat()
+
+
+def get_wire_format() -> WireFormat:
+    return _default_wire_format
+
+
+def set_wire_format(wire_format: WireFormat) -> WireFormat:
+    """Sets the format of messages created without an explicit one"""
+    global _default_wire_format
+    _default_wire_format = wire_format
+    return wire_format
@@ -1,8 +1,13 @@
 from aio_pika import Message
-import json
 import uuid
+from event_driven.message.codecs import WireFormat, get_wire_format
 
-def base_message(body: dict, producer_app: str, attempt: int, additional_headers: dict|None = None, correlation_id: str|None = None) -> Message:
+# Headers describing the event, indexed by the event store
+EVENT_TYPE_HEADER = "x-event-type"
+EVENT_KEY_HEADER = "x-event-key"
+
+def base_message(body: dict, producer_app: str, attempt: int, additional_headers: dict|None = None, correlation_id: str|None = None, priority: int|None = None, wire_format: WireFormat|None = None) -> Message:
+    """Message with `body` encoded in `wire_format`, the process default (set_wire_format) when None"""
     headers = {
         "x-attempt": attempt
     }
@@ -12,30 +17,33 @@ def base_message(body: dict, producer_app: str, attempt: int, additional_headers
     if not correlation_id:
         correlation_id = str(uuid.uuid4())
 
-    return Message(body=json.dumps(body).encode(), app_id=producer_app, correlation_id=correlation_id, headers=headers)
+    wire_format = wire_format or get_wire_format()
+    encoded, content_encoding = wire_format.encode(body)
+    return Message(body=encoded, content_type=wire_format.content_type, content_encoding=content_encoding, app_id=producer_app, correlation_id=correlation_id, headers=headers, priority=priority)
 
-def task_message(producer_app: str, attempt: int, task_name: str, arguments: dict, additional_headers: dict|None = None, correlation_id: str|None = None) -> Message:
+def task_message(producer_app: str, attempt: int, task_name: str, arguments: dict, additional_headers: dict|None = None, correlation_id: str|None = None, priority: int|None = None, wire_format: WireFormat|None = None) -> Message:
+    """Task message. `priority` (0 to MAX_TASK_PRIORITY, higher first) only takes effect on priority-enabled queues"""
     body = {
         "task_name": task_name,
         "arguments": arguments
     }
-    return base_message(body, producer_app, attempt, additional_headers, correlation_id)
+    return base_message(body, producer_app, attempt, additional_headers, correlation_id, priority, wire_format)
 
-def event_message(producer_app: str, attempt: int, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None) -> Message:
-    return base_message(payload, producer_app, attempt, additional_headers, correlation_id)
+def event_message(producer_app: str, attempt: int, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None, wire_format: WireFormat|None = None) -> Message:
+    return base_message(payload, producer_app, attempt, additional_headers, correlation_id, wire_format=wire_format)
 
-def notify_event_message(producer_app: str, attempt: int, event_name: str, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None) -> Message:
+def notify_event_message(producer_app: str, attempt: int, event_name: str, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None, wire_format: WireFormat|None = None) -> Message:
     payload["event_name"] = event_name
-    return event_message(producer_app, attempt, payload, additional_headers, correlation_id)
+    return event_message(producer_app, attempt, payload, additional_headers, correlation_id, wire_format)
 
-def create_event_message(producer_app: str, attempt: int, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None) -> Message:
-    return event_message(producer_app, attempt, payload, additional_headers, correlation_id)
+def create_event_message(producer_app: str, attempt: int, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None, wire_format: WireFormat|None = None) -> Message:
+    return event_message(producer_app, attempt, payload, additional_headers, correlation_id, wire_format)
 
-def delete_event_message(producer_app: str, attempt: int, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None) -> Message:
-    return event_message(producer_app, attempt, payload, additional_headers, correlation_id)
+def delete_event_message(producer_app: str, attempt: int, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None, wire_format: WireFormat|None = None) -> Message:
+    return event_message(producer_app, attempt, payload, additional_headers, correlation_id, wire_format)
 
-def update_event_message(producer_app: str, attempt: int, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None) -> Message:
-    return event_message(producer_app, attempt, payload, additional_headers, correlation_id)
+def update_event_message(producer_app: str, attempt: int, payload: dict, additional_headers: dict|None = None, correlation_id: str|None = None, wire_format: WireFormat|None = None) -> Message:
+    return event_message(producer_app, attempt, payload, additional_headers, correlation_id, wire_format)
 
 
 
@@ -1,20 +1,41 @@
-import json
 from aio_pika import IncomingMessage, Exchange, Message
 from pydantic import BaseModel, ValidationError
 from typing import Type, Callable
 from event_driven.exceptions import BusinessException, TechnicalException, ModelException
-from event_driven.events_initialization import routing_key_to_attempt_n_routing_key
+from event_driven.events_initialization import (
+    EventType, get_event_queue_name, parse_event_routing_key, routing_key_to_attempt_n_routing_key
+)
+from event_driven.retry import ORIGINAL_ROUTING_KEY_HEADER, DelayedRetry
+from event_driven.message.codecs import codecs
 import logging
 
-async def process_message(exchange: Exchange, message: IncomingMessage, handler: Callable, model_cls: Type[BaseModel], service_name: str, max_attempts: int = 3):
+def event_consumer_queue_name(routing_key: str, service_name: str) -> str:
+    """Queue of `service_name` that receives events published with `routing_key`"""
+    parsed = parse_event_routing_key(routing_key)
+    if parsed is None:
+        raise ValueError(f"Not an event routing key: {routing_key}")
+    event_type, entity = parsed
+    return get_event_queue_name(EventType(event_type), entity, service_name)
+
+async def process_message(exchange: Exchange, message: IncomingMessage, handler: Callable, model_cls: Type[BaseModel], service_name: str, max_attempts: int = 3,
+                          retry: DelayedRetry | None = None, queue_name: str | None = None):
+    """Runs `handler` on the message, retrying technical failures after a delay
+
+    Retries go through the shared delay tiers of `retry` when given, back to
+    `queue_name` (by default the service's queue of the event), else through
+    the attempt.N queues of the event.
+    """
     # Validate message model
     try:
-        # Decode message body from bytes to dict
-        message_dict = json.loads(message.body.decode())
+        # Decode message body with the format and compression the producer declared
+        message_dict = codecs.decode(message.body, message.content_type, message.content_encoding)
         model = model_cls.model_validate(message_dict)
     except ValidationError as e:
         await message.ack()
         raise ModelException(f"Invalid message model: {e}")
+    except ValueError as e:
+        await message.ack()
+        raise ModelException(f"Undecodable message body: {e}")
 
     # Process message
     try:
@@ -54,6 +75,14 @@ async def process_message(exchange: Exchange, message: IncomingMessage, handler:
             app_id=message.app_id
         )
 
+        if retry is not None:
+            # A retried message comes back addressed to its queue, the header has the key it was published with
+            routing_key = message.headers.get(ORIGINAL_ROUTING_KEY_HEADER) or message.routing_key
+            target_queue = queue_name or event_consumer_queue_name(routing_key, service_name)
+            await retry.schedule(new_message, routing_key, target_queue, current_attempt)
+            await message.ack()
+            return
+
         routing_key = routing_key_to_attempt_n_routing_key(message.routing_key, current_attempt, service_name)
         # Publish message to waiting queue. It will be retried after delay
         await exchange.publish(new_message, routing_key=routing_key)
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, List
+from aio_pika import Message
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Index, Integer, JSON, LargeBinary, SmallInteger, String, delete, select, update
+)
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import declarative_base
+from event_driven.events_initialization import EVENT_EXCHANGE
+from event_driven.publisher import EventPublisher
+
+OutboxBase = declarative_base()
+
+
+class OutboxMessage(OutboxBase):
+    """A message waiting in the caller's database to be published"""
+    __tablename__ = 'event_outbox'
+
+    # Relayed in id order over one channel, so events of one producer keep
+    # their order
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    exchange = Column(String, nullable=False)
+    routing_key = Column(String, nullable=False)
+    correlation_id = Column(String, nullable=True)
+    app_id = Column(String, nullable=True)
+    content_type = Column(String, nullable=True)
+    # Compressed bodies are unreadable without their encoding
+    content_encoding = Column(String, nullable=True)
+    priority = Column(SmallInteger, nullable=True)
+    delivery_mode = Column(SmallInteger, nullable=True)
+    headers = Column(JSON, nullable=True)
+    body = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        # Only the unsent rows are scanned by the relay, keep that index small
+        Index("ix_event_outbox_unsent", "id", postgresql_where=sent_at.is_(None), sqlite_where=sent_at.is_(None)),
+    )
+
+    def to_message(self) -> Message:
+        return Message(body=self.body, content_type=self.content_type, content_encoding=self.content_encoding,
+                       priority=self.priority, delivery_mode=self.delivery_mode, app_id=self.app_id,
+                       correlation_id=self.correlation_id, headers=self.headers)
+
+
+def outbox_row(message: Message, routing_key: str, exchange: str = EVENT_EXCHANGE) -> OutboxMessage:
+    return OutboxMessage(
+        exchange=exchange,
+        routing_key=routing_key,
+        correlation_id=message.correlation_id,
+        app_id=message.app_id,
+        content_type=message.content_type,
+        content_encoding=message.content_encoding,
+        priority=message.priority,
+        delivery_mode=int(message.delivery_mode) if message.delivery_mode is not None else None,
+        headers=dict(message.headers or {}),
+        body=message.body,
+    )
+
+
+def add_to_outbox(session: Any, message: Message, routing_key: str, exchange: str = EVENT_EXCHANGE) -> OutboxMessage:
+    """Adds `message` to the outbox in `session`'s transaction
+
+    Works with sync and async sessions. The message is published only if the
+    transaction commits.
+    """
+    row = outbox_row(message, routing_key, exchange)
+    session.add(row)
+    return row
+
+
+class OutboxRelay:
+    """Publishes committed outbox rows in batches and marks them sent
+
+    A batch is published with confirms and marked sent in the transaction that
+    selected it. If any publish of the batch is refused, the transaction rolls
+    back and the whole batch is published again, so delivery is at least once.
+    Rows are locked with SKIP LOCKED on Postgres, several relays can share a
+    table, but then batches are published side by side and only the order
+    within a batch holds.
+
+    `publisher` is an EventPublisher, or anything with the same `publish`
+    and `flush`. Its flush reports failures since the previous flush, so the
+    relay should be its only user. RabbitMQ keeps the order of messages on one
+    channel only, so an EventPublisher must have `pool_size=1`.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession], publisher: Any,
+                 batch_size: int = 500, poll_interval: float = 0.5):
+        if isinstance(publisher, EventPublisher) and publisher.pool_size != 1:
+            raise ValueError(f"OutboxRelay needs an EventPublisher with pool_size=1 to keep the id order, got {publisher.pool_size}")
+        self.session_maker = session_maker
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+    async def relay_once(self) -> int:
+        """Publishes one batch, returns the number of rows sent"""
+        async with self.session_maker() as session, session.begin():
+            result = await session.execute(
+                select(OutboxMessage)
+                .where(OutboxMessage.sent_at.is_(None))
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows: List[OutboxMessage] = list(result.scalars())
+            if not rows:
+                return 0
+
+            for row in rows:
+                await self.publisher.publish(row.to_message(), row.routing_key, row.exchange)
+            await self.publisher.flush()
+
+            await session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_([row.id for row in rows]))
+                .values(sent_at=datetime.now(timezone.utc))
+            )
+        return len(rows)
+
+    async def run(self):
+        """Relays until cancelled, polling only when the outbox is drained"""
+        while True:
+            try:
+                sent = await self.relay_once()
+            except Exception as e:
+                logging.warning(f"Outbox relay failed, retrying: {e}")
+                sent = 0
+            if sent < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def purge_sent(self, older_than: timedelta) -> int:
+        """Deletes rows sent more than `older_than` ago"""
+        cutoff = datetime.now(timezone.utc) - older_than
+        async with self.session_maker() as session, session.begin():
+            result = await session.execute(
+                delete(OutboxMessage).where(OutboxMessage.sent_at < cutoff)
+            )
+        return result.rowcount
@@ -0,0 +1,140 @@
+import asyncio
+import itertools
+import logging
+from typing import Dict, List, Set
+from aio_pika import Message, connect_robust
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractExchange
+from event_driven.events_initialization import EVENT_EXCHANGE
+from event_driven.exceptions import PublishException
+
+
+class EventPublisher:
+    """Publishes with publisher confirms over a small pool of channels
+
+    `publish` returns once the message is handed to a channel, with a future
+    resolved when the broker confirms it, so many publishes are in flight at
+    once instead of each waiting a round trip. `flush` waits for everything
+    published so far and raises if the broker refused any of it.
+    `publish_confirmed` waits for one message, and its failure is raised to
+    that caller alone instead of being kept for `flush`.
+
+    `publish` matches `Exchange.publish`, so a publisher can be passed to
+    `on_create`, `on_update`, `on_delete` and notify methods in place of an
+    exchange.
+    """
+
+    def __init__(self, url: str | None = None, connection: AbstractConnection | None = None,
+                 pool_size: int = 4, max_pending: int = 1000, exchange_name: str = EVENT_EXCHANGE):
+        if url is None and connection is None:
+            raise ValueError("Either url or connection is required")
+
+        self.url = url
+        self.pool_size = pool_size
+        self.exchange_name = exchange_name
+        self._connection = connection
+        self._owns_connection = connection is None
+        self._channels: List[AbstractChannel] = []
+        self._exchanges: Dict[str, List[AbstractExchange]] = {}
+        self._next_channel = itertools.cycle(range(pool_size))
+        # Bounds unconfirmed messages, so a slow broker slows publishers down
+        # instead of growing memory
+        self._slots = asyncio.Semaphore(max_pending)
+        self._pending: Set[asyncio.Future] = set()
+        # Confirms awaited by their caller, which sees the failure itself
+        self._awaited: Set[asyncio.Future] = set()
+        # Only the count and first error are kept until the next flush
+        self._failed = 0
+        self._first_failure: BaseException | None = None
+
+    async def start(self):
+        if self._connection is None:
+            self._connection = await connect_robust(self.url)
+        self._channels = [
+            await self._connection.channel(publisher_confirms=True) for _ in range(self.pool_size)
+        ]
+
+    async def __aenter__(self) -> "EventPublisher":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def failed(self) -> int:
+        """Unconfirmed publishes since the previous flush, not counting awaited ones"""
+        return self._failed
+
+    async def _exchange(self, name: str, index: int) -> AbstractExchange:
+        exchanges = self._exchanges.get(name)
+        if exchanges is None:
+            exchanges = self._exchanges[name] = [
+                await channel.get_exchange(name, ensure=False) for channel in self._channels
+            ]
+        return exchanges[index]
+
+    async def publish(self, message: Message, routing_key: str, exchange: str | None = None) -> asyncio.Future:
+        """Starts publishing `message` and returns the future of its confirm"""
+        if not self._channels:
+            raise RuntimeError("EventPublisher is not started")
+
+        await self._slots.acquire()
+        try:
+            target = await self._exchange(exchange or self.exchange_name, next(self._next_channel))
+            confirm = asyncio.ensure_future(target.publish(message, routing_key=routing_key))
+        except BaseException:
+            self._slots.release()
+            raise
+        self._pending.add(confirm)
+        confirm.add_done_callback(self._on_confirm)
+        return confirm
+
+    async def publish_confirmed(self, message: Message, routing_key: str, exchange: str | None = None):
+        """Publishes and waits for this message's confirm alone"""
+        confirm = await self.publish(message, routing_key, exchange)
+        self._awaited.add(confirm)
+        await confirm
+
+    def _on_confirm(self, confirm: asyncio.Future):
+        self._pending.discard(confirm)
+        self._slots.release()
+        awaited = confirm in self._awaited
+        self._awaited.discard(confirm)
+        if confirm.cancelled():
+            return
+        error = confirm.exception()
+        if error is not None:
+            logging.warning(f"Publish was not confirmed: {error}")
+            if not awaited:
+                if self._failed == 0:
+                    self._first_failure = error
+                self._failed += 1
+
+    async def flush(self):
+        """Waits for every message published so far to be confirmed
+
+        Raises PublishException if any publish since the previous flush was
+        refused by the broker or lost with its channel.
+        """
+        if self._pending:
+            await asyncio.wait(list(self._pending))
+        failed, first_failure = self._failed, self._first_failure
+        self._failed, self._first_failure = 0, None
+        if failed:
+            raise PublishException(f"{failed} messages were not confirmed, first error: {first_failure}")
+
+    async def close(self):
+        try:
+            await self.flush()
+        finally:
+            for channel in self._channels:
+                await channel.close()
+            self._channels = []
+            self._exchanges = {}
+            if self._owns_connection and self._connection is not None:
+                await self._connection.close()
+                self._connection = None
@@ -0,0 +1,84 @@
+import bisect
+import random
+from typing import Any, Sequence, Tuple
+from aio_pika import ExchangeType, Message
+from event_driven.events_initialization import INITIAL_RETRY_DELAY
+from event_driven.topology import Topology, declare_topology
+
+RETRY_EXCHANGE = 'retry.exchange'
+RETRY_DELAY_HEADER = 'x-retry-delay'
+ORIGINAL_ROUTING_KEY_HEADER = 'x-original-routing-key'
+
+# Delays in milliseconds. Every service and entity shares these queues
+DEFAULT_RETRY_TIERS = (1000, 3000, 6000, 12000, 30000, 60000, 300000, 900000)
+
+
+def get_retry_tier_queue_name(delay_ms: int) -> str:
+    return f"retry.delay.{delay_ms}"
+
+
+def retry_tiers_topology(tiers: Sequence[int] = DEFAULT_RETRY_TIERS) -> Topology:
+    """One queue per delay, bound to the retry exchange by the delay header
+
+    A message is published to the retry exchange with the name of the queue
+    it returns to as routing key. Once its TTL expires, it is dead-lettered
+    to the default exchange with that routing key, so it goes back to the
+    one queue that failed it rather than to every subscriber of the event.
+    """
+    topology = Topology()
+    topology.add_exchange(RETRY_EXCHANGE, ExchangeType.HEADERS.value, durable=True)
+    for delay_ms in tiers:
+        queue_name = get_retry_tier_queue_name(delay_ms)
+        topology.add_queue(queue_name, {
+            'x-message-ttl': delay_ms,
+            'x-dead-letter-exchange': '',
+        })
+        topology.bind(queue_name, RETRY_EXCHANGE, "", {'x-match': 'all', RETRY_DELAY_HEADER: delay_ms})
+    return topology
+
+
+async def create_retry_tiers(channel, tiers: Sequence[int] = DEFAULT_RETRY_TIERS):
+    await declare_topology(channel, retry_tiers_topology(tiers))
+    return await channel.get_exchange(RETRY_EXCHANGE)
+
+
+class DelayedRetry:
+    """Schedules retries on a few shared delay queues
+
+    Replaces the attempt.N.* queues declared per event type, entity and
+    service. Attempt n waits about `initial_delay * 2**n` milliseconds: the
+    smallest tier at least that long is used, and the message's own TTL is
+    drawn from the last `jitter` fraction of the tier, so retries of a burst
+    of failures spread out instead of returning together. A message never
+    waits past its tier's TTL, even behind messages with longer TTLs.
+    """
+
+    def __init__(self, exchange: Any, tiers: Sequence[int] = DEFAULT_RETRY_TIERS,
+                 initial_delay: int = INITIAL_RETRY_DELAY, jitter: float = 0.2):
+        self.exchange = exchange
+        self.tiers = tuple(sorted(tiers))
+        self.initial_delay = initial_delay
+        self.jitter = jitter
+
+    @classmethod
+    async def declare(cls, channel, tiers: Sequence[int] = DEFAULT_RETRY_TIERS, **kwargs) -> "DelayedRetry":
+        return cls(await create_retry_tiers(channel, tiers), tiers, **kwargs)
+
+    def delay_for(self, attempt: int) -> Tuple[int, int]:
+        """(tier, delay) in milliseconds of retry number `attempt`, counted from 0"""
+        wanted = self.initial_delay * (2 ** attempt)
+        tier = self.tiers[min(bisect.bisect_left(self.tiers, wanted), len(self.tiers) - 1)]
+        delay = round(tier * (1 - random.uniform(0, self.jitter)))
+        return tier, delay
+
+    async def schedule(self, message: Message, routing_key: str, queue_name: str, attempt: int):
+        """Publishes `message` to return to `queue_name` after the delay of `attempt`
+
+        `routing_key` is the one the message was first published with, kept in
+        a header since the message comes back addressed to the queue.
+        """
+        tier, delay = self.delay_for(attempt)
+        message.headers[RETRY_DELAY_HEADER] = tier
+        message.headers.setdefault(ORIGINAL_ROUTING_KEY_HEADER, routing_key)
+        message.expiration = delay / 1000
+        await self.exchange.publish(message, routing_key=queue_name)
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Tuple
+import yaml
+from event_driven.events_initialization import EventType, get_event_routing_key
+from event_driven.publisher import EventPublisher
+
+DEFAULT_CONFIG_PATH = "config.yaml"
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    """Settings of a service as read at one point in time"""
+    service_name: str
+    settings: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "RuntimeConfig":
+        if not settings or not settings.get("service_name"):
+            raise ValueError("service_name is required")
+        return cls(settings["service_name"], dict(settings))
+
+
+class ServiceRuntime:
+    """Service name, publisher and routing keys of a service, set up once
+
+    `@event_object` classes publish through a runtime instead of reading
+    config.yaml on every call: the one bound with `event_object(runtime=...)`
+    or `bind_runtime`, else the process default set with `init_runtime`.
+
+    Reloading replaces the whole config snapshot in one assignment, so a
+    publish sees either the old settings or the new ones, never a mix.
+
+    A publisher the runtime creates from `rabbitmq_url` is started on the
+    first publish if `start` was not called before.
+    """
+
+    def __init__(self, config: RuntimeConfig, publisher: Any | None = None,
+                 config_path: str | None = None, owns_publisher: bool = False):
+        self._config = config
+        self.publisher = publisher
+        self.config_path = config_path
+        self._owns_publisher = owns_publisher
+        self._started = False
+        self._start_lock = asyncio.Lock()
+        self._mtime = os.stat(config_path).st_mtime_ns if config_path else None
+        self._routing_keys: Dict[Tuple[str, str], str] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], publisher: Any | None = None) -> "ServiceRuntime":
+        config = RuntimeConfig.from_settings(settings)
+        return cls(config, *cls._publisher_for(config, publisher))
+
+    @classmethod
+    def from_file(cls, config_path: str = DEFAULT_CONFIG_PATH, publisher: Any | None = None) -> "ServiceRuntime":
+        config = RuntimeConfig.from_settings(_read_settings(config_path))
+        publisher, owns_publisher = cls._publisher_for(config, publisher)
+        return cls(config, publisher, config_path=config_path, owns_publisher=owns_publisher)
+
+    @classmethod
+    def from_env(cls, publisher: Any | None = None) -> "ServiceRuntime":
+        """Reads SERVICE_NAME and, when no publisher is given, RABBITMQ_URL"""
+        settings = {"service_name": os.getenv("SERVICE_NAME")}
+        if os.getenv("RABBITMQ_URL"):
+            settings["rabbitmq_url"] = os.getenv("RABBITMQ_URL")
+        return cls.from_settings(settings, publisher)
+
+    @staticmethod
+    def _publisher_for(config: RuntimeConfig, publisher: Any | None) -> Tuple[Any | None, bool]:
+        if publisher is not None or not config.settings.get("rabbitmq_url"):
+            return publisher, False
+        return EventPublisher(url=config.settings["rabbitmq_url"]), True
+
+    @property
+    def config(self) -> RuntimeConfig:
+        return self._config
+
+    @property
+    def service_name(self) -> str:
+        return self._config.service_name
+
+    def routing_key(self, event_type: EventType, entity: str) -> str:
+        key = (event_type.value, entity)
+        routing_key = self._routing_keys.get(key)
+        if routing_key is None:
+            routing_key = self._routing_keys[key] = get_event_routing_key(event_type, entity)
+        return routing_key
+
+    def preload_routing_keys(self, table: Dict[Tuple[str, str], str]):
+        """Fills the routing key cache up front, e.g. with `TopologyRegistry.routing_table()`"""
+        self._routing_keys.update(table)
+
+    def exchange(self, exchange: Any | None = None) -> Any:
+        """The exchange given by the caller, else the runtime's publisher"""
+        if exchange is not None:
+            return exchange
+        if self.publisher is None:
+            raise RuntimeError(f"No exchange given and runtime of {self.service_name} has no publisher")
+        return self.publisher
+
+    async def publish(self, message: Any, routing_key: str, exchange: Any | None = None):
+        """Publishes through `exchange(exchange)` and waits for the broker's confirm
+
+        An aio_pika exchange on a confirming channel already waits in
+        `publish`, an EventPublisher only hands the message over there.
+        """
+        if exchange is None:
+            await self.start()
+        target = self.exchange(exchange)
+        if isinstance(target, EventPublisher):
+            await target.publish_confirmed(message, routing_key=routing_key)
+        else:
+            await target.publish(message, routing_key=routing_key)
+
+    async def start(self):
+        """Starts the publisher the runtime owns, once"""
+        if not self._owns_publisher or self._started:
+            return
+        async with self._start_lock:
+            if not self._started:
+                await self.publisher.start()
+                self._started = True
+
+    async def close(self):
+        if self._owns_publisher and self._started:
+            self._started = False
+            await self.publisher.close()
+
+    def reload(self) -> bool:
+        """Re-reads the config file if it changed since it was last read
+
+        A file that fails to parse raises and leaves the current config in place.
+        """
+        if self.config_path is None:
+            return False
+        mtime = os.stat(self.config_path).st_mtime_ns
+        if mtime == self._mtime:
+            return False
+        config = RuntimeConfig.from_settings(_read_settings(self.config_path))
+        self._config, self._mtime = config, mtime
+        logging.info(f"Reloaded service config from {self.config_path}")
+        return True
+
+    async def watch(self, interval: float = 2.0):
+        """Reloads the config file whenever it changes, until cancelled"""
+        while True:
+            try:
+                self.reload()
+            except Exception as e:
+                logging.warning(f"Keeping previous service config, reload of {self.config_path} failed: {e}")
+            await asyncio.sleep(interval)
+
+
+def _read_settings(config_path: str) -> Dict[str, Any]:
+    with open(config_path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+
+_default_runtime: ServiceRuntime | None = None
+_file_runtimes: Dict[str, ServiceRuntime] = {}
+
+
+def init_runtime(runtime: ServiceRuntime) -> ServiceRuntime:
+    """Makes `runtime` the process default of event objects without their own"""
+    global _default_runtime
+    _default_runtime = runtime
+    return runtime
+
+
+def runtime_for_file(config_path: str) -> ServiceRuntime:
+    """Runtime read from `config_path`, read once per path"""
+    runtime = _file_runtimes.get(config_path)
+    if runtime is None:
+        runtime = _file_runtimes[config_path] = ServiceRuntime.from_file(config_path)
+    return runtime
+
+
+def get_runtime() -> ServiceRuntime:
+    """The process default runtime, or one read from config.yaml when none was set"""
+    if _default_runtime is not None:
+        return _default_runtime
+    return runtime_for_file(DEFAULT_CONFIG_PATH)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractIncomingMessage, AbstractQueue
+from event_driven.events_initialization import EVENT_EXCHANGE, MAX_RETRIES, EventType, get_event_queue_name
+from event_driven.exceptions import ModelException
+from event_driven.message.processing import process_message
+from event_driven.retry import DelayedRetry
+
+
+@dataclass
+class Subscription:
+    model: Any
+    event_type: EventType
+    handler: Callable
+    prefetch: int | None = None
+    queue_name: str | None = None
+
+
+class Subscriber:
+    """Consumes many event queues over a few channels, with one lifecycle
+
+    Replaces a `subscribe_to_events` coroutine per queue. Subscriptions are
+    spread round robin over `channels` channels. Each queue keeps its own
+    prefetch: a channel's prefetch applies to the consumers started after
+    it is set, so it is set right before each consume.
+
+    `stop` cancels every consumer first, so no new deliveries arrive, waits
+    for the handlers already running, then closes the channels. Messages
+    prefetched but not started go back to their queues.
+    """
+
+    def __init__(self, connection: AbstractConnection, channels: int = 4, prefetch: int = 100,
+                 service_name: str | None = None, max_attempts: int = MAX_RETRIES,
+                 retry: DelayedRetry | None = None):
+        self.connection = connection
+        self.channel_count = channels
+        self.prefetch = prefetch
+        self.service_name = service_name
+        self.max_attempts = max_attempts
+        self.retry = retry
+        self.subscriptions: List[Subscription] = []
+        self._channels: List[AbstractChannel] = []
+        self._consumers: List[Tuple[AbstractQueue, str]] = []
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def subscribe(self, model: Any, event_type: EventType, handler: Callable, prefetch: int | None = None) -> Subscription:
+        """Calls `handler` with each `event_type` event of the event object class `model`"""
+        if self._channels:
+            raise RuntimeError("Subscriber is already started")
+        subscription = Subscription(model, event_type, handler, prefetch)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def on(self, model: Any, event_type: EventType, prefetch: int | None = None):
+        """Decorator form of `subscribe`"""
+        def decorator(handler: Callable) -> Callable:
+            self.subscribe(model, event_type, handler, prefetch)
+            return handler
+        return decorator
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _callback(self, subscription: Subscription, exchange, service_name: str) -> Callable:
+        async def on_message(message: AbstractIncomingMessage):
+            self._inflight += 1
+            self._idle.clear()
+            try:
+                await process_message(exchange, message, subscription.handler, subscription.model,
+                                      service_name, self.max_attempts, retry=self.retry,
+                                      queue_name=subscription.queue_name)
+            except ModelException as e:
+                # Already acked by process_message, nothing to retry
+                logging.warning(f"Dropped invalid message from {subscription.queue_name}: {e}")
+            finally:
+                self._inflight -= 1
+                if self._inflight == 0:
+                    self._idle.set()
+        return on_message
+
+    async def _start_channel(self, channel: AbstractChannel, subscriptions: List[Subscription]):
+        # Retries of process_message without shared tiers go through the events exchange
+        exchange = await channel.get_exchange(EVENT_EXCHANGE, ensure=False)
+        for subscription in subscriptions:
+            service_name = self.service_name or subscription.model.event_runtime().service_name
+            subscription.queue_name = get_event_queue_name(
+                subscription.event_type, subscription.model.get_event_name(), service_name
+            )
+            await channel.set_qos(prefetch_count=subscription.prefetch or self.prefetch)
+            queue = await channel.get_queue(subscription.queue_name)
+            consumer_tag = await queue.consume(self._callback(subscription, exchange, service_name))
+            self._consumers.append((queue, consumer_tag))
+
+    async def start(self):
+        if self._channels:
+            raise RuntimeError("Subscriber is already started")
+        count = max(1, min(self.channel_count, len(self.subscriptions)))
+        self._channels = [await self.connection.channel() for _ in range(count)]
+
+        shares: Dict[int, List[Subscription]] = {index: [] for index in range(count)}
+        for index, subscription in enumerate(self.subscriptions):
+            shares[index % count].append(subscription)
+        try:
+            await asyncio.gather(*(
+                self._start_channel(self._channels[index], share) for index, share in shares.items() if share
+            ))
+        except BaseException:
+            await self.stop(drain_timeout=0)
+            raise
+        logging.info(f"Consuming {len(self._consumers)} queues over {count} channels")
+
+    async def drain(self, timeout: float | None = None) -> bool:
+        """Waits for running handlers, returns False if some were still running at `timeout`"""
+        if self._idle.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, drain_timeout: float | None = 30):
+        consumers, self._consumers = self._consumers, []
+        for queue, consumer_tag in consumers:
+            try:
+                await queue.cancel(consumer_tag)
+            except Exception as e:
+                logging.warning(f"Failed to cancel consumer of {queue.name}: {e}")
+
+        if not await self.drain(drain_timeout):
+            logging.warning(f"Stopped with {self._inflight} handlers still running")
+
+        channels, self._channels = self._channels, []
+        for channel in channels:
+            await channel.close()
+
+    async def run(self):
+        """Starts, consumes until cancelled, then stops"""
+        await self.start()
+        try:
+            await asyncio.Future()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop()
+
+    async def __aenter__(self) -> "Subscriber":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Dict
+from aio_pika import Message
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractExchange, AbstractIncomingMessage, AbstractQueue
+from event_driven.events_initialization import TASK_EXCHANGE, get_named_task_routing_key
+from event_driven.exceptions import TaskFailedException
+from event_driven.message.creation import task_message
+
+# Reply statuses, the values of the service's task Status
+TASK_COMPLETED = "completed"
+TASK_FAILED = "failed"
+
+
+def task_reply_message(correlation_id: str, task_id: str, task_name: str, status: str,
+                       result: Any = None, error: str | None = None) -> Message:
+    body = {
+        "task_id": task_id,
+        "task_name": task_name,
+        "status": status,
+        "result": result,
+        "error": error
+    }
+    return Message(body=json.dumps(body).encode(), content_type="application/json", correlation_id=correlation_id)
+
+
+class TaskClient:
+    """Submits tasks and waits for their results over RabbitMQ
+
+    All calls share one exclusive reply queue, declared by `start` and deleted
+    with the connection, and replies are matched to their caller by
+    correlation_id. A result arrives as soon as the task finishes, without
+    polling the task store.
+
+    The reply queue is named by the client, not the broker: a robust
+    connection redeclares it under the same name after a reconnect, which the
+    broker refuses for its own amq.gen-* names. Replies sent while the
+    connection was down are lost, their callers time out.
+    """
+
+    def __init__(self, connection: AbstractConnection, producer_app: str):
+        self.connection = connection
+        self.producer_app = producer_app
+        self.reply_queue_name = f"reply.{producer_app}.{uuid.uuid4()}"
+        self._channel: AbstractChannel | None = None
+        self._exchange: AbstractExchange | None = None
+        self._reply_queue: AbstractQueue | None = None
+        self._consumer_tag: str | None = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def start(self):
+        self._channel = await self.connection.channel()
+        self._exchange = await self._channel.get_exchange(TASK_EXCHANGE, ensure=False)
+        self._reply_queue = await self._channel.declare_queue(self.reply_queue_name, exclusive=True, auto_delete=True)
+        self._consumer_tag = await self._reply_queue.consume(self._on_reply, no_ack=True)
+
+    async def close(self):
+        if self._consumer_tag is not None:
+            await self._reply_queue.cancel(self._consumer_tag)
+            self._consumer_tag = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Task client closed"))
+        self._pending.clear()
+        if self._channel is not None:
+            await self._channel.close()
+            self._channel = None
+
+    async def _on_reply(self, message: AbstractIncomingMessage):
+        future = self._pending.get(message.correlation_id)
+        if future is None or future.done():
+            # The caller timed out or the reply is a duplicate
+            logging.debug(f"Dropping reply to unknown task {message.correlation_id}")
+            return
+
+        reply = json.loads(message.body.decode())
+        if reply["status"] == TASK_COMPLETED:
+            future.set_result(reply["result"])
+        else:
+            future.set_exception(TaskFailedException(reply["task_name"], reply["error"], reply["task_id"]))
+
+    async def submit_task(self, task_name: str, arguments: dict, timeout: float | None = 30.0,
+                          routing_key: str | None = None, priority: int | None = None) -> Any:
+        """Publishes a task and returns its result
+
+        Raises TaskFailedException when the task fails and asyncio.TimeoutError
+        when no reply arrives within `timeout` seconds. The task itself is not
+        cancelled by a timeout.
+        """
+        if self._reply_queue is None:
+            raise RuntimeError("TaskClient is not started")
+
+        correlation_id = str(uuid.uuid4())
+        message = task_message(
+            self.producer_app, 0, task_name, arguments,
+            additional_headers={"producer_app": self.producer_app, "correlation_id": correlation_id},
+            correlation_id=correlation_id,
+            priority=priority
+        )
+        message.reply_to = self._reply_queue.name
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[correlation_id] = future
+        try:
+            await self._exchange.publish(message, routing_key=routing_key or get_named_task_routing_key(task_name))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(correlation_id, None)
+
+
+_client: TaskClient | None = None
+
+
+async def connect_task_client(connection: AbstractConnection, producer_app: str) -> TaskClient:
+    """Starts the process-wide client used by `submit_task`"""
+    global _client
+    if _client is None:
+        _client = TaskClient(connection, producer_app)
+        await _client.start()
+    return _client
+
+
+async def submit_task(task_name: str, arguments: dict, timeout: float | None = 30.0, **kwargs) -> Any:
+    if _client is None:
+        raise RuntimeError("Call connect_task_client before submit_task")
+    return await _client.submit_task(task_name, arguments, timeout=timeout, **kwargs)
@@ -0,0 +1,396 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+from aio_pika import ExchangeType
+from event_driven.events_initialization import (
+    DEAD_EVENT_EXCHANGE, DEAD_TASK_EXCHANGE, EVENT_EXCHANGE, INITIAL_RETRY_DELAY, MAX_QUEUE_LENGTH,
+    MAX_QUEUE_SIZE, MAX_RETRIES, QUEUE_MESSAGE_TTL, TASK_EXCHANGE, EventType,
+    get_attempt_n_queue_name_event, get_attempt_n_routing_key_event, get_dead_event_routing_key,
+    get_event_dead_queue_name, get_event_queue_name, get_event_routing_key, get_task_dead_queue_name,
+    get_task_dead_routing_key, get_task_queue_name, get_task_routing_key, task_queue_arguments
+)
+
+
+@dataclass(frozen=True)
+class ExchangeSpec:
+    name: str
+    type: str
+    # Matches create_event_exchange, declaring with other flags fails on the broker
+    durable: bool = False
+
+
+@dataclass(frozen=True)
+class QueueSpec:
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict, hash=False)
+    durable: bool = True
+
+
+@dataclass(frozen=True)
+class BindingSpec:
+    queue: str
+    exchange: str
+    routing_key: str
+    # Sorted (name, value) pairs, kept hashable. Headers exchanges route on them
+    arguments: Tuple[Tuple[str, Any], ...] = ()
+
+
+class Topology:
+    """Exchanges, queues and bindings a service needs, as data
+
+    Built once, declared with `declare_topology` and identified by its
+    `fingerprint`, so an unchanged topology need not be declared again.
+    """
+
+    def __init__(self):
+        self.exchanges: Dict[str, ExchangeSpec] = {}
+        self.queues: Dict[str, QueueSpec] = {}
+        self.bindings: Dict[BindingSpec, None] = {}
+
+    def add_exchange(self, name: str, type: str, durable: bool = False):
+        self.exchanges[name] = ExchangeSpec(name, type, durable)
+
+    def add_queue(self, name: str, arguments: Dict[str, Any] | None = None, durable: bool = True):
+        self.queues[name] = QueueSpec(name, dict(arguments or {}), durable)
+
+    def bind(self, queue: str, exchange: str, routing_key: str, arguments: Dict[str, Any] | None = None):
+        self.bindings[BindingSpec(queue, exchange, routing_key, tuple(sorted((arguments or {}).items())))] = None
+
+    def merge(self, other: "Topology") -> "Topology":
+        self.exchanges.update(other.exchanges)
+        self.queues.update(other.queues)
+        self.bindings.update(other.bindings)
+        return self
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Canonical form: sorted, so equal topologies give equal dicts"""
+        return {
+            "exchanges": [
+                {"name": e.name, "type": e.type, "durable": e.durable}
+                for e in sorted(self.exchanges.values(), key=lambda e: e.name)
+            ],
+            "queues": [
+                {"name": q.name, "durable": q.durable, "arguments": dict(sorted(q.arguments.items()))}
+                for q in sorted(self.queues.values(), key=lambda q: q.name)
+            ],
+            "bindings": [
+                {"queue": b.queue, "exchange": b.exchange, "routing_key": b.routing_key, "arguments": dict(b.arguments)}
+                for b in sorted(self.bindings, key=lambda b: (b.queue, b.exchange, b.routing_key, repr(b.arguments)))
+            ],
+        }
+
+    def fingerprint(self) -> str:
+        canonical = json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def event_exchanges_topology() -> Topology:
+    topology = Topology()
+    topology.add_exchange(EVENT_EXCHANGE, ExchangeType.TOPIC.value)
+    topology.add_exchange(DEAD_EVENT_EXCHANGE, ExchangeType.TOPIC.value)
+    return topology
+
+
+def event_topology(entity: str, service_to: str, event_types: Iterable[EventType],
+                   attempts: int = MAX_RETRIES) -> Topology:
+    """What create_event and create_attempt_queues_event declare for these event types"""
+    topology = event_exchanges_topology()
+    for event_type in event_types:
+        queue_name = get_event_queue_name(event_type, entity, service_to)
+        routing_key = get_event_routing_key(event_type, entity)
+        dead_queue_name = get_event_dead_queue_name(event_type, entity, service_to)
+        dead_routing_key = get_dead_event_routing_key(event_type, entity, service_to)
+
+        topology.add_queue(dead_queue_name)
+        topology.add_queue(queue_name, {
+            'x-dead-letter-exchange': DEAD_EVENT_EXCHANGE,
+            'x-dead-letter-routing-key': dead_routing_key,
+            'x-max-retries': MAX_RETRIES,
+            'x-message-ttl': QUEUE_MESSAGE_TTL,
+            'x-max-length': MAX_QUEUE_LENGTH,
+            'x-max-length-bytes': MAX_QUEUE_SIZE,
+            'x-overflow': 'reject-publish'
+        })
+        topology.bind(queue_name, EVENT_EXCHANGE, routing_key)
+        topology.bind(dead_queue_name, DEAD_EVENT_EXCHANGE, dead_routing_key)
+
+        for n in range(attempts):
+            attempt_queue_name = get_attempt_n_queue_name_event(n, event_type, entity, service_to)
+            topology.add_queue(attempt_queue_name, {
+                'x-message-ttl': INITIAL_RETRY_DELAY * (2 ** n),
+                'x-dead-letter-exchange': EVENT_EXCHANGE,
+                'x-dead-letter-routing-key': routing_key
+            })
+            topology.bind(attempt_queue_name, EVENT_EXCHANGE,
+                          get_attempt_n_routing_key_event(n, event_type, entity, service_to))
+    return topology
+
+
+def task_exchanges_topology() -> Topology:
+    topology = Topology()
+    topology.add_exchange(TASK_EXCHANGE, ExchangeType.DIRECT.value)
+    topology.add_exchange(DEAD_TASK_EXCHANGE, ExchangeType.DIRECT.value)
+    return topology
+
+
+def task_topology(action: str, entity: str, max_priority: int | None = None) -> Topology:
+    """What create_task declares"""
+    topology = task_exchanges_topology()
+    queue_name = get_task_queue_name(action, entity)
+    dead_queue_name = get_task_dead_queue_name(action, entity)
+    dead_routing_key = get_task_dead_routing_key(action, entity)
+
+    topology.add_queue(dead_queue_name)
+    topology.add_queue(queue_name, {
+        'x-dead-letter-exchange': DEAD_TASK_EXCHANGE,
+        'x-dead-letter-routing-key': dead_routing_key,
+        'x-message-ttl': QUEUE_MESSAGE_TTL,
+        'x-max-length': MAX_QUEUE_LENGTH,
+        'x-max-length-bytes': MAX_QUEUE_SIZE,
+        'x-overflow': 'reject-publish',
+        **task_queue_arguments(max_priority)
+    })
+    topology.bind(queue_name, TASK_EXCHANGE, get_task_routing_key(action, entity))
+    topology.bind(dead_queue_name, DEAD_TASK_EXCHANGE, dead_routing_key)
+    return topology
+
+
+def to_definitions(topology: Topology, vhost: str = "/") -> Dict[str, List[Dict[str, Any]]]:
+    """RabbitMQ definitions JSON of `topology`, for `load_definitions` at broker boot"""
+    canonical = topology.to_dict()
+    return {
+        "exchanges": [
+            {"name": e["name"], "vhost": vhost, "type": e["type"], "durable": e["durable"],
+             "auto_delete": False, "internal": False, "arguments": {}}
+            for e in canonical["exchanges"]
+        ],
+        "queues": [
+            {"name": q["name"], "vhost": vhost, "durable": q["durable"], "auto_delete": False,
+             "arguments": q["arguments"]}
+            for q in canonical["queues"]
+        ],
+        "bindings": [
+            {"source": b["exchange"], "vhost": vhost, "destination": b["queue"], "destination_type": "queue",
+             "routing_key": b["routing_key"], "arguments": b["arguments"]}
+            for b in canonical["bindings"]
+        ],
+    }
+
+
+def from_definitions(definitions: Dict[str, Any], vhost: str = "/") -> Topology:
+    """Topology of a definitions snapshot (`rabbitmqctl export_definitions`), limited to one vhost"""
+    topology = Topology()
+    for exchange in definitions.get("exchanges", []):
+        if exchange.get("vhost", "/") == vhost:
+            topology.add_exchange(exchange["name"], exchange["type"], exchange.get("durable", False))
+    for queue in definitions.get("queues", []):
+        if queue.get("vhost", "/") == vhost:
+            topology.add_queue(queue["name"], queue.get("arguments"), queue.get("durable", True))
+    for binding in definitions.get("bindings", []):
+        if binding.get("vhost", "/") == vhost and binding.get("destination_type", "queue") == "queue":
+            topology.bind(binding["destination"], binding["source"], binding["routing_key"], binding.get("arguments"))
+    return topology
+
+
+@dataclass
+class TopologyDiff:
+    """Differences of a desired topology from an actual one
+
+    `changed` exchanges and queues exist with other flags or arguments:
+    declaring them fails until they are deleted. `extra` ones exist on the
+    broker only, and are left alone.
+    """
+    missing_exchanges: List[str] = field(default_factory=list)
+    changed_exchanges: List[str] = field(default_factory=list)
+    extra_exchanges: List[str] = field(default_factory=list)
+    missing_queues: List[str] = field(default_factory=list)
+    changed_queues: List[str] = field(default_factory=list)
+    extra_queues: List[str] = field(default_factory=list)
+    missing_bindings: List[BindingSpec] = field(default_factory=list)
+    extra_bindings: List[BindingSpec] = field(default_factory=list)
+
+    @property
+    def in_sync(self) -> bool:
+        """Nothing missing or changed, extras are allowed"""
+        return not (self.missing_exchanges or self.changed_exchanges or self.missing_queues
+                    or self.changed_queues or self.missing_bindings)
+
+
+def _diff_names(desired: Dict[str, Any], actual: Dict[str, Any]) -> Tuple[List[str], List[str], List[str]]:
+    missing = sorted(name for name in desired if name not in actual)
+    changed = sorted(name for name in desired if name in actual and desired[name] != actual[name])
+    extra = sorted(name for name in actual if name not in desired)
+    return missing, changed, extra
+
+
+def diff_topology(desired: Topology, actual: Topology) -> TopologyDiff:
+    diff = TopologyDiff()
+    diff.missing_exchanges, diff.changed_exchanges, diff.extra_exchanges = _diff_names(desired.exchanges, actual.exchanges)
+    diff.missing_queues, diff.changed_queues, diff.extra_queues = _diff_names(desired.queues, actual.queues)
+    diff.missing_bindings = [binding for binding in desired.bindings if binding not in actual.bindings]
+    diff.extra_bindings = [binding for binding in actual.bindings if binding not in desired.bindings]
+    return diff
+
+
+class TopologyRegistry:
+    """Every event object, subscription and task of a process, as one topology
+
+    `@event_object` classes register themselves in `topology_registry`.
+    Subscriptions and tasks are added explicitly, since only the service
+    knows which ones it consumes.
+    """
+
+    def __init__(self):
+        self.event_objects: Dict[str, Any] = {}
+        self.subscriptions: Dict[Tuple[str, str | None], Tuple[Any, frozenset]] = {}
+        self.tasks: Dict[Tuple[str, str], int | None] = {}
+        self.retry_tiers: Tuple[int, ...] | None = None
+
+    def use_retry_tiers(self, tiers: Sequence[int]):
+        """Subscriptions retry through these shared delay queues instead of attempt queues"""
+        self.retry_tiers = tuple(tiers)
+
+    def add_event_object(self, cls: Any):
+        # Generated CRUD classes share their base's event name, one is enough
+        self.event_objects.setdefault(cls.get_event_name(), cls)
+
+    def add_subscription(self, cls: Any, event_types: Iterable[EventType] | None = None, service_to: str | None = None):
+        """Queues of `service_to` (the class runtime's service when None) for events of `cls`"""
+        types = frozenset(event_types) if event_types is not None else frozenset(EventType)
+        self.subscriptions[(cls.get_event_name(), service_to)] = (cls, types)
+
+    def add_task(self, action: str, entity: str, max_priority: int | None = None):
+        self.tasks[(action, entity)] = max_priority
+
+    def routing_table(self) -> Dict[Tuple[str, str], str]:
+        """Routing key of every event type of every registered event object"""
+        return {
+            (event_type.value, entity): get_event_routing_key(event_type, entity)
+            for entity in self.event_objects
+            for event_type in EventType
+        }
+
+    def topology(self) -> Topology:
+        topology = event_exchanges_topology()
+        attempts = MAX_RETRIES if self.retry_tiers is None else 0
+        for (entity, service_to), (cls, event_types) in self.subscriptions.items():
+            service = service_to if service_to is not None else cls.event_runtime().service_name
+            topology.merge(event_topology(entity, service, sorted(event_types, key=lambda t: t.value), attempts))
+        if self.retry_tiers is not None:
+            from event_driven.retry import retry_tiers_topology
+            topology.merge(retry_tiers_topology(self.retry_tiers))
+        for (action, entity), max_priority in self.tasks.items():
+            topology.merge(task_topology(action, entity, max_priority))
+        return topology
+
+    def export_definitions(self, path: str | None = None, vhost: str = "/") -> Dict[str, Any]:
+        """Definitions JSON of the registered topology, also written to `path` when given"""
+        definitions = to_definitions(self.topology(), vhost)
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(definitions, f, indent=2)
+        return definitions
+
+    def diff_definitions(self, definitions: Dict[str, Any] | str, vhost: str = "/") -> TopologyDiff:
+        """Diff against a definitions snapshot, given as a dict or a file path"""
+        if isinstance(definitions, str):
+            with open(definitions, "r") as f:
+                definitions = json.load(f)
+        return diff_topology(self.topology(), from_definitions(definitions, vhost))
+
+
+topology_registry = TopologyRegistry()
+
+
+@dataclass(frozen=True)
+class TopologySyncResult:
+    fingerprint: str
+    skipped: bool
+    seconds: float
+
+
+async def _spread(channels: Sequence[Any], items: Sequence[Any], declare) -> List[Any]:
+    # A channel runs one declare at a time, so throughput comes from the
+    # number of channels: items go round robin, each channel works its share
+    # in order and all channels run at once
+    shares: List[List[Tuple[int, Any]]] = [[] for _ in channels]
+    for index, item in enumerate(items):
+        shares[index % len(channels)].append((index, item))
+
+    results: List[Any] = [None] * len(items)
+
+    async def work(channel, share):
+        for index, item in share:
+            results[index] = await declare(channel, item)
+
+    await asyncio.gather(*(work(channel, share) for channel, share in zip(channels, shares) if share))
+    return results
+
+
+async def declare_topology(channels: Any | Sequence[Any], topology: Topology):
+    """Declares exchanges, then queues, then bindings, each phase spread over `channels`"""
+    if not isinstance(channels, (list, tuple)):
+        channels = [channels]
+
+    async def declare_exchange(channel, spec: ExchangeSpec):
+        await channel.declare_exchange(spec.name, ExchangeType(spec.type), durable=spec.durable)
+
+    async def declare_queue(channel, spec: QueueSpec):
+        return await channel.declare_queue(spec.name, durable=spec.durable, arguments=spec.arguments or None)
+
+    await _spread(channels, list(topology.exchanges.values()), declare_exchange)
+    queue_specs = list(topology.queues.values())
+    queues = dict(zip((spec.name for spec in queue_specs), await _spread(channels, queue_specs, declare_queue)))
+
+    async def bind(channel, spec: BindingSpec):
+        # Bound through the declaring channel's queue object, the exchange by name
+        await queues[spec.queue].bind(spec.exchange, spec.routing_key, arguments=dict(spec.arguments) or None)
+
+    await _spread(channels, list(topology.bindings), bind)
+
+
+async def sync_topology(channels: Any | Sequence[Any], topology: Topology,
+                        fingerprint_path: str | None = None, force: bool = False) -> TopologySyncResult:
+    """Declares `topology` unless `fingerprint_path` holds its fingerprint
+
+    The fingerprint is written after a successful declaration. It only
+    records what this host declared last: delete the file (or pass force)
+    after resetting the broker.
+    """
+    fingerprint = topology.fingerprint()
+    started = time.perf_counter()
+
+    if not force and fingerprint_path is not None and _read_fingerprint(fingerprint_path) == fingerprint:
+        logging.info(f"Topology {fingerprint[:12]} unchanged, skipped declaring it")
+        return TopologySyncResult(fingerprint, True, time.perf_counter() - started)
+
+    await declare_topology(channels, topology)
+    seconds = time.perf_counter() - started
+    logging.info(
+        f"Declared topology {fingerprint[:12]} ({len(topology.exchanges)} exchanges, "
+        f"{len(topology.queues)} queues, {len(topology.bindings)} bindings) in {seconds:.3f}s"
+    )
+    if fingerprint_path is not None:
+        _write_fingerprint(fingerprint_path, fingerprint)
+    return TopologySyncResult(fingerprint, False, seconds)
+
+
+def _read_fingerprint(path: str) -> str | None:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _write_fingerprint(path: str, fingerprint: str):
+    # Written aside and renamed, a crash never leaves half a fingerprint
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        f.write(fingerprint)
+    os.replace(temporary, path)
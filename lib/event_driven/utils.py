@@ -15,6 +15,21 @@ def check_event_key_exists(base_model: type[BaseModel], field_name: str) -> bool
             return True
     return False
 
+def get_event_key_field(model_cls: type[BaseModel]) -> str | None:
+    # Generated CRUD models override the event key field without its marker,
+    # so look through the bases as well
+    for cls in model_cls.__mro__:
+        if not (isinstance(cls, type) and issubclass(cls, BaseModel)):
+            continue
+        for field_name, model_field in cls.model_fields.items():
+            if model_field.json_schema_extra and model_field.json_schema_extra.get('event_key'):
+                return field_name
+    return None
+
+def get_event_key_value(model: BaseModel) -> Any | None:
+    field_name = get_event_key_field(type(model))
+    return getattr(model, field_name, None) if field_name else None
+
 def all_optional_overrides(base_model: type[BaseModel]) -> dict[str, tuple[Any, Any]]:
     fields_overrides = {}
 
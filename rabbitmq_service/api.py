@@ -0,0 +1,63 @@
+import contextlib
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import uvicorn
+import payloads
+from queries import EventFilter, event_to_dict
+
+
+def create_app(service) -> FastAPI:
+    app = FastAPI(title="rabbitmq_service")
+
+    @app.get("/health")
+    async def health():
+        return service.health()
+
+    if service.config.metrics_enabled:
+        @app.get("/metrics", response_class=PlainTextResponse)
+        async def metrics():
+            """Service metrics in the Prometheus text exposition format"""
+            return PlainTextResponse(service.metrics.render(), media_type="text/plain; version=0.0.4")
+
+    if service.async_session is None:
+        # Capture only storage, events cannot be queried on this node
+        return app
+
+    @app.get("/events")
+    async def list_events(filters: EventFilter = Depends(), limit: int = Query(100, ge=1, le=1000),
+                          cursor: str | None = None):
+        """One page of events, pass `next_cursor` back to get the next one"""
+        try:
+            events, next_cursor = await service.query_events(filters, limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"events": [event_to_dict(event) for event in events], "next_cursor": next_cursor}
+
+    @app.get("/events/export")
+    async def export_events(filters: EventFilter = Depends()):
+        """Every matching event as newline-delimited JSON, streamed in constant memory"""
+        async def lines():
+            async for event in service.iter_events(filters):
+                yield payloads.dumps(event_to_dict(event)) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+class EmbeddedServer(uvicorn.Server):
+    """uvicorn server running inside the service loop
+
+    The service owns SIGTERM/SIGINT handling and stops the server through
+    `should_exit`, so uvicorn must not install its own handlers.
+    """
+
+    def install_signal_handlers(self):
+        pass
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+def create_server(service, host: str, port: int) -> EmbeddedServer:
+    return EmbeddedServer(uvicorn.Config(create_app(service), host=host, port=port, log_level="warning"))
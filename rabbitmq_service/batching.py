@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Generic, List, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+@dataclass
+class BatchMetrics:
+    """Running counters for flushed batches"""
+    batches: int = 0
+    items: int = 0
+    failures: int = 0
+    last_batch_size: int = 0
+    # Time the oldest item of the last batch waited in the buffer
+    last_linger_seconds: float = 0.0
+    # Time spent inside the flush callback for the last batch
+    last_flush_seconds: float = 0.0
+    max_flush_seconds: float = 0.0
+    total_flush_seconds: float = 0.0
+
+    @property
+    def avg_flush_seconds(self) -> float:
+        return self.total_flush_seconds / self.batches if self.batches else 0.0
+
+
+class Batcher(Generic[T]):
+    """Buffers items and hands them to `flush` in batches
+
+    A batch is flushed as soon as it holds `max_size` items or when the oldest
+    item has waited `linger_ms` milliseconds, whichever comes first. Flushes are
+    serialized, so items reach `flush` in the order they were added.
+
+    A full batch is flushed in a task of its own. The `add` that filled it
+    waits for the flush, but cancelling that caller does not cancel the
+    flush, which holds the items of every other caller too.
+    """
+
+    def __init__(self, flush: Callable[[List[T]], Awaitable[None]], max_size: int, linger_ms: int, name: str = "batch"):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.flush_callback = flush
+        self.max_size = max_size
+        self.linger = linger_ms / 1000
+        self.name = name
+        self.metrics = BatchMetrics()
+
+        self._buffer: List[T] = []
+        self._first_added_at: float | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._lock = asyncio.Lock()
+        self._pending: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    async def add(self, item: T):
+        if not self._buffer:
+            self._first_added_at = time.monotonic()
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._on_linger_expired)
+
+        self._buffer.append(item)
+
+        if len(self._buffer) >= self.max_size:
+            await asyncio.shield(self._flush_in_task())
+
+    def _on_linger_expired(self):
+        self._timer = None
+        self._flush_in_task()
+
+    def _take(self) -> Tuple[List[T], float | None]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Swap the buffer before waiting so new items start a fresh batch
+        batch, self._buffer = self._buffer, []
+        first_added_at, self._first_added_at = self._first_added_at, None
+        return batch, first_added_at
+
+    def _flush_in_task(self) -> asyncio.Task:
+        # The batch is taken now, tasks acquire the lock in creation order
+        task = asyncio.create_task(self._flush_batch(*self._take()))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def flush(self):
+        # Through a task too, so it cannot overtake flushes already started
+        await asyncio.shield(self._flush_in_task())
+
+    async def _flush_batch(self, batch: List[T], first_added_at: float | None):
+        if not batch:
+            return
+
+        async with self._lock:
+            started = time.monotonic()
+            try:
+                await self.flush_callback(batch)
+            except Exception:
+                self.metrics.failures += 1
+                logging.exception(f"Error flushing {self.name} of {len(batch)} items")
+            finally:
+                self._record(len(batch), started - first_added_at, time.monotonic() - started)
+
+    def _record(self, size: int, linger: float, elapsed: float):
+        metrics = self.metrics
+        metrics.batches += 1
+        metrics.items += size
+        metrics.last_batch_size = size
+        metrics.last_linger_seconds = linger
+        metrics.last_flush_seconds = elapsed
+        metrics.max_flush_seconds = max(metrics.max_flush_seconds, elapsed)
+        metrics.total_flush_seconds += elapsed
+
+        logging.debug(
+            f"Flushed {self.name} of {size} items in {elapsed * 1000:.1f}ms "
+            f"(waited {linger * 1000:.1f}ms)"
+        )
+
+    async def close(self):
+        """Flushes whatever is buffered and waits for in-flight flushes"""
+        await self.flush()
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
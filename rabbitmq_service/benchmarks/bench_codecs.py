@@ -0,0 +1,75 @@
+"""Compares wire formats on encode time, decode time and bytes on the wire
+
+Bodies are built like the example User model and its events, from a bare
+event up to one carrying a large attribute map. Formats whose optional
+package (msgpack, zstandard) is not installed are skipped.
+
+    python benchmarks/bench_codecs.py
+"""
+import sys
+import time
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from event_driven.message.codecs import (
+    GZIP_ENCODING, JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, ZSTD_ENCODING, codecs
+)
+
+ROUNDS = 2000
+
+FORMATS = [
+    (JSON_CONTENT_TYPE, None),
+    (JSON_CONTENT_TYPE, GZIP_ENCODING),
+    (JSON_CONTENT_TYPE, ZSTD_ENCODING),
+    (MSGPACK_CONTENT_TYPE, None),
+    (MSGPACK_CONTENT_TYPE, ZSTD_ENCODING),
+]
+
+
+def make_body(items: int) -> dict:
+    return {
+        "user_id": 42,
+        "username": "cooluser",
+        "email": "cool.user@example.com",
+        "full_name": "Cool User",
+        "tags": [f"tag-{i}" for i in range(items)],
+        "attributes": {f"key_{i}": {"value": i, "label": f"label {i}"} for i in range(items)}
+    }
+
+
+def format_name(content_type: str, encoding: str | None) -> str:
+    return f"{content_type} + {encoding}" if encoding else content_type
+
+
+def measure(function, *args) -> float:
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        function(*args)
+    return (time.perf_counter() - started) / ROUNDS * 1e6
+
+
+def main():
+    available = [
+        (content_type, encoding) for content_type, encoding in FORMATS
+        if content_type in codecs.serializers and (encoding is None or encoding in codecs.compressors)
+    ]
+    skipped = [f for f in FORMATS if f not in available]
+    if skipped:
+        print(f"skipped, package missing: {', '.join(format_name(*f) for f in skipped)}")
+
+    print(f"{'items':>6} {'format':<28} {'bytes':>9} {'ratio':>6} {'encode us':>10} {'decode us':>10}")
+    for items in (5, 50, 500):
+        value = make_body(items)
+        baseline = None
+        for content_type, encoding in available:
+            # Threshold 0: measure compression on every size, the production default skips small bodies
+            body, used = codecs.encode(value, content_type, encoding, compress_threshold=0)
+            baseline = baseline or len(body)
+            encode = measure(codecs.encode, value, content_type, encoding, 0)
+            decode = measure(codecs.decode, body, content_type, used)
+            print(f"{items:>6} {format_name(content_type, encoding):<28} {len(body):>9} {len(body) / baseline:>6.2f} {encode:>10.1f} {decode:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
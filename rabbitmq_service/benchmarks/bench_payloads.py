@@ -0,0 +1,78 @@
+"""Compares event body handling before and after the pass-through fast path
+
+The old path evaluated the body into a dict and let SQLAlchemy serialize it
+again for the JSON column. The new path validates the body once and hands the
+original text to the column. Both are measured up to the value bound to the
+INSERT, without a database.
+
+    python benchmarks/bench_payloads.py
+"""
+import json
+import sys
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+import payloads
+from models import JSONPayload
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+ROUNDS = 20000
+
+
+def make_body(items: int) -> bytes:
+    return json.dumps({
+        "user_id": 42,
+        "username": "cooluser",
+        "email": "cool.user@example.com",
+        "tags": [f"tag-{i}" for i in range(items)],
+        "attributes": {f"key_{i}": {"value": i, "label": f"label {i}"} for i in range(items)}
+    }).encode()
+
+
+def make_message(body: bytes):
+    message = Mock()
+    message.body = body
+    message.content_type = payloads.JSON_CONTENT_TYPE
+    return message
+
+
+def old_path(message, bind):
+    return bind(eval(message.body.decode()))
+
+
+def new_path(message, bind):
+    return bind(payloads.event_payload(message))
+
+
+def measure(path, message, bind) -> float:
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        path(message, bind)
+    return time.perf_counter() - started
+
+
+def bind_processor(json_serializer):
+    dialect = asyncpg_dialect(json_serializer=json_serializer)
+    return JSONPayload().dialect_impl(dialect).bind_processor(dialect)
+
+
+def main():
+    # The old path used the stock serializer of the default engine settings
+    old_bind = bind_processor(json.dumps)
+    new_bind = bind_processor(payloads.dumps)
+
+    print(f"orjson available: {payloads.orjson is not None}")
+    print(f"{'body bytes':>10} {'old MB/s':>10} {'new MB/s':>10} {'speedup':>8}")
+    for items in (5, 50, 500):
+        message = make_message(make_body(items))
+        size = len(message.body) * ROUNDS / 1024 / 1024
+        old = measure(old_path, message, old_bind)
+        new = measure(new_path, message, new_bind)
+        print(f"{len(message.body):>10} {size / old:>10.1f} {size / new:>10.1f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import wraps
+from typing import Awaitable, Callable, Deque, Dict, List, Tuple
+from aio_pika.abc import AbstractIncomingMessage
+from pydantic import BaseModel
+
+
+class QueueConfig(BaseModel):
+    # Unacked messages the broker may push to this consumer
+    prefetch_count: int = 100
+    # Handlers allowed to run at the same time
+    max_concurrency: int = 10
+    # Total body size of messages being handled at once. RabbitMQ ignores
+    # prefetch_size, so the byte limit is enforced in process
+    max_inflight_bytes: int | None = 64 * 1024 * 1024
+
+
+class InflightLimiter:
+    """Bounds how many messages, and how many body bytes, are handled at once
+
+    A message larger than `max_inflight_bytes` is still let through when
+    nothing else is in flight, so it cannot block the consumer forever.
+    """
+
+    def __init__(self, max_concurrency: int, max_inflight_bytes: int | None = None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self.max_concurrency = max_concurrency
+        self.max_inflight_bytes = max_inflight_bytes
+        self.inflight = 0
+        self.inflight_bytes = 0
+        # Handlers started, including those still waiting for a slot
+        self.pending = 0
+
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._released = asyncio.Condition()
+
+    @classmethod
+    def from_config(cls, config: QueueConfig) -> "InflightLimiter":
+        return cls(config.max_concurrency, config.max_inflight_bytes)
+
+    def _fits(self, size: int) -> bool:
+        if self.max_inflight_bytes is None or self.inflight_bytes == 0:
+            return True
+        return self.inflight_bytes + size <= self.max_inflight_bytes
+
+    @asynccontextmanager
+    async def acquire(self, size: int = 0):
+        await self._slots.acquire()
+        try:
+            async with self._released:
+                await self._released.wait_for(lambda: self._fits(size))
+                self.inflight_bytes += size
+        except BaseException:
+            self._slots.release()
+            raise
+
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            async with self._released:
+                self.inflight_bytes -= size
+                self._released.notify_all()
+            self._slots.release()
+
+    async def wait_idle(self):
+        """Waits until every started handler, running or waiting, has finished"""
+        async with self._released:
+            await self._released.wait_for(lambda: self.pending == 0)
+
+    @asynccontextmanager
+    async def tracking(self):
+        """Counts a handler as pending so `wait_idle` waits for it"""
+        self.pending += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+            async with self._released:
+                self._released.notify_all()
+
+    def track(self, handler: Callable[[AbstractIncomingMessage], Awaitable[None]]) -> Callable[[AbstractIncomingMessage], Awaitable[None]]:
+        """Tracks the handler for draining only, it acquires slots itself"""
+        @wraps(handler)
+        async def tracked(message: AbstractIncomingMessage):
+            async with self.tracking():
+                await handler(message)
+        return tracked
+
+    def wrap(self, handler: Callable[[AbstractIncomingMessage], Awaitable[None]]) -> Callable[[AbstractIncomingMessage], Awaitable[None]]:
+        @wraps(handler)
+        async def limited(message: AbstractIncomingMessage):
+            async with self.tracking():
+                async with self.acquire(len(message.body)):
+                    await handler(message)
+        return limited
+
+
+class Bulkheads:
+    """Separate concurrency limits per name, so one kind of work cannot take every slot
+
+    `acquire` returns the release function instead of being a context
+    manager, so a slot can outlive the handler that took it, e.g. while a
+    timed out thread keeps running.
+    """
+
+    def __init__(self):
+        self._semaphores: Dict[str, Tuple[int, asyncio.Semaphore]] = {}
+        self.inflight: Dict[str, int] = {}
+
+    def _semaphore(self, name: str, limit: int) -> asyncio.Semaphore:
+        current = self._semaphores.get(name)
+        if current is None or current[0] != limit:
+            # A limit changed by a hot reload starts a fresh semaphore. Holders
+            # of the old one release to it
+            current = self._semaphores[name] = (limit, asyncio.Semaphore(limit))
+        return current[1]
+
+    async def acquire(self, name: str, limit: int | None) -> Callable[[], None]:
+        semaphore = self._semaphore(name, limit) if limit is not None else None
+        if semaphore is not None:
+            await semaphore.acquire()
+        self.inflight[name] = self.inflight.get(name, 0) + 1
+
+        released = False
+
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            self.inflight[name] -= 1
+            if semaphore is not None:
+                semaphore.release()
+        return release
+
+
+class PriorityClass(BaseModel):
+    name: str
+    # Messages with at least this priority belong to the class, unless a
+    # class with a higher minimum takes them
+    min_priority: int = 0
+    # Share of the slots the class gets while every class has work waiting
+    weight: int = 1
+
+
+DEFAULT_PRIORITY_CLASSES = [
+    PriorityClass(name="high", min_priority=7, weight=6),
+    PriorityClass(name="normal", min_priority=3, weight=3),
+    PriorityClass(name="low", min_priority=0, weight=1),
+]
+
+
+class WeightedFairScheduler:
+    """Shares a fixed number of slots across priority classes
+
+    While a slot is free it is taken at once. When all are busy, waiters
+    queue per class and every freed slot is handed to a class picked by
+    smooth weighted round robin among the classes with waiters. With weights
+    6/3/1 and all classes backlogged, high, normal and low get 60%, 30% and
+    10% of the slots, so low priority work is slowed but never starved.
+    """
+
+    def __init__(self, max_concurrency: int, classes: List[PriorityClass] = DEFAULT_PRIORITY_CLASSES):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if not classes:
+            raise ValueError("At least one priority class is required")
+
+        self.max_concurrency = max_concurrency
+        self.classes = sorted(classes, key=lambda priority_class: priority_class.min_priority, reverse=True)
+        self.inflight = 0
+        self.granted: Dict[str, int] = {priority_class.name: 0 for priority_class in self.classes}
+
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {priority_class.name: deque() for priority_class in self.classes}
+        self._current: Dict[str, int] = {priority_class.name: 0 for priority_class in self.classes}
+
+    @classmethod
+    def from_config(cls, config: QueueConfig, classes: List[PriorityClass]) -> "WeightedFairScheduler":
+        return cls(config.max_concurrency, classes)
+
+    def classify(self, priority: int | None) -> str:
+        priority = priority or 0
+        for priority_class in self.classes:
+            if priority >= priority_class.min_priority:
+                return priority_class.name
+        return self.classes[-1].name
+
+    @property
+    def waiting(self) -> Dict[str, int]:
+        return {name: len(waiters) for name, waiters in self._waiters.items()}
+
+    def _pick(self) -> str | None:
+        backlogged = [priority_class for priority_class in self.classes if self._waiters[priority_class.name]]
+        if not backlogged:
+            return None
+        total = sum(priority_class.weight for priority_class in backlogged)
+        for priority_class in backlogged:
+            self._current[priority_class.name] += priority_class.weight
+        chosen = max(backlogged, key=lambda priority_class: self._current[priority_class.name])
+        self._current[chosen.name] -= total
+        return chosen.name
+
+    def _release(self):
+        # Hand the slot straight to the next waiter, inflight stays the same
+        while (name := self._pick()) is not None:
+            waiter = self._waiters[name].popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.inflight -= 1
+
+    @asynccontextmanager
+    async def acquire(self, class_name: str):
+        if self.inflight < self.max_concurrency and not any(self._waiters.values()):
+            self.inflight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[class_name].append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Cancelled right after being handed a slot, pass it on
+                    self._release()
+                elif waiter in self._waiters[class_name]:
+                    self._waiters[class_name].remove(waiter)
+                raise
+
+        self.granted[class_name] += 1
+        try:
+            yield
+        finally:
+            self._release()
@@ -0,0 +1,122 @@
+import asyncio
+import enum
+import importlib
+import inspect
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List
+
+
+class ExecutionBackend(str, enum.Enum):
+    """Where a task's `execute` runs, declared by the module as EXECUTION_BACKEND"""
+    ASYNC = "async"      # awaited on the service event loop
+    THREAD = "thread"    # blocking I/O or code that releases the GIL
+    PROCESS = "process"  # CPU-bound work
+
+
+def _call(execute, payload: Dict[str, Any]) -> Any:
+    result = execute(payload)
+    if inspect.isawaitable(result):
+        return asyncio.run(result)
+    return result
+
+
+# Modules imported by this worker process, with the file mtime they were
+# imported at, so hot reloaded tasks are re-imported on their next call
+_worker_modules: Dict[str, float | None] = {}
+
+
+def _warm_worker(package: str, module_mtimes: Dict[str, float | None]):
+    importlib.import_module(package)
+    for module_path, mtime in module_mtimes.items():
+        try:
+            importlib.import_module(module_path)
+            _worker_modules[module_path] = mtime
+        except Exception:
+            logging.exception(f"Error importing task module {module_path} in worker {os.getpid()}")
+
+
+def _call_in_worker(module_path: str, mtime: float | None, payload: Any, function: str = "execute") -> Any:
+    module = importlib.import_module(module_path)
+    if module_path in _worker_modules and _worker_modules[module_path] != mtime:
+        module = importlib.reload(module)
+    _worker_modules[module_path] = mtime
+    return _call(getattr(module, function), payload)
+
+
+class TaskExecutor:
+    """Runs task `execute` callables on the backend their module declares
+
+    The process pool is forked and warmed up by `start`, each worker importing
+    the whole tasks package, so CPU-bound tasks don't pay import cost on the
+    first call. Process tasks receive their payload and return their result
+    through pickling.
+    """
+
+    def __init__(self, registry, thread_workers: int = 8, process_workers: int | None = None):
+        self.registry = registry
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers or os.cpu_count() or 1
+
+        self._thread_pool: ThreadPoolExecutor | None = None
+        self._process_pool: ProcessPoolExecutor | None = None
+
+    def _uses(self, backend: ExecutionBackend) -> bool:
+        return any(self.registry.get(name).backend == backend for name in self.registry.names)
+
+    def start(self):
+        if self._uses(ExecutionBackend.THREAD):
+            self._get_thread_pool()
+        if self._uses(ExecutionBackend.PROCESS):
+            pool = self._get_process_pool()
+            # Submitting a job per worker forks them all now rather than on demand
+            for future in [pool.submit(os.getpid) for _ in range(self.process_workers)]:
+                future.result()
+            logging.info(f"Started {self.process_workers} task worker processes")
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(self.thread_workers, thread_name_prefix="task")
+        return self._thread_pool
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            module_mtimes = {
+                f"{self.registry.package}.{name}": self.registry.get(name).mtime
+                for name in self.registry.names
+            }
+            self._process_pool = ProcessPoolExecutor(
+                self.process_workers,
+                initializer=_warm_worker,
+                initargs=(self.registry.package, module_mtimes)
+            )
+        return self._process_pool
+
+    async def run(self, definition, payload: Dict[str, Any]) -> Any:
+        return await self._run(definition, definition.execute, "execute", payload)
+
+    async def run_batch(self, definition, payloads: List[Dict[str, Any]]) -> List[Any]:
+        return await self._run(definition, definition.execute_batch, "execute_batch", payloads)
+
+    async def _run(self, definition, function, function_name: str, argument: Any) -> Any:
+        if definition.backend == ExecutionBackend.ASYNC:
+            return await function(argument)
+
+        loop = asyncio.get_running_loop()
+        if definition.backend == ExecutionBackend.THREAD:
+            return await loop.run_in_executor(self._get_thread_pool(), partial(_call, function, argument))
+
+        module_path = f"{self.registry.package}.{definition.name}"
+        return await loop.run_in_executor(
+            self._get_process_pool(), partial(_call_in_worker, module_path, definition.mtime, argument, function_name)
+        )
+
+    def shutdown(self):
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=True)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True)
+            self._process_pool = None
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+from models import Status, TaskStore
+
+# (producer_app, correlation_id, task_name), the task_store unique key
+TaskKey = Tuple[str, str, str]
+
+
+@dataclass(frozen=True)
+class TaskOutcome:
+    id_task: Any
+    status: Status
+    result: Dict[str, Any] | None = None
+    error: str | None = None
+
+    @classmethod
+    def from_task(cls, task: TaskStore) -> "TaskOutcome":
+        return cls(task.id_task, task.status, task.result, task.error)
+
+
+class CompletedTasks:
+    """LRU of the outcomes of recently finished tasks
+
+    Answers most redeliveries without a database round trip. Entries that
+    were evicted are still caught by the unique constraint on task_store.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._outcomes: OrderedDict[TaskKey, TaskOutcome] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._outcomes)
+
+    def get(self, key: TaskKey) -> TaskOutcome | None:
+        outcome = self._outcomes.get(key)
+        if outcome is not None:
+            self._outcomes.move_to_end(key)
+        return outcome
+
+    def put(self, key: TaskKey, outcome: TaskOutcome):
+        if self.max_size <= 0:
+            return
+        self._outcomes[key] = outcome
+        self._outcomes.move_to_end(key)
+        while len(self._outcomes) > self.max_size:
+            self._outcomes.popitem(last=False)
@@ -1,19 +1,82 @@
 import asyncio
-from service import RabbitMQService, ConfigModel
+from service import ConfigModel
+from concurrency import QueueConfig, PriorityClass, DEFAULT_PRIORITY_CLASSES
+from supervisor import Supervisor, run_service
 import logging
 import os
 
-async def main():
-    # Logging
-    logging.basicConfig(level=logging.INFO)
+def parse_priority_classes(value: str | None) -> list[PriorityClass]:
+    """Reads 'name:min_priority:weight' entries separated by commas"""
+    if not value:
+        return DEFAULT_PRIORITY_CLASSES
+    classes = []
+    for entry in value.split(','):
+        name, min_priority, weight = entry.strip().split(':')
+        classes.append(PriorityClass(name=name, min_priority=int(min_priority), weight=int(weight)))
+    return classes
 
+def load_config() -> ConfigModel:
     rabbitmq_url = os.getenv('RABBITMQ_URL')
     database_url = os.getenv('DATABASE_URL')
-    tasks_folder = os.getenv('TASKS_PACKAGE')
+    tasks_folder = os.getenv('TASKS_PACKAGE', 'tasks')
+
+    return ConfigModel(
+        rabbitmq_url,
+        database_url,
+        tasks_folder,
+        tasks_hot_reload=os.getenv('TASKS_HOT_RELOAD', 'false').lower() == 'true',
+        task_thread_workers=int(os.getenv('TASK_THREAD_WORKERS', 8)),
+        # Defaults to the CPU count. Under the supervisor it is the total,
+        # divided among the workers' process pools
+        task_process_workers=int(os.getenv('TASK_PROCESS_WORKERS', 0)) or None,
+        task_status_write_behind=os.getenv('TASK_STATUS_WRITE_BEHIND', 'false').lower() == 'true',
+        task_max_priority=int(os.getenv('TASK_MAX_PRIORITY', 0)) or None,
+        task_priority_classes=parse_priority_classes(os.getenv('TASK_PRIORITY_CLASSES')),
+        task_dedup_cache_size=int(os.getenv('TASK_DEDUP_CACHE_SIZE', 10000)),
+        task_lease_seconds=float(os.getenv('TASK_LEASE_SECONDS', 600)),
+        event_batching=os.getenv('EVENT_BATCHING', 'false').lower() == 'true',
+        event_batch_size=int(os.getenv('EVENT_BATCH_SIZE', 500)),
+        event_batch_linger_ms=int(os.getenv('EVENT_BATCH_LINGER_MS', 50)),
+        event_partitioning=os.getenv('EVENT_PARTITIONING') or None,
+        event_retention_days=int(os.getenv('EVENT_RETENTION_DAYS', 0)) or None,
+        event_retention_action=os.getenv('EVENT_RETENTION_ACTION', 'drop'),
+        event_archive_schema=os.getenv('EVENT_ARCHIVE_SCHEMA') or None,
+        event_queue=QueueConfig(
+            prefetch_count=int(os.getenv('EVENT_PREFETCH', 1000)),
+            max_concurrency=int(os.getenv('EVENT_CONCURRENCY', 50)),
+            max_inflight_bytes=int(os.getenv('EVENT_MAX_INFLIGHT_BYTES', 64 * 1024 * 1024))
+        ),
+        task_queue=QueueConfig(
+            prefetch_count=int(os.getenv('TASK_PREFETCH', 20)),
+            max_concurrency=int(os.getenv('TASK_CONCURRENCY', 10)),
+            max_inflight_bytes=int(os.getenv('TASK_MAX_INFLIGHT_BYTES', 64 * 1024 * 1024))
+        ),
+        storage_backend=os.getenv('STORAGE_BACKEND') or None,
+        database_echo=os.getenv('DATABASE_ECHO', 'false').lower() == 'true',
+        database_pool_size=int(os.getenv('DATABASE_POOL_SIZE', 20)),
+        database_max_overflow=int(os.getenv('DATABASE_MAX_OVERFLOW', 10)),
+        database_statement_cache_size=int(os.getenv('DATABASE_STATEMENT_CACHE_SIZE', 1024)),
+        file_log_dir=os.getenv('FILE_LOG_DIR', 'event_log'),
+        file_log_segment_bytes=int(os.getenv('FILE_LOG_SEGMENT_BYTES', 64 * 1024 * 1024)),
+        file_log_fsync_ms=int(os.getenv('FILE_LOG_FSYNC_MS', 5)),
+        file_log_offload_url=os.getenv('FILE_LOG_OFFLOAD_URL') or None,
+        http_port=int(os.getenv('HTTP_PORT', 0)) or None,
+        metrics_enabled=os.getenv('METRICS_ENABLED', 'false').lower() == 'true',
+        metrics_queue_poll_interval=float(os.getenv('METRICS_QUEUE_POLL_INTERVAL', 15)),
+        drain_timeout=float(os.getenv('DRAIN_TIMEOUT', 30))
+    )
+
+def main():
+    # Logging
+    logging.basicConfig(level=logging.INFO)
+
+    config = load_config()
 
-    config = ConfigModel(rabbitmq_url, database_url, tasks_folder)
-    service = RabbitMQService(config)
-    await service.run()
+    # Supervisor mode runs one service per worker process, WORKERS defaults to the CPU count
+    if os.getenv('SUPERVISOR', 'false').lower() == 'true':
+        Supervisor(config, workers=int(os.getenv('WORKERS', 0)) or None).run()
+    else:
+        asyncio.run(run_service(config))
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    main()
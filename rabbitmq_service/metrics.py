@@ -0,0 +1,170 @@
+import bisect
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format_labels(self, values: LabelValues, extra: Dict[str, str] | None = None) -> str:
+        pairs = list(zip(self.labels, values)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in pairs) + "}"
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines of the exposition format, one per label set"""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}", *self.samples()]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """Gauge set explicitly, or read from `function` at scrape time"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 function: Callable[[], Dict[LabelValues, float]] | None = None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        self._values[self._key(labels)] = value
+
+    def samples(self) -> List[str]:
+        values = self.function() if self.function is not None else self._values
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in values.items()]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: counts per bucket (last one is +Inf), sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': str(bound)})} {cumulative}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {self._sums[key]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ServiceMetrics:
+    """Throughput, per-stage latency and backlog of a RabbitMQService"""
+
+    def __init__(self, prefix: str = "rabbitmq_service"):
+        self.registry = MetricsRegistry()
+        register = self.registry.register
+
+        self.messages = register(Counter(
+            f"{prefix}_messages_total", "Messages received, per queue", ("queue",)))
+        self.acks = register(Counter(
+            f"{prefix}_acks_total", "Messages settled, per queue and outcome (ack, reject, nack)", ("queue", "outcome")))
+        self.decode_seconds = register(Histogram(
+            f"{prefix}_decode_seconds", "Time to decode and validate a message body", ("queue",)))
+        self.db_seconds = register(Histogram(
+            f"{prefix}_db_seconds", "Time of a database write including commit, per operation", ("operation",)))
+        self.task_seconds = register(Histogram(
+            f"{prefix}_task_execution_seconds", "Time spent in task execute, per task and final status", ("task_name", "status")))
+        self.duplicate_tasks = register(Counter(
+            f"{prefix}_duplicate_tasks_total", "Redelivered tasks acked with their stored outcome", ("task_name",)))
+        self.task_wait_seconds = register(Histogram(
+            f"{prefix}_task_wait_seconds", "Time from delivery until a task gets its slots, per task", ("task_name",)))
+        self.task_timeouts = register(Counter(
+            f"{prefix}_task_timeouts_total", "Tasks failed for exceeding their TIMEOUT", ("task_name",)))
+        self.batch_size = register(Histogram(
+            f"{prefix}_batch_size", "Items per flushed batch", ("batch",), buckets=SIZE_BUCKETS))
+        self.queue_depth = register(Gauge(
+            f"{prefix}_queue_depth", "Ready messages in the queue, polled with a passive declare", ("queue",)))
+        self.queue_consumers = register(Gauge(
+            f"{prefix}_queue_consumers", "Consumers attached to the queue", ("queue",)))
+
+    def add_gauge(self, name: str, documentation: str, labels: Tuple[str, ...],
+                  function: Callable[[], Dict[LabelValues, float]]) -> Gauge:
+        return self.registry.register(Gauge(name, documentation, labels, function))
+
+    def render(self) -> str:
+        return self.registry.render()
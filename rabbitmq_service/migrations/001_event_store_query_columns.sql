@@ -0,0 +1,36 @@
+-- Upgrades an event_store table created before the query columns (Postgres).
+-- init_db only creates missing tables, it never alters existing ones, and
+-- inserts into an old table fail on the missing columns.
+--
+--     psql "$DATABASE_URL" -f migrations/001_event_store_query_columns.sql
+--
+-- Events stored before the upgrade keep NULL in the extracted columns.
+-- Converting an existing table to a partitioned one is not covered: create a
+-- new partitioned table with init_db and copy the rows over instead.
+
+BEGIN;
+
+-- created_at is part of the primary key, partitioned tables need the
+-- partition key in every unique constraint
+ALTER TABLE event_store DROP CONSTRAINT IF EXISTS event_store_pkey;
+ALTER TABLE event_store ADD PRIMARY KEY (id_event_store, created_at);
+
+-- Payloads are stored as JSONB
+ALTER TABLE event_store ALTER COLUMN payload TYPE JSONB USING payload::jsonb;
+
+ALTER TABLE event_store
+    ADD COLUMN IF NOT EXISTS routing_key VARCHAR,
+    ADD COLUMN IF NOT EXISTS event_type VARCHAR,
+    ADD COLUMN IF NOT EXISTS entity_name VARCHAR,
+    ADD COLUMN IF NOT EXISTS event_key VARCHAR;
+
+-- On a large, busy table build these with CREATE INDEX CONCURRENTLY outside
+-- the transaction instead, plain CREATE INDEX blocks inserts until it is done
+CREATE INDEX IF NOT EXISTS ix_event_store_created_at ON event_store (created_at);
+CREATE INDEX IF NOT EXISTS ix_event_store_correlation_id ON event_store (correlation_id);
+CREATE INDEX IF NOT EXISTS ix_event_store_routing_key_created_at ON event_store (routing_key, created_at);
+CREATE INDEX IF NOT EXISTS ix_event_store_entity_event_type_created_at ON event_store (entity_name, event_type, created_at);
+CREATE INDEX IF NOT EXISTS ix_event_store_entity_event_key_created_at ON event_store (entity_name, event_key, created_at);
+CREATE INDEX IF NOT EXISTS ix_event_store_producer_app_created_at ON event_store (producer_app, created_at);
+
+COMMIT;
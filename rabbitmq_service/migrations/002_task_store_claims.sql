@@ -0,0 +1,27 @@
+-- Upgrades a task_store table created before tasks ran once per
+-- (producer_app, correlation_id, task_name) (Postgres). The service refuses
+-- to start until the constraint and started_at exist.
+--
+--     psql "$DATABASE_URL" -f migrations/002_task_store_claims.sql
+
+-- Enum values cannot be added inside a transaction block before Postgres 12,
+-- and cannot be used by the transaction adding them after
+ALTER TYPE status ADD VALUE IF NOT EXISTS 'RUNNING' AFTER 'PENDING';
+
+BEGIN;
+
+-- When a run claimed its task, see TASK_LEASE_SECONDS
+ALTER TABLE task_store ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITH TIME ZONE;
+
+-- Fails if the table already holds duplicates. List them with
+--     SELECT producer_app, correlation_id, task_name, count(*) FROM task_store
+--     GROUP BY 1, 2, 3 HAVING count(*) > 1;
+-- and delete all but one row of each before running this again
+ALTER TABLE task_store ADD CONSTRAINT uq_task_store_producer_correlation_task
+    UNIQUE (producer_app, correlation_id, task_name);
+
+-- Statuses are filtered on, and payloads are stored as JSONB
+CREATE INDEX IF NOT EXISTS ix_task_store_status ON task_store (status);
+ALTER TABLE task_store ALTER COLUMN payload TYPE JSONB USING payload::jsonb;
+
+COMMIT;
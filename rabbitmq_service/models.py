@@ -1,26 +1,65 @@
 from datetime import datetime, timezone
 import uuid
 import enum
-from sqlalchemy import Column, String, DateTime, JSON, UUID, Enum as SQLEnum
+from sqlalchemy import Column, String, DateTime, JSON, UUID, Index, UniqueConstraint, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import TypeDecorator
+from payloads import RawJSON
 
 Base = declarative_base()
 
 # Statuses enum
 class Status(str, enum.Enum):
     PENDING = "pending"
+    RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
 
+class JSONPayload(TypeDecorator):
+    """JSON column, JSONB on Postgres, that stores RawJSON text as is"""
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(JSON())
+
+    def bind_processor(self, dialect):
+        serialize = self.impl_instance.bind_processor(dialect)
+
+        def process(value):
+            if isinstance(value, RawJSON):
+                return str(value)
+            return serialize(value) if serialize else value
+        return process
+
 class EventStore(Base):
     __tablename__ = 'event_store'
 
     id_event_store = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     correlation_id = Column(String, nullable=False)
     producer_app = Column(String, nullable=False)
-    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    # Part of the primary key because Postgres requires the partition key in
+    # every unique constraint of a partitioned table
+    created_at = Column(DateTime(timezone=True), primary_key=True, nullable=False, index=True, default=lambda: datetime.now(timezone.utc))
     headers = Column(JSON, nullable=False)
-    payload = Column(JSON, nullable=False)
+    payload = Column(JSONPayload, nullable=False)
+
+    # Extracted at ingestion so events can be found without scanning JSON
+    routing_key = Column(String, nullable=True)
+    event_type = Column(String, nullable=True)
+    entity_name = Column(String, nullable=True)
+    event_key = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_event_store_correlation_id", "correlation_id"),
+        Index("ix_event_store_routing_key_created_at", "routing_key", "created_at"),
+        Index("ix_event_store_entity_event_type_created_at", "entity_name", "event_type", "created_at"),
+        Index("ix_event_store_entity_event_key_created_at", "entity_name", "event_key", "created_at"),
+        Index("ix_event_store_producer_app_created_at", "producer_app", "created_at"),
+    )
 
 class TaskStore(Base):
     __tablename__ = 'task_store'
@@ -30,7 +69,15 @@ class TaskStore(Base):
     producer_app = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
     task_name = Column(String, nullable=False)
-    payload = Column(JSON, nullable=False)
-    status = Column(SQLEnum(Status), nullable=False)
+    payload = Column(JSONPayload, nullable=False)
+    status = Column(SQLEnum(Status), nullable=False, index=True)
+    # Set when a run claims the task. A RUNNING task claimed longer ago than
+    # the lease is assumed lost and can be claimed again
+    started_at = Column(DateTime(timezone=True), nullable=True)
     result = Column(JSON, nullable=True)
-    error = Column(String, nullable=True) 
\ No newline at end of file
+    error = Column(String, nullable=True)
+
+    __table_args__ = (
+        # A redelivered task message finds its first run instead of starting another
+        UniqueConstraint("producer_app", "correlation_id", "task_name", name="uq_task_store_producer_correlation_task"),
+    ) 
\ No newline at end of file
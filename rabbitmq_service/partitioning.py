@@ -0,0 +1,167 @@
+import asyncio
+import enum
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from models import EventStore
+
+# Serializes partition maintenance across workers sharing the database
+MAINTENANCE_LOCK_ID = 0x65766e74
+
+DEFAULT_PARTITION_SUFFIX = "default"
+
+
+class PartitionInterval(str, enum.Enum):
+    DAILY = "daily"
+    MONTHLY = "monthly"
+
+
+class RetentionAction(str, enum.Enum):
+    DROP = "drop"      # data is gone
+    DETACH = "detach"  # partition becomes a standalone table, ready to archive
+
+
+class EventPartitioner:
+    """Range partitions event_store on created_at and enforces retention
+
+    On Postgres the table is created as PARTITION BY RANGE, partitions are
+    created `ahead` periods in advance and expired ones are dropped or
+    detached whole. Partitioning only applies when the table is created by
+    init_db; an existing unpartitioned table, or SQLite, falls back to
+    deleting expired rows through the created_at index.
+    """
+
+    def __init__(self, engine: AsyncEngine | None, interval: PartitionInterval | None = None, ahead: int = 3,
+                 retention_days: int | None = None, retention_action: RetentionAction = RetentionAction.DROP,
+                 archive_schema: str | None = None):
+        self.engine = engine
+        self.interval = interval
+        self.ahead = ahead
+        self.retention_days = retention_days
+        self.retention_action = retention_action
+        self.archive_schema = archive_schema
+        self.table = EventStore.__table__.name
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval is not None and self.engine is not None and self.engine.dialect.name == "postgresql"
+
+    def prepare_metadata(self):
+        """Must run before create_all so the table is created partitioned"""
+        if self.enabled:
+            EventStore.__table__.dialect_options["postgresql"]["partition_by"] = "RANGE (created_at)"
+
+    def _period_start(self, moment: datetime) -> datetime:
+        moment = moment.astimezone(timezone.utc)
+        if self.interval == PartitionInterval.DAILY:
+            return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def _next_period(self, start: datetime) -> datetime:
+        if self.interval == PartitionInterval.DAILY:
+            return start + timedelta(days=1)
+        return (start + timedelta(days=32)).replace(day=1)
+
+    def partition_name(self, start: datetime) -> str:
+        suffix = f"{start:%Y%m%d}" if self.interval == PartitionInterval.DAILY else f"{start:%Y%m}"
+        return f"{self.table}_p{suffix}"
+
+    def _partition_start(self, name: str) -> datetime | None:
+        suffix = name.removeprefix(f"{self.table}_p")
+        fmt = "%Y%m%d" if self.interval == PartitionInterval.DAILY else "%Y%m"
+        try:
+            return datetime.strptime(suffix, fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+
+    async def _is_partitioned(self, conn) -> bool:
+        relkind = await conn.scalar(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": self.table}
+        )
+        return relkind == "p"
+
+    async def _partitions(self, conn) -> List[str]:
+        result = await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ), {"table": self.table})
+        return [row.relname for row in result]
+
+    async def _create_partitions(self, conn, now: datetime) -> List[str]:
+        existing = set(await self._partitions(conn))
+        created = []
+
+        default = f"{self.table}_{DEFAULT_PARTITION_SUFFIX}"
+        if default not in existing:
+            await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {default} PARTITION OF {self.table} DEFAULT"))
+            created.append(default)
+
+        start = self._period_start(now)
+        for _ in range(self.ahead + 1):
+            end = self._next_period(start)
+            name = self.partition_name(start)
+            if name not in existing:
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {self.table} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+                created.append(name)
+            start = end
+        return created
+
+    async def _expire_partitions(self, conn, cutoff: datetime) -> List[str]:
+        expired = []
+        for name in await self._partitions(conn):
+            start = self._partition_start(name)
+            if start is None or self._next_period(start) > cutoff:
+                continue
+
+            if self.retention_action == RetentionAction.DROP:
+                await conn.execute(text(f"DROP TABLE {name}"))
+            else:
+                await conn.execute(text(f"ALTER TABLE {self.table} DETACH PARTITION {name}"))
+                if self.archive_schema:
+                    await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.archive_schema}"))
+                    await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {self.archive_schema}"))
+            expired.append(name)
+        return expired
+
+    async def maintain(self, now: datetime | None = None) -> Dict[str, List[str] | int]:
+        """Creates upcoming partitions and applies retention. Safe to run from every worker"""
+        now = now or datetime.now(timezone.utc)
+        cutoff = now - timedelta(days=self.retention_days) if self.retention_days is not None else None
+        report: Dict[str, List[str] | int] = {"created": [], "expired": [], "deleted_rows": 0}
+        if self.engine is None:
+            # Storage without a database, nothing to maintain
+            return report
+
+        async with self.engine.begin() as conn:
+            if self.enabled:
+                await conn.execute(text("SELECT pg_advisory_xact_lock(:lock)"), {"lock": MAINTENANCE_LOCK_ID})
+
+            if self.enabled and await self._is_partitioned(conn):
+                report["created"] = await self._create_partitions(conn, now)
+                if cutoff is not None:
+                    report["expired"] = await self._expire_partitions(conn, cutoff)
+            elif cutoff is not None:
+                if self.enabled:
+                    logging.warning(f"{self.table} exists unpartitioned, applying retention with DELETE")
+                result = await conn.execute(delete(EventStore).where(EventStore.created_at < cutoff))
+                report["deleted_rows"] = result.rowcount
+
+        if report["created"] or report["expired"] or report["deleted_rows"]:
+            logging.info(
+                f"Event store maintenance: created {report['created']}, "
+                f"{self.retention_action.value} {report['expired']}, deleted {report['deleted_rows']} rows"
+            )
+        return report
+
+    async def run(self, interval: float = 3600.0):
+        while True:
+            try:
+                await self.maintain()
+            except Exception:
+                logging.exception("Error maintaining event store partitions")
+            await asyncio.sleep(interval)
@@ -0,0 +1,78 @@
+import ast
+import json
+from typing import Any, Dict
+from aio_pika.abc import AbstractIncomingMessage
+from event_driven.message.codecs import codecs
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+JSON_CONTENT_TYPE = "application/json"
+
+
+class RawJSON(str):
+    """JSON text that has already been validated
+
+    Written to JSON columns as is instead of being serialized a second time.
+    """
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+
+def _is_encoded(message: AbstractIncomingMessage) -> bool:
+    # Compressed or in a non JSON format of the codec registry (MessagePack)
+    return bool(message.content_encoding) or (
+        message.content_type in codecs.serializers and message.content_type != JSON_CONTENT_TYPE
+    )
+
+
+def _decode_legacy(message: AbstractIncomingMessage) -> Any:
+    # Producers that predate content types sent the repr() of a dict. Parse it
+    # as a Python literal, never as code
+    return ast.literal_eval(message.body.decode())
+
+
+def event_payload(message: AbstractIncomingMessage) -> RawJSON | Any:
+    """Validates an event body and returns it for storage without a round trip
+
+    JSON bodies come back as RawJSON holding the original text. Compressed
+    and MessagePack bodies are decoded, the column serializes them as JSON.
+    Legacy bodies without a content type fall back to a literal parse.
+    """
+    if _is_encoded(message):
+        return codecs.decode(message.body, message.content_type, message.content_encoding)
+    try:
+        loads(message.body)
+        return RawJSON(message.body.decode())
+    except ValueError:
+        if message.content_type == JSON_CONTENT_TYPE:
+            raise
+    return _decode_legacy(message)
+
+
+def task_body(message: AbstractIncomingMessage) -> Dict[str, Any]:
+    if _is_encoded(message):
+        body = codecs.decode(message.body, message.content_type, message.content_encoding)
+    else:
+        try:
+            body = loads(message.body)
+        except ValueError:
+            if message.content_type == JSON_CONTENT_TYPE:
+                raise
+            body = _decode_legacy(message)
+    # event_driven's task_message sends the task input as "arguments"
+    if "payload" not in body and "arguments" in body:
+        body["payload"] = body.pop("arguments")
+    return body
@@ -0,0 +1,73 @@
+import base64
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Tuple
+from pydantic import BaseModel
+from sqlalchemy import Select, select, tuple_
+from models import EventStore
+
+Position = Tuple[datetime, uuid.UUID]
+
+
+class EventFilter(BaseModel):
+    routing_key: str | None = None
+    event_type: str | None = None
+    entity_name: str | None = None
+    event_key: str | None = None
+    producer_app: str | None = None
+    correlation_id: str | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+
+
+def encode_cursor(position: Position) -> str:
+    created_at, id_event_store = position
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{id_event_store}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Position:
+    try:
+        created_at, id_event_store = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(id_event_store)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def event_query(filters: EventFilter, after: Position | None = None, limit: int | None = None) -> Select:
+    """Events matching `filters` in (created_at, id) order, starting after `after`
+
+    Seeking past the last seen position instead of using OFFSET keeps every
+    page an index range scan, however deep the export goes.
+    """
+    query = select(EventStore)
+
+    for column in ("routing_key", "event_type", "entity_name", "event_key", "producer_app", "correlation_id"):
+        value = getattr(filters, column)
+        if value is not None:
+            query = query.where(getattr(EventStore, column) == value)
+    if filters.since is not None:
+        query = query.where(EventStore.created_at >= filters.since)
+    if filters.until is not None:
+        query = query.where(EventStore.created_at < filters.until)
+    if after is not None:
+        query = query.where(tuple_(EventStore.created_at, EventStore.id_event_store) > tuple_(*after))
+
+    query = query.order_by(EventStore.created_at, EventStore.id_event_store)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def event_to_dict(event: EventStore) -> Dict[str, Any]:
+    return {
+        "id_event_store": str(event.id_event_store),
+        "correlation_id": event.correlation_id,
+        "producer_app": event.producer_app,
+        "created_at": event.created_at.isoformat(),
+        "routing_key": event.routing_key,
+        "event_type": event.event_type,
+        "entity_name": event.entity_name,
+        "event_key": event.event_key,
+        "headers": event.headers,
+        "payload": event.payload,
+    }
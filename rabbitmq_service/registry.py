@@ -0,0 +1,172 @@
+import asyncio
+import importlib
+import logging
+import os
+import pkgutil
+import time
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Any, Awaitable, Callable, Dict, List
+from executors import ExecutionBackend
+
+
+@dataclass
+class TaskDefinition:
+    name: str
+    module: ModuleType
+    execute: Callable[[Dict[str, Any]], Awaitable[Any]]
+    mtime: float | None
+    backend: ExecutionBackend = ExecutionBackend.ASYNC
+    # Declared by the module as MAX_CONCURRENCY, TIMEOUT (seconds) and
+    # DEDICATED_QUEUE. None means unlimited
+    max_concurrency: int | None = None
+    timeout: float | None = None
+    dedicated_queue: bool = False
+    # Optional execute_batch(payloads) returning one result, or exception,
+    # per payload. Tasks are grouped into batches of up to BATCH_SIZE, waiting
+    # at most BATCH_LINGER_MS for the batch to fill
+    execute_batch: Callable[[List[Dict[str, Any]]], Any] | None = None
+    batch_size: int = 100
+    batch_linger_ms: int = 10
+
+
+class TaskRegistry:
+    """Resolves task names to the `execute` callables of the tasks package
+
+    Every module directly inside the package is imported once by `load`, so
+    lookups are a dict access. With hot reload enabled `watch` polls module
+    mtimes and re-imports changed or new modules without a restart.
+    """
+
+    def __init__(self, package: str):
+        self.package = package
+        self._tasks: Dict[str, TaskDefinition] = {}
+
+    def __contains__(self, task_name: str) -> bool:
+        return task_name in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def get(self, task_name: str) -> TaskDefinition | None:
+        return self._tasks.get(task_name)
+
+    @property
+    def names(self) -> list[str]:
+        return sorted(self._tasks)
+
+    def _module_files(self) -> Dict[str, str | None]:
+        try:
+            package = importlib.import_module(self.package)
+        except ModuleNotFoundError:
+            logging.warning(f"Tasks package {self.package} not found, no tasks will be available")
+            return {}
+        files = {}
+        for module_info in pkgutil.iter_modules(package.__path__):
+            if module_info.ispkg:
+                path = os.path.join(module_info.module_finder.path, module_info.name, "__init__.py")
+            else:
+                path = os.path.join(module_info.module_finder.path, f"{module_info.name}.py")
+            files[module_info.name] = path if os.path.exists(path) else None
+        return files
+
+    @staticmethod
+    def _mtime(path: str | None) -> float | None:
+        try:
+            return os.stat(path).st_mtime if path else None
+        except OSError:
+            return None
+
+    def _load_module(self, task_name: str, path: str | None, reload: bool = False) -> TaskDefinition | None:
+        module_path = f"{self.package}.{task_name}"
+        try:
+            module = importlib.import_module(module_path)
+            if reload:
+                module = importlib.reload(module)
+        except Exception:
+            logging.exception(f"Error importing task module {module_path}")
+            return None
+
+        execute = getattr(module, "execute", None)
+        if not callable(execute):
+            logging.warning(f"Task module {module_path} has no execute function, skipping")
+            return None
+
+        try:
+            backend = ExecutionBackend(getattr(module, "EXECUTION_BACKEND", ExecutionBackend.ASYNC))
+        except ValueError:
+            logging.warning(f"Task module {module_path} declares unknown EXECUTION_BACKEND, skipping")
+            return None
+
+        execute_batch = getattr(module, "execute_batch", None)
+        max_concurrency = getattr(module, "MAX_CONCURRENCY", None)
+        timeout = getattr(module, "TIMEOUT", None)
+        batch_size = getattr(module, "BATCH_SIZE", 100)
+        if (max_concurrency is not None and max_concurrency < 1) or (timeout is not None and timeout <= 0) or batch_size < 1:
+            logging.warning(f"Task module {module_path} declares a non-positive MAX_CONCURRENCY, TIMEOUT or BATCH_SIZE, skipping")
+            return None
+
+        return TaskDefinition(
+            name=task_name,
+            module=module,
+            execute=execute,
+            mtime=self._mtime(path),
+            backend=backend,
+            max_concurrency=max_concurrency,
+            timeout=timeout,
+            dedicated_queue=bool(getattr(module, "DEDICATED_QUEUE", False)),
+            execute_batch=execute_batch if callable(execute_batch) else None,
+            batch_size=batch_size,
+            batch_linger_ms=getattr(module, "BATCH_LINGER_MS", 10)
+        )
+
+    def load(self):
+        started = time.monotonic()
+        tasks = {}
+        for task_name, path in self._module_files().items():
+            definition = self._load_module(task_name, path)
+            if definition is not None:
+                tasks[task_name] = definition
+        self._tasks = tasks
+
+        elapsed = (time.monotonic() - started) * 1000
+        logging.info(f"Loaded {len(tasks)} tasks from {self.package} in {elapsed:.1f}ms")
+
+    def refresh(self) -> int:
+        """Re-imports modules whose file changed, picks up new ones and drops removed ones
+
+        Returns the number of tasks that changed. A module that fails to import
+        keeps its previous version.
+        """
+        importlib.invalidate_caches()
+        files = self._module_files()
+        tasks = dict(self._tasks)
+        changed = 0
+
+        for task_name, path in files.items():
+            current = tasks.get(task_name)
+            if current is not None and current.mtime == self._mtime(path):
+                continue
+            definition = self._load_module(task_name, path, reload=current is not None)
+            if definition is not None:
+                tasks[task_name] = definition
+                changed += 1
+
+        for task_name in set(tasks) - set(files):
+            del tasks[task_name]
+            changed += 1
+
+        if changed:
+            self._tasks = tasks
+            logging.info(f"Reloaded {changed} tasks from {self.package}")
+        return changed
+
+    async def watch(self, interval: float = 2.0, on_change: Callable[[], Awaitable[Any]] | None = None):
+        """Refreshes every `interval` seconds until cancelled, awaiting `on_change` after a change"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.refresh() and on_change is not None:
+                    await on_change()
+            except Exception:
+                logging.exception(f"Error reloading tasks from {self.package}")
@@ -1,27 +1,129 @@
 import asyncio
+import contextlib
 import logging
-from typing import Any, Dict
+import time
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Tuple
 from aio_pika import connect_robust, IncomingMessage
 from aio_pika.abc import AbstractIncomingMessage
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 from event_driven.events_initialization import (
-    create_event_exchange, create_task_exchange,
-    EVENT_EXCHANGE, TASK_EXCHANGE, get_event_store_queue_name
+    create_event_exchange, create_task_exchange, parse_event_routing_key,
+    EVENT_EXCHANGE, TASK_EXCHANGE, get_event_store_queue_name,
+    get_dedicated_task_queue_name, get_dedicated_task_routing_key, get_named_task_routing_key, task_queue_arguments
 )
-from pydantic import BaseModel
-from models import Base, EventStore, TaskStore, Status
+from event_driven.message.creation import EVENT_TYPE_HEADER, EVENT_KEY_HEADER
+from event_driven.task_client import task_reply_message
+from pydantic import BaseModel, model_validator
+from models import EventStore, TaskStore, Status
+from batching import Batcher
+from concurrency import (
+    QueueConfig, InflightLimiter, Bulkheads, PriorityClass, WeightedFairScheduler, DEFAULT_PRIORITY_CLASSES
+)
+from registry import TaskRegistry, TaskDefinition
+from executors import TaskExecutor, ExecutionBackend
+from partitioning import EventPartitioner, PartitionInterval, RetentionAction
+from api import create_server
+from metrics import ServiceMetrics
+from idempotency import CompletedTasks, TaskOutcome
+from storage import StorageKind, PostgresBackend, create_storage
+from queries import EventFilter, event_query, encode_cursor, decode_cursor
+import payloads
 
 
 class ConfigModel(BaseModel):
     rabbitmq_url: str
     database_url: str
-    tasks_folder: str
+    tasks_folder: str = "tasks"
+    # Re-import task modules whose file changed, checked every interval
+    tasks_hot_reload: bool = False
+    tasks_reload_interval: float = 2.0
+    # Pools for task modules declaring EXECUTION_BACKEND = "thread" / "process".
+    # Process workers default to the CPU count
+    task_thread_workers: int = 8
+    task_process_workers: int | None = None
+
+    # Event store ingestion. With batching enabled events are buffered and
+    # written with one multi-row insert per batch, then acked together
+    event_batching: bool = False
+    event_batch_size: int = 500
+    event_batch_linger_ms: int = 50
+
+    # Range partitioning of event_store on created_at (Postgres only, applied
+    # when init_db creates the table) and retention of old events. Expired
+    # partitions are dropped or detached, optionally into an archive schema
+    event_partitioning: PartitionInterval | None = None
+    event_partitions_ahead: int = 3
+    event_retention_days: int | None = None
+    event_retention_action: RetentionAction = RetentionAction.DROP
+    event_archive_schema: str | None = None
+    event_maintenance_interval: float = 3600.0
+
+    # Write-behind for final task statuses: updates from many tasks are
+    # coalesced into batched UPDATEs. The task message is acked once its status
+    # is queued, so a crash before the flush leaves the row PENDING
+    task_status_write_behind: bool = False
+    task_status_batch_size: int = 200
+    task_status_linger_ms: int = 20
+
+    # Outcomes of this many recently finished tasks are kept in memory, so
+    # redeliveries are acked without touching the database
+    task_dedup_cache_size: int = 10000
+    # A run claims its task row for this long. A redelivery of a task still
+    # RUNNING is acked without running it, unless the claim has expired, so
+    # keep it above the longest task
+    task_lease_seconds: float = 600.0
+
+    # Per-consumer flow control. With batching, keep the event prefetch above
+    # event_batch_size or batches will only ever be closed by the linger timer
+    event_queue: QueueConfig = QueueConfig(prefetch_count=1000, max_concurrency=50)
+    task_queue: QueueConfig = QueueConfig(prefetch_count=20, max_concurrency=10)
+
+    # Task priorities. When set, task queues are declared with this
+    # x-max-priority (an existing queue must be deleted first, arguments
+    # cannot change) and the shared task slots are split across the priority
+    # classes by weight. Prefetch above max_concurrency gives the scheduler
+    # a choice
+    task_max_priority: int | None = None
+    task_priority_classes: List[PriorityClass] = DEFAULT_PRIORITY_CLASSES
 
-    def __init__(self, rabbitmq_url: str, database_url: str, tasks_folder: str):
-        self.rabbitmq_url = rabbitmq_url
-        self.database_url = database_url
-        self.tasks_folder = tasks_folder
+    # HTTP API (event queries, health). In supervisor mode worker N listens
+    # on http_port + N
+    http_host: str = "0.0.0.0"
+    http_port: int | None = None
+
+    # Prometheus text format metrics on GET /metrics of the HTTP API, so they
+    # need http_port. Queue depth is polled with passive declares every
+    # metrics_queue_poll_interval
+    metrics_enabled: bool = False
+    metrics_queue_poll_interval: float = 15.0
+
+    # On stop, how long in-flight handlers get to finish before the
+    # connection is closed and their messages are redelivered
+    drain_timeout: float = 30.0
+
+    # Storage backend, inferred from database_url unless set: postgres, sqlite
+    # (WAL mode) or file_log, an append-only log in file_log_dir for capture
+    # only nodes. Sealed log segments are moved to file_log_offload_url
+    storage_backend: StorageKind | None = None
+    database_echo: bool = False
+    database_pool_size: int = 20
+    database_max_overflow: int = 10
+    database_statement_cache_size: int = 1024
+    file_log_dir: str = "event_log"
+    file_log_segment_bytes: int = 64 * 1024 * 1024
+    file_log_fsync_batch: int = 1000
+    file_log_fsync_ms: int = 5
+    file_log_offload_url: str | None = None
+    file_log_offload_interval: float = 60.0
+
+    def __init__(self, rabbitmq_url: str, database_url: str, tasks_folder: str = "tasks", **kwargs):
+        super().__init__(rabbitmq_url=rabbitmq_url, database_url=database_url, tasks_folder=tasks_folder, **kwargs)
+
+    @model_validator(mode="after")
+    def _metrics_need_http(self) -> "ConfigModel":
+        if self.metrics_enabled and self.http_port is None:
+            raise ValueError("metrics_enabled requires http_port, /metrics is served by the HTTP API")
+        return self
 
 
 
@@ -29,52 +131,437 @@ class RabbitMQService:
     def __init__(self, config: ConfigModel):
         self.config = config
         
-        self.engine = create_async_engine(
-            self.config.database_url,
-            echo=True
+        self.storage = create_storage(self.config)
+        # Only SQL backends have these, the event query API needs them
+        self.engine = self.storage.engine
+        self.async_session = self.storage.async_session
+
+        self.event_partitioner = EventPartitioner(
+            self.engine,
+            interval=self.config.event_partitioning,
+            ahead=self.config.event_partitions_ahead,
+            retention_days=self.config.event_retention_days,
+            retention_action=self.config.event_retention_action,
+            archive_schema=self.config.event_archive_schema
         )
-        self.async_session = sessionmaker(
-            self.engine, class_=AsyncSession, expire_on_commit=False
+
+        self.task_registry = TaskRegistry(self.config.tasks_folder)
+        self.completed_tasks = CompletedTasks(self.config.task_dedup_cache_size)
+        self.task_executor = TaskExecutor(
+            self.task_registry,
+            thread_workers=self.config.task_thread_workers,
+            process_workers=self.config.task_process_workers
         )
 
-    async def init_db(self):
-        async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-
-    async def store_event(self, session: AsyncSession, producer_app: str, correlation_id: str, 
-                         headers: Dict[str, Any], payload: Dict[str, Any]):
-        event = EventStore(
-            correlation_id=correlation_id,
-            producer_app=producer_app,
-            headers=headers,
-            payload=payload
+        self._stopping = asyncio.Event()
+        self.metrics = ServiceMetrics()
+
+        self.event_limiter = InflightLimiter.from_config(self.config.event_queue)
+        self.task_limiter = InflightLimiter.from_config(self.config.task_queue)
+        self.task_bulkheads = Bulkheads()
+        # Batchers of tasks with execute_batch, created on first use per task name
+        self.task_batchers: Dict[str, Batcher[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        # Exchange task results are sent through to reply_to, set once connected
+        self._reply_exchange = None
+        # Task names whose routing key is bound to a task queue
+        self._routed_tasks: set[str] = set()
+        self.task_scheduler: WeightedFairScheduler | None = None
+        if self.config.task_max_priority is not None:
+            self.task_scheduler = WeightedFairScheduler.from_config(self.config.task_queue, self.config.task_priority_classes)
+
+        self.event_batcher: Batcher[Tuple[AbstractIncomingMessage, Dict[str, Any]]] | None = None
+        if self.config.event_batching:
+            self.event_batcher = Batcher(
+                self._flush_events,
+                max_size=self.config.event_batch_size,
+                linger_ms=self.config.event_batch_linger_ms,
+                name="event batch"
+            )
+
+        self.task_status_batcher: Batcher[Dict[str, Any]] | None = None
+        if self.config.task_status_write_behind:
+            self.task_status_batcher = Batcher(
+                self._flush_task_statuses,
+                max_size=self.config.task_status_batch_size,
+                linger_ms=self.config.task_status_linger_ms,
+                name="task status batch"
+            )
+
+        self.metrics.add_gauge(
+            "rabbitmq_service_inflight", "Messages being handled, per queue", ("queue",),
+            lambda: {("events",): self.event_limiter.inflight, ("tasks",): self.task_limiter.inflight}
         )
-        session.add(event)
-        await session.commit()
-        return event
-
-    async def store_task(self, session: AsyncSession, producer_app: str, correlation_id: str,
-                        task_name: str, payload: Dict[str, Any]):
-        task = TaskStore(
-            correlation_id=correlation_id,
-            producer_app=producer_app,
-            task_name=task_name,
-            payload=payload,
-            status=Status.PENDING
+        self.metrics.add_gauge(
+            "rabbitmq_service_buffered", "Items waiting in a batcher for the next flush", ("batch",),
+            lambda: {(batcher.name,): len(batcher) for batcher in (self.event_batcher, self.task_status_batcher) if batcher is not None}
         )
-        session.add(task)
-        await session.commit()
-        return task
-
-    async def update_task_status(self, session: AsyncSession, task_id: str, 
-                               status: Status, result: Dict[str, Any] | None = None, error: str | None = None):
-        task = await session.get(TaskStore, task_id)
-        if task:
-            task.status = status
-            task.result = result
-            task.error = error
-            await session.commit()
-        return task
+        self.metrics.add_gauge(
+            "rabbitmq_service_task_inflight", "Tasks holding a slot, per task", ("task_name",),
+            lambda: {(name,): count for name, count in self.task_bulkheads.inflight.items()}
+        )
+        if self.task_scheduler is not None:
+            self.metrics.add_gauge(
+                "rabbitmq_service_task_priority_waiting", "Tasks waiting for a shared slot, per priority class", ("priority_class",),
+                lambda: {(name,): count for name, count in self.task_scheduler.waiting.items()}
+            )
+            self.metrics.add_gauge(
+                "rabbitmq_service_task_priority_granted", "Shared slots handed out, per priority class", ("priority_class",),
+                lambda: {(name,): count for name, count in self.task_scheduler.granted.items()}
+            )
+
+    async def init_db(self):
+        self.event_partitioner.prepare_metadata()
+        await self.storage.init()
+        await self.event_partitioner.maintain()
+
+    async def store_event(self, producer_app: str, correlation_id: str,
+                         headers: Dict[str, Any], payload: Dict[str, Any], **columns: Any) -> EventStore:
+        return await self.storage.store_event(producer_app, correlation_id, headers, payload, **columns)
+
+    async def store_events(self, rows: List[Dict[str, Any]]):
+        await self.storage.store_events(rows)
+
+    async def store_task(self, producer_app: str, correlation_id: str,
+                        task_name: str, payload: Dict[str, Any]) -> TaskStore:
+        return await self.storage.store_task(producer_app, correlation_id, task_name, payload)
+
+    async def update_task_status(self, task_id, status: Status,
+                               result: Dict[str, Any] | None = None, error: str | None = None) -> bool:
+        return await self.storage.update_task_status(task_id, status, result=result, error=error)
+
+    async def update_task_statuses(self, updates: List[Dict[str, Any]]):
+        await self.storage.update_task_statuses(updates)
+
+    async def query_events(self, filters: EventFilter, limit: int = 100,
+                           cursor: str | None = None) -> Tuple[List[EventStore], str | None]:
+        """Returns one page of matching events and the cursor of the next page, if any"""
+        after = decode_cursor(cursor) if cursor else None
+        async with self.async_session() as session:
+            events = list((await session.scalars(event_query(filters, after, limit + 1))).all())
+
+        if len(events) <= limit:
+            return events, None
+        events = events[:limit]
+        return events, encode_cursor((events[-1].created_at, events[-1].id_event_store))
+
+    async def iter_events(self, filters: EventFilter, page_size: int = 1000) -> AsyncIterator[EventStore]:
+        """Streams every matching event, holding at most one page in memory"""
+        after = None
+        while True:
+            count = 0
+            async with self.async_session() as session:
+                result = await session.stream_scalars(
+                    event_query(filters, after, page_size).execution_options(yield_per=page_size)
+                )
+                async for event in result:
+                    count += 1
+                    after = (event.created_at, event.id_event_store)
+                    yield event
+            if count < page_size:
+                return
+
+    @staticmethod
+    def _event_row(message: AbstractIncomingMessage) -> Dict[str, Any]:
+        if not message.app_id or not message.correlation_id:
+            raise ValueError("Message app_id or correlation_id is missing")
+
+        headers = message.headers or {}
+        event_type, entity_name = parse_event_routing_key(message.routing_key or "") or (None, None)
+        event_key = headers.get(EVENT_KEY_HEADER)
+        return {
+            "correlation_id": message.correlation_id,
+            "producer_app": message.app_id,
+            "headers": headers,
+            "payload": payloads.event_payload(message),
+            "routing_key": message.routing_key,
+            "event_type": headers.get(EVENT_TYPE_HEADER, event_type),
+            "entity_name": entity_name,
+            "event_key": str(event_key) if event_key is not None else None
+        }
+
+    async def _process_event(self, message: AbstractIncomingMessage):
+        self.metrics.messages.inc(queue="events")
+        try:
+            with self.metrics.decode_seconds.time(queue="events"):
+                row = self._event_row(message)
+            if self.event_batcher is not None:
+                await self.event_batcher.add((message, row))
+                return
+
+            with self.metrics.db_seconds.time(operation="store_event"):
+                await self.store_event(**row)
+            await message.ack()
+            self.metrics.acks.inc(queue="events", outcome="ack")
+        except Exception as e:
+            logging.warning(f"Error processing event {message.correlation_id}")
+            await message.reject(requeue=False)
+            self.metrics.acks.inc(queue="events", outcome="reject")
+
+    async def _flush_events(self, batch: List[Tuple[AbstractIncomingMessage, Dict[str, Any]]]):
+        # Deliveries on the event channel arrive in order, so acking the last
+        # message with multiple=True settles the whole batch
+        last_message = batch[-1][0]
+        self.metrics.batch_size.observe(len(batch), batch="events")
+        try:
+            with self.metrics.db_seconds.time(operation="store_events"):
+                await self.store_events([row for _, row in batch])
+        except Exception:
+            logging.warning(f"Error storing batch of {len(batch)} events")
+            await last_message.nack(multiple=True, requeue=False)
+            self.metrics.acks.inc(len(batch), queue="events", outcome="nack")
+            raise
+        await last_message.ack(multiple=True)
+        self.metrics.acks.inc(len(batch), queue="events", outcome="ack")
+
+    async def _process_task(self, message: AbstractIncomingMessage, dedicated: bool = False):
+        received = time.perf_counter()
+        self.metrics.messages.inc(queue="tasks")
+        try:
+            with self.metrics.decode_seconds.time(queue="tasks"):
+                data = payloads.task_body(message)
+            headers = message.headers or {}
+            key = (headers['producer_app'], headers['correlation_id'], data['task_name'])
+        except Exception:
+            # Never reaches message.process(), so it has to be settled here or
+            # it holds a prefetch slot for good
+            logging.warning(f"Malformed task message {message.correlation_id}")
+            await message.reject(requeue=False)
+            self.metrics.acks.inc(queue="tasks", outcome="reject")
+            return
+
+        definition = self.task_registry.get(data['task_name'])
+        if definition is None:
+            logging.warning(f"Unknown task {data['task_name']} in message {message.correlation_id}")
+            await message.reject(requeue=False)
+            self.metrics.acks.inc(queue="tasks", outcome="reject")
+            return
+
+        outcome = self.completed_tasks.get(key)
+        if outcome is not None:
+            await self._ack_duplicate(message, key, outcome)
+            return
+
+        # The task's own slot is taken before a shared one, so tasks waiting
+        # on a saturated bulkhead don't hold shared slots other tasks could use.
+        # Dedicated queues are bounded by their bulkhead alone
+        release = await self.task_bulkheads.acquire(definition.name, definition.max_concurrency)
+        priority_slot = contextlib.nullcontext()
+        if self.task_scheduler is not None and not dedicated:
+            priority_slot = self.task_scheduler.acquire(self.task_scheduler.classify(message.priority))
+        shared_slot = self.task_limiter.acquire(len(message.body)) if not dedicated else contextlib.nullcontext()
+        run = None
+        # message.process() acks on a clean exit and rejects when the body raises
+        ack_outcome = "reject"
+        try:
+            async with priority_slot, shared_slot, message.process():
+                self.metrics.task_wait_seconds.observe(time.perf_counter() - received, task_name=definition.name)
+                with self.metrics.db_seconds.time(operation="store_task"):
+                    task = await self.store_task(
+                        producer_app=key[0],
+                        correlation_id=key[1],
+                        task_name=data['task_name'],
+                        payload=data['payload']
+                    )
+                if task.status in (Status.COMPLETED, Status.FAILED):
+                    # Redelivery of a task that already ran to the end
+                    outcome = TaskOutcome.from_task(task)
+                    self.completed_tasks.put(key, outcome)
+                    self._log_duplicate(key, outcome)
+                    await self._reply(message, definition.name, outcome)
+                    ack_outcome = "ack"
+                    return
+
+                with self.metrics.db_seconds.time(operation="claim_task"):
+                    claimed = await self.storage.claim_task(task.id_task, self.config.task_lease_seconds)
+                if not claimed:
+                    # Redelivered while its first run is still going, typically
+                    # after the connection that run's message came on dropped.
+                    # That run writes the outcome
+                    logging.info(f"Task {task.id_task} ({definition.name}) is already running, not running it again")
+                    self.metrics.duplicate_tasks.inc(task_name=definition.name)
+                    ack_outcome = "ack"
+                    return
+
+                started = time.perf_counter()
+                if definition.execute_batch is not None:
+                    run = asyncio.ensure_future(self._run_batched(definition, data['payload']))
+                else:
+                    run = asyncio.ensure_future(self.task_executor.run(definition, data['payload']))
+                run.add_done_callback(lambda future: self._run_finished(future, release))
+                try:
+                    result = await asyncio.wait_for(asyncio.shield(run), definition.timeout)
+                    status, error = Status.COMPLETED, None
+                except asyncio.TimeoutError:
+                    # Async tasks are cancelled. Thread and process tasks cannot
+                    # be interrupted and keep their bulkhead slot until they return
+                    if definition.backend == ExecutionBackend.ASYNC:
+                        run.cancel()
+                    logging.warning(f"Task {task.id_task} ({definition.name}) timed out after {definition.timeout}s")
+                    self.metrics.task_timeouts.inc(task_name=definition.name)
+                    result, status, error = None, Status.FAILED, f"Timed out after {definition.timeout}s"
+                except Exception as e:
+                    logging.exception(f"Error processing task {task.id_task}")
+                    result, status, error = None, Status.FAILED, str(e)
+                if status == Status.COMPLETED:
+                    try:
+                        # Checked here, a result the task store cannot write
+                        # would fail the status update and leave the row RUNNING
+                        payloads.dumps(result)
+                    except (TypeError, ValueError) as e:
+                        logging.warning(f"Task {task.id_task} ({definition.name}) returned a result that is not JSON: {e}")
+                        result, status, error = None, Status.FAILED, f"Result is not JSON serializable: {e}"
+                self.metrics.task_seconds.observe(time.perf_counter() - started, task_name=definition.name, status=status.value)
+                outcome = TaskOutcome(task.id_task, status, result, error)
+                await self._finish_task(task.id_task, status, result=result, error=error)
+                await self._reply(message, definition.name, outcome)
+                self.completed_tasks.put(key, outcome)
+                ack_outcome = "ack"
+        finally:
+            if run is None:
+                release()
+            self.metrics.acks.inc(queue="tasks", outcome=ack_outcome)
+
+    @staticmethod
+    def _run_finished(run: asyncio.Future, release):
+        release()
+        # Retrieve the outcome of runs nobody awaits any more, after a timeout
+        if not run.cancelled():
+            run.exception()
+
+    def _log_duplicate(self, key, outcome: TaskOutcome):
+        producer_app, correlation_id, task_name = key
+        logging.info(
+            f"Task {task_name} from {producer_app} ({correlation_id}) already {outcome.status.value} "
+            f"as {outcome.id_task}, not running it again"
+        )
+        self.metrics.duplicate_tasks.inc(task_name=task_name)
+
+    async def _ack_duplicate(self, message: AbstractIncomingMessage, key, outcome: TaskOutcome):
+        self._log_duplicate(key, outcome)
+        await self._reply(message, key[2], outcome)
+        await message.ack()
+        self.metrics.acks.inc(queue="tasks", outcome="ack")
+
+    def _task_batcher(self, definition: TaskDefinition) -> Batcher[Tuple[Dict[str, Any], asyncio.Future]]:
+        batcher = self.task_batchers.get(definition.name)
+        if batcher is None:
+            batcher = self.task_batchers[definition.name] = Batcher(
+                partial(self._flush_task_batch, definition.name),
+                max_size=definition.batch_size,
+                linger_ms=definition.batch_linger_ms,
+                name=f"{definition.name} task batch"
+            )
+        return batcher
+
+    async def _run_batched(self, definition: TaskDefinition, payload: Dict[str, Any]) -> Any:
+        """Runs one task as part of the next execute_batch call of its task name"""
+        result = asyncio.get_running_loop().create_future()
+        await self._task_batcher(definition).add((payload, result))
+        return await result
+
+    async def _flush_task_batch(self, task_name: str, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        self.metrics.batch_size.observe(len(batch), batch=task_name)
+        try:
+            # Looked up per batch, so a hot reloaded module applies to the next one
+            definition = self.task_registry.get(task_name)
+            if definition is None or definition.execute_batch is None:
+                raise LookupError(f"Task {task_name} no longer has execute_batch")
+            results = list(await self.task_executor.run_batch(definition, [payload for payload, _ in batch]))
+            if len(results) != len(batch):
+                raise ValueError(f"execute_batch of {task_name} returned {len(results)} results for {len(batch)} payloads")
+        except Exception as e:
+            # Every task of the batch fails with the same error, each handler logs it
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                # Its handler gave up on a timeout
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _reply(self, message: AbstractIncomingMessage, task_name: str, outcome: TaskOutcome):
+        """Sends the outcome to the reply_to queue of tasks submitted with submit_task"""
+        if not message.reply_to or self._reply_exchange is None:
+            return
+        try:
+            try:
+                reply = task_reply_message(
+                    message.correlation_id, str(outcome.id_task), task_name,
+                    outcome.status.value, result=outcome.result, error=outcome.error
+                )
+            except (TypeError, ValueError) as e:
+                # Stored, but not encodable in a reply. The caller gets the error
+                # instead of waiting for its timeout
+                reply = task_reply_message(
+                    message.correlation_id, str(outcome.id_task), task_name,
+                    Status.FAILED.value, error=f"Result could not be sent in the reply: {e}"
+                )
+            await self._reply_exchange.publish(reply, routing_key=message.reply_to)
+        except Exception:
+            # The outcome is still stored, the caller can look it up
+            logging.exception(f"Error replying to {message.reply_to} for task {outcome.id_task}")
+
+    async def _finish_task(self, task_id, status: Status, result: Dict[str, Any] | None = None, error: str | None = None):
+        if self.task_status_batcher is not None:
+            await self.task_status_batcher.add({"id_task": task_id, "status": status, "result": result, "error": error})
+            return
+
+        with self.metrics.db_seconds.time(operation="update_task_status"):
+            await self.update_task_status(task_id, status, result=result, error=error)
+
+    async def _flush_task_statuses(self, updates: List[Dict[str, Any]]):
+        # Only the latest status of each task needs to be written
+        latest = {status_update["id_task"]: status_update for status_update in updates}
+        self.metrics.batch_size.observe(len(latest), batch="task_statuses")
+        try:
+            with self.metrics.db_seconds.time(operation="update_task_statuses"):
+                await self.update_task_statuses(list(latest.values()))
+        except Exception:
+            # The messages are already acked, so a lost batch would leave its
+            # tasks PENDING. One bad row fails the whole executemany, the rest
+            # can still be written one by one
+            logging.exception(f"Error writing batch of {len(latest)} task statuses, writing them one by one")
+            for status_update in latest.values():
+                try:
+                    await self.update_task_status(
+                        status_update["id_task"], status_update["status"],
+                        result=status_update["result"], error=status_update["error"]
+                    )
+                except Exception:
+                    logging.exception(f"Error writing status of task {status_update['id_task']}")
+
+    @staticmethod
+    async def _consumer_channel(connection, queue_config: QueueConfig):
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=queue_config.prefetch_count)
+        return channel
+
+    async def _bind_task_names(self, task_queue):
+        """Binds the routing key TaskClient submits each task with, for tasks not bound yet"""
+        for name in self.task_registry.names:
+            if name not in self._routed_tasks:
+                await task_queue.bind(TASK_EXCHANGE, get_named_task_routing_key(name))
+                self._routed_tasks.add(name)
+
+    async def _watch_tasks(self, task_queue, interval: float):
+        """Hot reloads task modules, binding the names of new tasks to the shared queue"""
+        await self.task_registry.watch(interval, on_change=lambda: self._bind_task_names(task_queue))
+
+    async def _poll_queue_depth(self, channel, queue_names: List[str], interval: float):
+        """Records ready messages and consumers of each queue, the consumer lag seen by the broker"""
+        while True:
+            for name in queue_names:
+                try:
+                    queue = await channel.declare_queue(name, passive=True)
+                except Exception:
+                    logging.warning(f"Could not poll depth of queue {name}")
+                    continue
+                self.metrics.queue_depth.set(queue.declaration_result.message_count, queue=name)
+                self.metrics.queue_consumers.set(queue.declaration_result.consumer_count, queue=name)
+            await asyncio.sleep(interval)
 
     async def setup_rabbitmq(self):
         connection = await connect_robust(self.config.rabbitmq_url)
@@ -82,74 +569,130 @@ class RabbitMQService:
         
         await create_event_exchange(channel)
         await create_task_exchange(channel)
+        self._reply_exchange = channel.default_exchange
         
+        # Every consumer gets its own channel and QoS, so a slow task cannot
+        # hold back event ingestion. Batch acks also use multiple=True, which
+        # would otherwise ack unrelated deliveries on a shared channel
+        event_channel = await self._consumer_channel(connection, self.config.event_queue)
         queue_name = get_event_store_queue_name()
-        queue = await channel.declare_queue(queue_name, durable=True)
+        queue = await event_channel.declare_queue(queue_name, durable=True)
         await queue.bind(EVENT_EXCHANGE, "#") 
+
+        event_handler = self._process_event
+        if self.event_batcher is None:
+            # Batch acks rely on messages reaching the batcher in delivery
+            # order, which waiting on the limiter would not preserve. Batched
+            # ingestion is bounded by prefetch alone
+            event_handler = self.event_limiter.wrap(event_handler)
+        event_tag = await queue.consume(event_handler)
         
-        async def process_event(message: AbstractIncomingMessage):
-            try:
-                async with self.async_session() as session:
-                    if not message.app_id or not message.correlation_id:
-                        raise ValueError("Message app_id or correlation_id is missing")
-                    payload = eval(message.body.decode())
-                await self.store_event(
-                    session=session,
-                    producer_app=message.app_id,
-                    correlation_id=message.correlation_id,
-                    headers=message.headers,
-                    payload=payload
-                )
-                await message.ack()
-            except Exception as e:
-                logging.warning(f"Error processing event {message.correlation_id}")
-                await message.reject(requeue=False)
-        
-        await queue.consume(process_event)
-        
-        task_queue = await channel.declare_queue("tasks", durable=True)
+        task_channel = await self._consumer_channel(connection, self.config.task_queue)
+        task_queue = await task_channel.declare_queue(
+            "tasks", durable=True, arguments=task_queue_arguments(self.config.task_max_priority)
+        )
+        # task.exchange is a direct exchange, the key is only matched literally
         await task_queue.bind(TASK_EXCHANGE, "#.task.#")
         
-        async def process_task(message):
-            async with message.process():
-                async with self.async_session() as session:
-                    data = eval(message.body.decode())
-                    task = await self.store_task(
-                        session=session,
-                        producer_app=message.headers['producer_app'],
-                        correlation_id=message.headers['correlation_id'],
-                        task_name=data['task_name'],
-                        payload=data['payload']
-                    )
-                    
-                    try:
-                        # TODO: import only once
-                        module_path = f"{self.config.tasks_folder}.{data['task_name']}"
-                        module = __import__(module_path, fromlist=['execute'])
-                        result = await module.execute(data['payload'])
-                        
-                        await self.update_task_status(
-                            session=session,
-                            task_id=task.id_task,
-                            status=Status.COMPLETED,
-                            result=result
-                        )
-                    except Exception as e:
-                        logging.exception(f"Error processing task {task.id_task}")
-                        await self.update_task_status(
-                            session=session,
-                            task_id=task.id_task,
-                            status=Status.FAILED,
-                            error=str(e)
-                        )
-        
-        await task_queue.consume(process_task)
-        
+        consumers = [(queue, event_tag)]
+        consumers.append((task_queue, await task_queue.consume(self.task_limiter.track(self._process_task))))
+        queue_names = [queue_name, task_queue.name]
+
+        # Tasks declaring DEDICATED_QUEUE also get a queue and channel of their
+        # own, so their backlog never sits in front of other tasks
+        for definition in map(self.task_registry.get, self.task_registry.names):
+            if not definition.dedicated_queue:
+                continue
+            prefetch = definition.max_concurrency or self.config.task_queue.prefetch_count
+            dedicated_channel = await self._consumer_channel(connection, QueueConfig(prefetch_count=prefetch))
+            dedicated_queue = await dedicated_channel.declare_queue(
+                get_dedicated_task_queue_name(definition.name), durable=True,
+                arguments=task_queue_arguments(self.config.task_max_priority)
+            )
+            await dedicated_queue.bind(TASK_EXCHANGE, get_dedicated_task_routing_key(definition.name))
+            # Tasks submitted by name reach the dedicated queue, not the shared one
+            await dedicated_queue.bind(TASK_EXCHANGE, get_named_task_routing_key(definition.name))
+            self._routed_tasks.add(definition.name)
+            consumers.append((dedicated_queue, await dedicated_queue.consume(
+                self.task_limiter.track(partial(self._process_task, dedicated=True))
+            )))
+            queue_names.append(dedicated_queue.name)
+        await self._bind_task_names(task_queue)
+
+        background = []
+        if self.config.tasks_hot_reload:
+            background.append(asyncio.create_task(self._watch_tasks(task_queue, self.config.tasks_reload_interval)))
+        if self.config.event_partitioning or self.config.event_retention_days is not None:
+            background.append(asyncio.create_task(self.event_partitioner.run(self.config.event_maintenance_interval)))
+        http_server = None
+        offload_target = None
+        if self.config.http_port is not None:
+            http_server = create_server(self, self.config.http_host, self.config.http_port)
+            background.append(asyncio.create_task(http_server.serve()))
+        if self.config.storage_backend == StorageKind.FILE_LOG and self.config.file_log_offload_url:
+            offload_target = PostgresBackend(self.config.file_log_offload_url, pool_size=2, max_overflow=0)
+            background.append(asyncio.create_task(
+                self.storage.run_offload(offload_target, self.config.file_log_offload_interval)
+            ))
+        if self.config.metrics_enabled:
+            # Passive declares of a missing queue close the channel, so polling
+            # gets its own rather than sharing one with the exchanges
+            metrics_channel = await connection.channel()
+            background.append(asyncio.create_task(self._poll_queue_depth(
+                metrics_channel, queue_names, self.config.metrics_queue_poll_interval
+            )))
+
         try:
-            await asyncio.Future()  # run forever
+            await self._stopping.wait()
+            if http_server is not None:
+                http_server.should_exit = True
+
+            # Stop deliveries, then let handlers already holding a message finish
+            for consumer_queue, tag in consumers:
+                await consumer_queue.cancel(tag)
+            try:
+                await asyncio.wait_for(self._drain(), self.config.drain_timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Handlers still running after {self.config.drain_timeout}s, closing anyway")
         finally:
+            for task in background:
+                task.cancel()
+            if self.event_batcher is not None:
+                await self.event_batcher.close()
+            for batcher in self.task_batchers.values():
+                await batcher.close()
+            if self.task_status_batcher is not None:
+                await self.task_status_batcher.close()
             await connection.close()
+            await self.storage.close()
+            if offload_target is not None:
+                await offload_target.close()
+            self.task_executor.shutdown()
+
+    async def _drain(self):
+        await asyncio.gather(self.event_limiter.wait_idle(), self.task_limiter.wait_idle())
+
+    def stop(self):
+        """Asks a running service to stop consuming, drain in-flight messages and exit"""
+        self._stopping.set()
+
+    def health(self) -> Dict[str, Any]:
+        health = {
+            "stopping": self._stopping.is_set(),
+            "tasks_loaded": len(self.task_registry),
+            "events_inflight": self.event_limiter.inflight,
+            "tasks_inflight": self.task_limiter.inflight,
+            "tasks_pending": self.task_limiter.pending,
+        }
+        if self.event_batcher is not None:
+            health["events_buffered"] = len(self.event_batcher)
+            health["event_batches"] = self.event_batcher.metrics.batches
+        return health
 
-    async def run(self):
-        await self.init_db()
+    async def run(self, init_db: bool = True):
+        self.task_registry.load()
+        # Fork task workers before any connection or pool thread exists
+        self.task_executor.start()
+        if init_db:
+            await self.init_db()
         await self.setup_rabbitmq() 
\ No newline at end of file
@@ -0,0 +1,521 @@
+import asyncio
+import enum
+import fcntl
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import and_, event, inspect, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+from models import Base, EventStore, TaskStore, Status
+from batching import Batcher
+import payloads
+
+
+def _parsed(payload: Any) -> Any:
+    # RawJSON is written as is, but callers get the payload back as data
+    return payloads.loads(str(payload)) if isinstance(payload, payloads.RawJSON) else payload
+
+
+class StorageKind(str, enum.Enum):
+    POSTGRES = "postgres"
+    SQLITE = "sqlite"
+    FILE_LOG = "file_log"
+
+
+class StorageBackend(ABC):
+    """Where the service persists events and tasks
+
+    SQL backends also expose `engine` and `async_session`, which the event
+    query API and partition maintenance need. Backends without them only
+    capture.
+    """
+    kind: StorageKind
+    engine: AsyncEngine | None = None
+    async_session: sessionmaker | None = None
+
+    async def init(self):
+        """Creates whatever the backend needs to start writing"""
+
+    async def close(self):
+        pass
+
+    async def store_event(self, producer_app: str, correlation_id: str, headers: Dict[str, Any],
+                          payload: Any, **columns: Any) -> EventStore:
+        """Writes one event and returns it, with a RawJSON payload parsed"""
+        row = dict(producer_app=producer_app, correlation_id=correlation_id, headers=headers, payload=payload, **columns)
+        row.setdefault("id_event_store", uuid.uuid4())
+        row.setdefault("created_at", datetime.now(timezone.utc))
+        await self.store_events([row])
+        return EventStore(**{**row, "payload": _parsed(payload)})
+
+    @abstractmethod
+    async def store_events(self, rows: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    async def store_task(self, producer_app: str, correlation_id: str, task_name: str, payload: Any) -> TaskStore:
+        """Records a PENDING task and returns it with its id and created_at
+
+        If the backend already holds a task with the same producer_app,
+        correlation_id and task_name, that task is returned instead.
+        """
+
+    @abstractmethod
+    async def store_tasks(self, rows: List[Dict[str, Any]]):
+        """Writes complete task rows, ids included"""
+
+    async def claim_task(self, task_id, lease_seconds: float) -> bool:
+        """Marks a PENDING task RUNNING. Returns False while another run holds it
+
+        A RUNNING task claimed more than `lease_seconds` ago is taken over,
+        its run is assumed lost. Backends that never find earlier runs of a
+        task grant every claim.
+        """
+        return True
+
+    async def update_task_status(self, task_id, status: Status, result: Dict[str, Any] | None = None,
+                                 error: str | None = None) -> bool:
+        await self.update_task_statuses([{"id_task": task_id, "status": status, "result": result, "error": error}])
+        return True
+
+    @abstractmethod
+    async def update_task_statuses(self, updates: List[Dict[str, Any]]):
+        ...
+
+    async def store_records(self, events: List[Dict[str, Any]], tasks: List[Dict[str, Any]],
+                            task_statuses: List[Dict[str, Any]]):
+        """Writes complete rows copied from another backend, ids included"""
+        await self.store_events(events)
+        await self.store_tasks(tasks)
+        await self.update_task_statuses(task_statuses)
+
+
+def _missing_task_store_schema(conn: Connection) -> List[str]:
+    """Parts of task_store that create_all does not add to a table created by an earlier version"""
+    inspector = inspect(conn)
+    missing = []
+    if "started_at" not in {column["name"] for column in inspector.get_columns(TaskStore.__tablename__)}:
+        missing.append("column started_at")
+    constraints = {constraint["name"] for constraint in inspector.get_unique_constraints(TaskStore.__tablename__)}
+    if "uq_task_store_producer_correlation_task" not in constraints:
+        missing.append("constraint uq_task_store_producer_correlation_task")
+    return missing
+
+
+class SQLAlchemyBackend(StorageBackend):
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def init(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            missing = await conn.run_sync(_missing_task_store_schema)
+        if missing:
+            # Without them a redelivered task would run a second time
+            raise RuntimeError(
+                f"task_store lacks {', '.join(missing)}, apply migrations/002_task_store_claims.sql"
+            )
+
+    async def close(self):
+        await self.engine.dispose()
+
+    async def store_event(self, producer_app: str, correlation_id: str, headers: Dict[str, Any],
+                          payload: Any, **columns: Any) -> EventStore:
+        event = EventStore(
+            correlation_id=correlation_id,
+            producer_app=producer_app,
+            headers=headers,
+            payload=payload,
+            **columns
+        )
+        async with self.async_session() as session:
+            session.add(event)
+            await session.commit()
+        set_committed_value(event, "payload", _parsed(payload))
+        return event
+
+    async def store_events(self, rows: List[Dict[str, Any]]):
+        """Writes many events with a single multi-row insert, bypassing the ORM"""
+        if not rows:
+            return
+        async with self.async_session() as session:
+            await session.execute(insert(EventStore), rows)
+            await session.commit()
+
+    async def store_task(self, producer_app: str, correlation_id: str, task_name: str, payload: Any) -> TaskStore:
+        """Inserts a PENDING task in one statement and returns it detached from the session"""
+        values = dict(
+            correlation_id=correlation_id,
+            producer_app=producer_app,
+            task_name=task_name,
+            payload=payload,
+            status=Status.PENDING
+        )
+        async with self.async_session() as session:
+            try:
+                row = (await session.execute(
+                    insert(TaskStore).values(**values).returning(TaskStore.id_task, TaskStore.created_at)
+                )).one()
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                existing = await session.scalar(select(TaskStore).where(
+                    TaskStore.producer_app == producer_app,
+                    TaskStore.correlation_id == correlation_id,
+                    TaskStore.task_name == task_name
+                ))
+                if existing is None:
+                    raise
+                return existing
+        return TaskStore(id_task=row.id_task, created_at=row.created_at, **values)
+
+    async def store_tasks(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        async with self.async_session() as session:
+            await session.execute(insert(TaskStore), rows)
+            await session.commit()
+
+    async def claim_task(self, task_id, lease_seconds: float) -> bool:
+        """Claims the task with a conditional UPDATE, only one concurrent run can match it"""
+        now = datetime.now(timezone.utc)
+        async with self.async_session() as session:
+            claimed = await session.execute(
+                update(TaskStore)
+                .where(TaskStore.id_task == task_id, or_(
+                    TaskStore.status == Status.PENDING,
+                    and_(TaskStore.status == Status.RUNNING, TaskStore.started_at < now - timedelta(seconds=lease_seconds))
+                ))
+                .values(status=Status.RUNNING, started_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        return claimed.rowcount > 0
+
+    async def update_task_status(self, task_id, status: Status, result: Dict[str, Any] | None = None,
+                                 error: str | None = None) -> bool:
+        """Updates a task by primary key without loading it. Returns whether it exists"""
+        async with self.async_session() as session:
+            updated = await session.execute(
+                update(TaskStore)
+                .where(TaskStore.id_task == task_id)
+                .values(status=status, result=result, error=error)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        return updated.rowcount > 0
+
+    async def update_task_statuses(self, updates: List[Dict[str, Any]]):
+        """Applies many status updates as one executemany UPDATE keyed on id_task"""
+        if not updates:
+            return
+        async with self.async_session() as session:
+            await session.execute(update(TaskStore), updates)
+            await session.commit()
+
+    def _insert_new(self, model):
+        # Postgres and SQLite both skip conflicting rows with ON CONFLICT DO NOTHING
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(self.engine.dialect.name)
+        if dialect is None:
+            raise NotImplementedError(f"No ON CONFLICT DO NOTHING insert for {self.engine.dialect.name}")
+        return dialect.insert(model).on_conflict_do_nothing()
+
+    async def store_records(self, events: List[Dict[str, Any]], tasks: List[Dict[str, Any]],
+                            task_statuses: List[Dict[str, Any]]):
+        """Writes the rows in one transaction, skipping the ones already stored"""
+        async with self.async_session() as session:
+            if events:
+                await session.execute(self._insert_new(EventStore), events)
+            if tasks:
+                await session.execute(self._insert_new(TaskStore), tasks)
+            if task_statuses:
+                await session.execute(update(TaskStore), task_statuses)
+            await session.commit()
+
+
+class PostgresBackend(SQLAlchemyBackend):
+    """asyncpg with a pool sized for the consumers and a larger prepared statement cache"""
+    kind = StorageKind.POSTGRES
+
+    def __init__(self, url: str, pool_size: int = 20, max_overflow: int = 10,
+                 statement_cache_size: int = 1024, echo: bool = False):
+        super().__init__(create_async_engine(
+            url,
+            echo=echo,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            # Connections idle past server or proxy timeouts are replaced
+            # instead of failing the next insert
+            pool_pre_ping=True,
+            pool_recycle=1800,
+            connect_args={"prepared_statement_cache_size": statement_cache_size},
+            json_serializer=payloads.dumps,
+            json_deserializer=payloads.loads
+        ))
+
+
+class SQLiteBackend(SQLAlchemyBackend):
+    """SQLite in WAL mode, so the query API can read while events are written"""
+    kind = StorageKind.SQLITE
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        # With WAL, NORMAL only syncs at checkpoints and cannot corrupt the
+        # database, at the cost of the last commits on power loss
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+    )
+
+    def __init__(self, url: str, echo: bool = False):
+        super().__init__(create_async_engine(
+            url,
+            echo=echo,
+            json_serializer=payloads.dumps,
+            json_deserializer=payloads.loads
+        ))
+        event.listen(self.engine.sync_engine, "connect", self._set_pragmas)
+
+    @classmethod
+    def _set_pragmas(cls, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in cls.PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def _json_record(kind: str, fields: Dict[str, Any], payload: Any) -> bytes:
+    """One log line, with an already validated payload spliced in without re-encoding"""
+    record = payloads.dumps({"kind": kind, **fields})
+    if payload is None:
+        return (record + "\n").encode()
+    raw = str(payload) if isinstance(payload, payloads.RawJSON) else payloads.dumps(payload)
+    return (record[:-1] + ',"payload":' + raw + "}\n").encode()
+
+
+class FileLogBackend(StorageBackend):
+    """Append-only log of events and tasks in fixed-size segment files
+
+    For nodes that only need durable capture. Every record is a JSON line.
+    Writes from concurrent handlers are grouped and made durable with one
+    fsync per group, and a call returns once its records are on disk. A
+    segment is sealed when it reaches `segment_bytes`, and `offload` moves
+    sealed segments into another backend, typically Postgres.
+
+    A directory has a single writer: `init` takes an exclusive lock on it, so
+    every segment but the open one was sealed by this process or by one that
+    has exited. Supervisor workers each get their own subdirectory.
+    """
+    kind = StorageKind.FILE_LOG
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 fsync_batch: int = 1000, fsync_ms: int = 5):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self._file = None
+        self._lock_file = None
+        self._segment: Path | None = None
+        self._sequence = 0
+        self._writer: Batcher[Tuple[List[bytes], asyncio.Future]] = Batcher(
+            self._write, max_size=fsync_batch, linger_ms=fsync_ms, name="file log fsync"
+        )
+
+    def _segments(self) -> List[Path]:
+        return sorted(self.directory.glob("segment-*.log"))
+
+    def sealed_segments(self) -> List[Path]:
+        return [segment for segment in self._segments() if segment != self._segment]
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        self._sequence += 1
+        self._segment = self.directory / f"segment-{self._sequence:012d}.log"
+        self._file = open(self._segment, "ab")
+
+    def _lock_directory(self):
+        self._lock_file = open(self.directory / ".lock", "wb")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"File log {self.directory} is used by another process") from None
+
+    async def init(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock_directory()
+        segments = self._segments()
+        if segments:
+            self._sequence = int(segments[-1].stem.split("-")[1])
+        # Never append to a segment left by a previous run, its tail may be torn
+        self._open_segment()
+
+    async def close(self):
+        await self._writer.close()
+        if self._file is not None:
+            empty = self._file.tell() == 0
+            self._file.close()
+            self._file = None
+            if empty:
+                self._segment.unlink()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _append(self, lines: List[bytes]):
+        self._file.write(b"".join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if self._file.tell() >= self.segment_bytes:
+            self._open_segment()
+
+    async def _write(self, batch: List[Tuple[List[bytes], asyncio.Future]]):
+        try:
+            await asyncio.to_thread(self._append, [line for lines, _ in batch for line in lines])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def _log(self, lines: List[bytes]):
+        future = asyncio.get_running_loop().create_future()
+        await self._writer.add((lines, future))
+        await future
+
+    async def store_events(self, rows: List[Dict[str, Any]]):
+        lines = []
+        for row in rows:
+            fields = {key: value for key, value in row.items() if key != "payload"}
+            fields["id_event_store"] = str(fields.get("id_event_store") or uuid.uuid4())
+            fields["created_at"] = (fields.get("created_at") or datetime.now(timezone.utc)).isoformat()
+            lines.append(_json_record("event", fields, row["payload"]))
+        await self._log(lines)
+
+    async def store_task(self, producer_app: str, correlation_id: str, task_name: str, payload: Any) -> TaskStore:
+        """Appends a PENDING task. The log is never searched, so earlier runs of the same task are not found"""
+        task = TaskStore(
+            id_task=uuid.uuid4(),
+            created_at=datetime.now(timezone.utc),
+            correlation_id=correlation_id,
+            producer_app=producer_app,
+            task_name=task_name,
+            payload=payload,
+            status=Status.PENDING
+        )
+        await self.store_tasks([{column.name: getattr(task, column.name) for column in TaskStore.__table__.columns}])
+        return task
+
+    async def store_tasks(self, rows: List[Dict[str, Any]]):
+        lines = []
+        for row in rows:
+            fields = {key: value for key, value in row.items() if key != "payload"}
+            fields["id_task"] = str(fields["id_task"])
+            fields["created_at"] = fields["created_at"].isoformat()
+            fields["status"] = Status(fields["status"]).value
+            lines.append(_json_record("task", fields, row["payload"]))
+        await self._log(lines)
+
+    async def update_task_statuses(self, updates: List[Dict[str, Any]]):
+        """Appends the new statuses. Tasks are not looked up, so every update reports success"""
+        await self._log([
+            _json_record("task_status", {
+                "id_task": str(status_update["id_task"]),
+                "status": Status(status_update["status"]).value,
+                "result": status_update.get("result"),
+                "error": status_update.get("error"),
+            }, None)
+            for status_update in updates
+        ])
+
+    @staticmethod
+    def read_segment(segment: Path) -> Dict[str, List[Dict[str, Any]]]:
+        """Parses a segment into event rows, task rows and status updates"""
+        records: Dict[str, List[Dict[str, Any]]] = {"event": [], "task": [], "task_status": []}
+        with open(segment, "rb") as file:
+            for number, line in enumerate(file, 1):
+                try:
+                    record = payloads.loads(line)
+                except ValueError:
+                    # Only the last line of a segment cut short by a crash
+                    # can be incomplete, and its write was never confirmed
+                    logging.warning(f"Skipping unreadable line {number} of {segment.name}")
+                    continue
+                kind = record.pop("kind")
+                if "created_at" in record:
+                    record["created_at"] = datetime.fromisoformat(record["created_at"])
+                if kind == "event":
+                    record["id_event_store"] = uuid.UUID(record["id_event_store"])
+                else:
+                    record["id_task"] = uuid.UUID(record["id_task"])
+                    record["status"] = Status(record["status"])
+                records[kind].append(record)
+        return records
+
+    async def offload(self, target: StorageBackend) -> int:
+        """Copies every sealed segment into `target`, deleting each once written
+
+        Each segment is written in one transaction of `target` and ids are
+        kept, so after a crash between the copy and the delete the next
+        offload skips the rows already stored instead of storing them twice.
+        Returns the number of segments offloaded.
+        """
+        offloaded = 0
+        for segment in self.sealed_segments():
+            records = await asyncio.to_thread(self.read_segment, segment)
+            await target.store_records(records["event"], records["task"], records["task_status"])
+            segment.unlink()
+            offloaded += 1
+            logging.info(
+                f"Offloaded {segment.name}: {len(records['event'])} events, "
+                f"{len(records['task'])} tasks, {len(records['task_status'])} statuses"
+            )
+        return offloaded
+
+    async def run_offload(self, target: StorageBackend, interval: float = 60.0):
+        while True:
+            try:
+                await self.offload(target)
+            except Exception:
+                logging.exception("Error offloading file log segments")
+            await asyncio.sleep(interval)
+
+
+def infer_storage_kind(database_url: str) -> StorageKind:
+    if database_url.startswith("sqlite"):
+        return StorageKind.SQLITE
+    return StorageKind.POSTGRES
+
+
+def create_storage(config) -> StorageBackend:
+    """Builds the backend selected by a ConfigModel"""
+    kind = config.storage_backend or infer_storage_kind(config.database_url)
+    if kind == StorageKind.FILE_LOG:
+        return FileLogBackend(
+            config.file_log_dir,
+            segment_bytes=config.file_log_segment_bytes,
+            fsync_batch=config.file_log_fsync_batch,
+            fsync_ms=config.file_log_fsync_ms
+        )
+    if kind == StorageKind.SQLITE:
+        return SQLiteBackend(config.database_url, echo=config.database_echo)
+    return PostgresBackend(
+        config.database_url,
+        pool_size=config.database_pool_size,
+        max_overflow=config.database_max_overflow,
+        statement_cache_size=config.database_statement_cache_size,
+        echo=config.database_echo
+    )
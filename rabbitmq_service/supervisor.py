@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict
+from service import RabbitMQService, ConfigModel
+
+# Seconds between worker heartbeats, and after how many missed ones a worker
+# is reported unhealthy
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_MISSES = 3
+
+# Restart backoff for workers that keep crashing
+MIN_RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 60.0
+
+
+async def run_service(config: ConfigModel, init_db: bool = True, heartbeats=None, worker: int = 0):
+    """Runs one service until SIGTERM or SIGINT, then drains it"""
+    service = RabbitMQService(config)
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, service.stop)
+
+    async def send_heartbeats():
+        while True:
+            heartbeats.put({"worker": worker, "pid": os.getpid(), "at": time.time(), **service.health()})
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    heartbeat = asyncio.create_task(send_heartbeats()) if heartbeats is not None else None
+    try:
+        await service.run(init_db=init_db)
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+
+
+def _worker_main(config: ConfigModel, worker: int, heartbeats):
+    # Drop the supervisor's handlers inherited through fork until the worker
+    # loop installs its own
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    logging.basicConfig(level=logging.INFO, format=f"[worker {worker}] %(levelname)s:%(name)s:%(message)s")
+    asyncio.run(run_service(config, init_db=False, heartbeats=heartbeats, worker=worker))
+
+
+@dataclass
+class WorkerState:
+    index: int
+    process: multiprocessing.Process | None = None
+    started_at: float = 0.0
+    restarts: int = 0
+    restart_at: float = 0.0
+    last_heartbeat: Dict[str, Any] = field(default_factory=dict)
+
+
+class Supervisor:
+    """Runs the service in N worker processes to use every core of the node
+
+    Each worker builds its own RabbitMQService, so it has its own AMQP
+    connection, DB engine and pool. Crashed workers are restarted with an
+    exponential backoff. SIGTERM/SIGINT are forwarded to the workers, which
+    stop consuming and drain before exiting.
+    """
+
+    def __init__(self, config: ConfigModel, workers: int | None = None):
+        self.config = config
+        self.workers = workers or os.cpu_count() or 1
+        self.heartbeats = multiprocessing.Queue()
+        self._states = [WorkerState(index) for index in range(self.workers)]
+        self._stopping = False
+
+    def _worker_config(self, index: int) -> ConfigModel:
+        # A file log directory takes a single writer, each worker gets its own
+        update: Dict[str, Any] = {"file_log_dir": str(Path(self.config.file_log_dir) / f"worker-{index}")}
+        if self.config.http_port is not None:
+            update["http_port"] = self.config.http_port + index
+        # Every worker forks its own process pool, they share the CPUs
+        total_process_workers = self.config.task_process_workers or os.cpu_count() or 1
+        update["task_process_workers"] = max(1, total_process_workers // self.workers)
+        return self.config.model_copy(update=update)
+
+    def _start_worker(self, state: WorkerState):
+        state.process = multiprocessing.Process(
+            target=_worker_main,
+            args=(self._worker_config(state.index), state.index, self.heartbeats),
+            name=f"rabbitmq-service-worker-{state.index}"
+        )
+        state.process.start()
+        state.started_at = time.time()
+        state.last_heartbeat = {}
+        logging.info(f"Started worker {state.index} (pid {state.process.pid})")
+
+    def _on_signal(self, signum, frame):
+        if self._stopping:
+            return
+        logging.info(f"Received {signal.Signals(signum).name}, draining workers")
+        self._stopping = True
+        for state in self._states:
+            if state.process is not None and state.process.is_alive():
+                os.kill(state.process.pid, signal.SIGTERM)
+
+    def _collect_heartbeats(self, timeout: float):
+        try:
+            beat = self.heartbeats.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            self._states[beat["worker"]].last_heartbeat = beat
+            try:
+                beat = self.heartbeats.get_nowait()
+            except queue.Empty:
+                return
+
+    def _check_workers(self):
+        now = time.time()
+        for state in self._states:
+            process = state.process
+            if process is not None and process.is_alive():
+                continue
+
+            if process is not None:
+                logging.warning(f"Worker {state.index} (pid {process.pid}) exited with code {process.exitcode}")
+                # Workers that ran for a while restart right away, crash loops back off
+                if now - state.started_at > MAX_RESTART_DELAY:
+                    state.restarts = 0
+                delay = min(MIN_RESTART_DELAY * 2 ** state.restarts, MAX_RESTART_DELAY)
+                state.restarts += 1
+                state.restart_at = now + delay
+                state.process = None
+
+            if now >= state.restart_at:
+                self._start_worker(state)
+
+    def health(self) -> Dict[str, Any]:
+        """Aggregated health of all workers, built from their last heartbeats"""
+        now = time.time()
+        workers = []
+        for state in self._states:
+            alive = state.process is not None and state.process.is_alive()
+            beat = state.last_heartbeat
+            workers.append({
+                "worker": state.index,
+                "pid": state.process.pid if state.process is not None else None,
+                "alive": alive,
+                "healthy": alive and bool(beat) and now - beat["at"] < HEARTBEAT_INTERVAL * HEARTBEAT_MISSES,
+                "restarts": state.restarts,
+                **{key: value for key, value in beat.items() if key not in ("worker", "pid", "at")}
+            })
+        return {
+            "workers": self.workers,
+            "healthy": sum(worker["healthy"] for worker in workers),
+            "events_inflight": sum(worker.get("events_inflight", 0) for worker in workers),
+            "tasks_inflight": sum(worker.get("tasks_inflight", 0) for worker in workers),
+            "details": workers
+        }
+
+    async def _init_db(self):
+        service = RabbitMQService(self.config)
+        try:
+            await service.init_db()
+        finally:
+            await service.storage.close()
+
+    def run(self):
+        # Create tables once here rather than racing from every worker
+        asyncio.run(self._init_db())
+
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+
+        for state in self._states:
+            self._start_worker(state)
+
+        last_report = time.time()
+        while not self._stopping:
+            self._collect_heartbeats(timeout=1.0)
+            if self._stopping:
+                break
+            self._check_workers()
+
+            if time.time() - last_report >= HEARTBEAT_INTERVAL * HEARTBEAT_MISSES:
+                health = self.health()
+                logging.info(
+                    f"{health['healthy']}/{health['workers']} workers healthy, "
+                    f"{health['events_inflight']} events and {health['tasks_inflight']} tasks in flight"
+                )
+                last_report = time.time()
+
+        # Workers drain on SIGTERM; give them the drain timeout plus some slack
+        deadline = time.time() + self.config.drain_timeout + 10
+        for state in self._states:
+            if state.process is None:
+                continue
+            state.process.join(max(0.0, deadline - time.time()))
+            if state.process.is_alive():
+                logging.warning(f"Worker {state.index} did not stop in time, killing it")
+                state.process.kill()
+                state.process.join()
+        logging.info("All workers stopped")
@@ -0,0 +1,42 @@
+import pytest
+import json
+import sys
+from pathlib import Path
+from typing import Dict
+from unittest.mock import AsyncMock, MagicMock
+
+
+@pytest.fixture
+def make_tasks_package(tmp_path, monkeypatch):
+    """Writes an importable tasks package, `make_tasks_package(name, {module: source})`
+
+    Its modules are unloaded after the test, so each test imports fresh code.
+    """
+    names = []
+
+    def make(name: str, modules: Dict[str, str]) -> Path:
+        package = tmp_path / name
+        package.mkdir()
+        (package / "__init__.py").write_text("")
+        for module, source in modules.items():
+            (package / f"{module}.py").write_text(source)
+        names.append(name)
+        return package
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield make
+    for module in list(sys.modules):
+        if module.split(".")[0] in names:
+            del sys.modules[module]
+
+
+def task_message(task_name: str, payload: dict, correlation_id: str = "corr-1", **attributes) -> MagicMock:
+    """Incoming task message as the service consumes it"""
+    message = MagicMock(correlation_id=correlation_id, **attributes)
+    message.headers = {"producer_app": "app", "correlation_id": correlation_id}
+    message.body = json.dumps({"task_name": task_name, "payload": payload}).encode()
+    message.content_type = "application/json"
+    message.content_encoding = None
+    message.ack = AsyncMock()
+    message.reject = AsyncMock()
+    return message
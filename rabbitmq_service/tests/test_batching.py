@@ -0,0 +1,84 @@
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from batching import Batcher
+
+
+@pytest.mark.asyncio
+async def test_flush_on_size():
+    flushed = []
+
+    async def flush(batch):
+        flushed.append(batch)
+
+    batcher = Batcher(flush, max_size=3, linger_ms=10_000)
+    for i in range(7):
+        await batcher.add(i)
+
+    assert flushed == [[0, 1, 2], [3, 4, 5]]
+    assert len(batcher) == 1
+
+    await batcher.close()
+    assert flushed[-1] == [6]
+    assert batcher.metrics.batches == 3
+    assert batcher.metrics.items == 7
+
+
+@pytest.mark.asyncio
+async def test_flush_on_linger():
+    flushed = []
+
+    async def flush(batch):
+        flushed.append(batch)
+
+    batcher = Batcher(flush, max_size=100, linger_ms=10)
+    await batcher.add("a")
+    await batcher.add("b")
+    assert flushed == []
+
+    await asyncio.sleep(0.05)
+    assert flushed == [["a", "b"]]
+    assert batcher.metrics.last_linger_seconds >= 0.01
+
+
+@pytest.mark.asyncio
+async def test_flush_failure_is_counted():
+    async def flush(batch):
+        raise RuntimeError("db is down")
+
+    batcher = Batcher(flush, max_size=2, linger_ms=10_000)
+    await batcher.add(1)
+    await batcher.add(2)
+
+    assert batcher.metrics.failures == 1
+    assert batcher.metrics.batches == 1
+    assert len(batcher) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_flush():
+    flushed = []
+    release = asyncio.Event()
+
+    async def flush(batch):
+        await release.wait()
+        flushed.append(batch)
+
+    batcher = Batcher(flush, max_size=2, linger_ms=10_000)
+    await batcher.add(1)
+    # The add filling the batch waits for its flush, like a task handler
+    # that then hits its timeout
+    filling = asyncio.create_task(batcher.add(2))
+    await asyncio.sleep(0)
+    filling.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await filling
+
+    release.set()
+    await batcher.close()
+    assert flushed == [[1, 2]]
+    assert batcher.metrics.failures == 0
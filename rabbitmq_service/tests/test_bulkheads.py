@@ -0,0 +1,57 @@
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from conftest import task_message
+from models import Status
+from registry import TaskRegistry
+from service import ConfigModel, RabbitMQService
+
+
+@pytest.fixture
+def tasks_package(make_tasks_package):
+    return make_tasks_package("bulkhead_test_tasks", {"sleepy": (
+        "import asyncio\n"
+        "MAX_CONCURRENCY = 1\n"
+        "TIMEOUT = 0.05\n"
+        "DEDICATED_QUEUE = True\n"
+        "async def execute(payload):\n"
+        "    await asyncio.sleep(payload['seconds'])\n"
+        "    return {'slept': payload['seconds']}\n"
+    )})
+
+
+def test_registry_reads_limits(tasks_package):
+    registry = TaskRegistry("bulkhead_test_tasks")
+    registry.load()
+
+    definition = registry.get("sleepy")
+    assert (definition.max_concurrency, definition.timeout, definition.dedicated_queue) == (1, 0.05, True)
+
+
+@pytest.mark.asyncio
+async def test_timed_out_task_fails(tasks_package, tmp_path):
+    service = RabbitMQService(ConfigModel(
+        "amqp://localhost", f"sqlite+aiosqlite:///{tmp_path / 'store.db'}", tasks_folder="bulkhead_test_tasks"
+    ))
+    service.task_registry.load()
+    await service.init_db()
+    service._finish_task = AsyncMock()
+    try:
+        await asyncio.gather(
+            service._process_task(task_message("sleepy", {"seconds": 0.01}, "quick")),
+            service._process_task(task_message("sleepy", {"seconds": 1}, "stuck"), dedicated=True),
+        )
+    finally:
+        await service.storage.close()
+
+    statuses = {call.args[1] for call in service._finish_task.await_args_list}
+    assert statuses == {Status.COMPLETED, Status.FAILED}
+    assert service.metrics.task_timeouts.value(task_name="sleepy") == 1
+    assert service.task_bulkheads.inflight == {"sleepy": 0}
+    # The second task waited for the first one's slot
+    assert service.metrics.task_wait_seconds.count(task_name="sleepy") == 2
@@ -0,0 +1,77 @@
+import pytest
+import gzip
+import json
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+from pydantic import BaseModel
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+import payloads
+from event_driven.exceptions import ModelException
+from event_driven.message.codecs import CodecError, WireFormat, codecs
+from event_driven.message.creation import create_event_message, task_message
+from event_driven.message.processing import process_message
+
+LARGE = {"tags": [f"tag-{i}" for i in range(1000)]}
+
+
+class Tags(BaseModel):
+    tags: list[str]
+
+
+def incoming(message):
+    received = Mock()
+    received.body = message.body
+    received.content_type = message.content_type
+    received.content_encoding = message.content_encoding
+    received.ack = AsyncMock()
+    return received
+
+
+def test_compression_only_above_threshold():
+    wire_format = WireFormat(compression="gzip", compress_threshold=1024)
+
+    small = create_event_message("orders", 0, {"order_id": 1}, wire_format=wire_format)
+    assert small.content_encoding is None
+    assert json.loads(small.body) == {"order_id": 1}
+
+    large = create_event_message("orders", 0, LARGE, wire_format=wire_format)
+    assert large.content_encoding == "gzip"
+    assert len(large.body) < len(json.dumps(LARGE)) / 4
+    assert json.loads(gzip.decompress(large.body)) == LARGE
+
+
+def test_unknown_formats_fail_early():
+    with pytest.raises(CodecError):
+        WireFormat(content_type="application/x-unknown")
+    with pytest.raises(CodecError):
+        codecs.decode(b"...", "application/json", "br")
+
+
+def test_msgpack_round_trip():
+    pytest.importorskip("msgpack")
+    message = create_event_message("orders", 0, LARGE, wire_format=WireFormat(content_type="application/msgpack"))
+    assert message.content_type == "application/msgpack"
+    assert codecs.decode(message.body, message.content_type, message.content_encoding) == LARGE
+
+
+@pytest.mark.asyncio
+async def test_consumers_decode_what_producers_declare():
+    message = incoming(create_event_message("orders", 0, LARGE, wire_format=WireFormat(compression="gzip")))
+    handler = AsyncMock()
+    await process_message(Mock(), message, handler, Tags, "billing")
+    assert handler.await_args.args[0].tags == LARGE["tags"]
+
+    # Stored as the decoded value, the column writes it as JSON
+    assert payloads.event_payload(message) == LARGE
+
+    task = incoming(task_message("orders", 0, "resize", LARGE, wire_format=WireFormat(compression="gzip")))
+    assert payloads.task_body(task) == {"task_name": "resize", "payload": LARGE}
+
+    corrupt = incoming(create_event_message("orders", 0, LARGE, wire_format=WireFormat(compression="gzip")))
+    corrupt.body = corrupt.body[:20]
+    with pytest.raises(ModelException):
+        await process_message(Mock(), corrupt, handler, Tags, "billing")
+    corrupt.ack.assert_awaited_once()
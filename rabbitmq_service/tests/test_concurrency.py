@@ -0,0 +1,124 @@
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import Mock
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from concurrency import InflightLimiter, Bulkheads, PriorityClass, WeightedFairScheduler
+
+
+def make_message(size: int):
+    message = Mock()
+    message.body = b"x" * size
+    return message
+
+
+@pytest.mark.asyncio
+async def test_limits_concurrency():
+    limiter = InflightLimiter(max_concurrency=2)
+    running = 0
+    max_running = 0
+
+    async def handler(message):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    limited = limiter.wrap(handler)
+    await asyncio.gather(*(limited(make_message(1)) for _ in range(6)))
+
+    assert max_running == 2
+    assert limiter.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_limits_inflight_bytes():
+    limiter = InflightLimiter(max_concurrency=10, max_inflight_bytes=100)
+    max_bytes = 0
+
+    async def handler(message):
+        nonlocal max_bytes
+        max_bytes = max(max_bytes, limiter.inflight_bytes)
+        await asyncio.sleep(0.01)
+
+    limited = limiter.wrap(handler)
+    await asyncio.gather(*(limited(make_message(40)) for _ in range(5)))
+
+    assert max_bytes == 80
+    assert limiter.inflight_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_oversized_message_runs_alone():
+    limiter = InflightLimiter(max_concurrency=10, max_inflight_bytes=100)
+    handled = []
+
+    async def handler(message):
+        handled.append(len(message.body))
+
+    await limiter.wrap(handler)(make_message(500))
+    assert handled == [500]
+
+
+@pytest.mark.asyncio
+async def test_bulkheads_limit_each_name():
+    bulkheads = Bulkheads()
+    slow = [await bulkheads.acquire("slow", 2) for _ in range(2)]
+    waiting = asyncio.create_task(bulkheads.acquire("slow", 2))
+    fast = await asyncio.wait_for(bulkheads.acquire("fast", 2), 1)
+    await asyncio.sleep(0)
+    assert not waiting.done()
+
+    slow[0]()
+    slow[0]()  # Releasing twice frees a single slot
+    release = await asyncio.wait_for(waiting, 1)
+    assert bulkheads.inflight == {"slow": 2, "fast": 1}
+    for release_slot in (slow[1], release, fast):
+        release_slot()
+    assert bulkheads.inflight == {"slow": 0, "fast": 0}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_shares_slots_by_weight():
+    scheduler = WeightedFairScheduler(max_concurrency=1, classes=[
+        PriorityClass(name="high", min_priority=5, weight=3),
+        PriorityClass(name="low", min_priority=0, weight=1),
+    ])
+    assert scheduler.classify(9) == "high"
+    assert scheduler.classify(None) == "low"
+
+    order = []
+
+    async def run(class_name: str):
+        async with scheduler.acquire(class_name):
+            order.append(class_name)
+            await asyncio.sleep(0)
+
+    blocker = scheduler.acquire("low")
+    await blocker.__aenter__()
+    tasks = [asyncio.create_task(run(name)) for name in ["high"] * 6 + ["low"] * 2]
+    await asyncio.sleep(0)
+    assert scheduler.waiting == {"high": 6, "low": 2}
+
+    await blocker.__aexit__(None, None, None)
+    await asyncio.gather(*tasks)
+
+    # Low priority work gets every fourth slot while high priority waits
+    assert order == ["high", "high", "low", "high", "high", "high", "low", "high"]
+    assert scheduler.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_gives_up_its_place():
+    scheduler = WeightedFairScheduler(max_concurrency=1)
+    async with scheduler.acquire("low"):
+        waiter = asyncio.create_task(scheduler.acquire("high").__aenter__())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+    assert scheduler.waiting["high"] == 0
+    assert scheduler.inflight == 0
@@ -0,0 +1,134 @@
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from starlette.responses import Response
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from event_driven.events_driven_utils import SendEventMiddleware, emit_event, event_object
+from event_driven.events_initialization import EventType
+import event_driven.publisher
+import event_driven.runtime
+from event_driven.event_buffer import EventBuffer
+from event_driven.runtime import ServiceRuntime
+
+
+class RecordingPublisher:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.published = []
+        self.flushes = 0
+
+    async def publish(self, message, routing_key):
+        await asyncio.sleep(self.delay)
+        self.published.append((message, routing_key))
+
+    async def flush(self):
+        self.flushes += 1
+
+
+@event_object(runtime=ServiceRuntime.from_settings({"service_name": "users"}))
+class UserCreated(BaseModel):
+    user_id: int
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_drops_and_flush_publishes_in_batches():
+    publisher = RecordingPublisher(delay=0.01)
+    buffer = EventBuffer(publisher, max_size=3, batch_size=10)
+
+    results = [await buffer.put(f"message-{n}", "routing.event.create.user.#") for n in range(5)]
+    assert results == [True, True, True, False, False]
+    assert buffer.dropped == 2
+
+    await buffer.close()
+    assert [message for message, _ in publisher.published] == ["message-0", "message-1", "message-2"]
+    assert publisher.flushes == 1
+
+
+def test_middleware_publishes_after_response_and_flushes_on_shutdown():
+    publisher = RecordingPublisher()
+    app = FastAPI()
+    app.add_middleware(SendEventMiddleware, publisher=publisher, overflow="block")
+
+    @app.post("/users/{user_id}")
+    async def create_user(user_id: int, request: Request):
+        emit_event(request, UserCreated(user_id=user_id), EventType.CREATE)
+        return {"user_id": user_id}
+
+    @app.post("/failing/{user_id}")
+    async def failing(user_id: int, request: Request):
+        emit_event(request, UserCreated(user_id=user_id), EventType.CREATE)
+        return Response(status_code=409)
+
+    with TestClient(app) as client:
+        assert client.post("/users/1").status_code == 200
+        assert client.post("/failing/2").status_code == 409
+        assert client.post("/users/3").status_code == 200
+
+    assert [message.body for message, _ in publisher.published] == [b'{"user_id": 1}', b'{"user_id": 3}']
+    assert publisher.published[0][1] == "routing.event.create.user_created.#"
+    assert publisher.published[0][0].app_id == "users"
+
+
+def test_event_driven_modules_are_loaded_once():
+    import event_driven.events_driven_utils as events_driven_utils
+
+    # A flat import next to the package one would load a second, different EventType
+    assert events_driven_utils.EventType is EventType
+    assert "events_initialization" not in sys.modules
+    assert "events_driven_utils" not in sys.modules
+
+
+@pytest.fixture
+def config_runtime(tmp_path, monkeypatch):
+    """No runtime set up, events fall back to config.yaml with a rabbitmq_url"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.yaml").write_text('service_name: users\nrabbitmq_url: "amqp://localhost/"\n')
+    monkeypatch.setattr(event_driven.runtime, "_default_runtime", None)
+    monkeypatch.setattr(event_driven.runtime, "_file_runtimes", {})
+    exchange = MagicMock(publish=AsyncMock())
+    connection = MagicMock(close=AsyncMock())
+    connection.channel = AsyncMock(return_value=MagicMock(get_exchange=AsyncMock(return_value=exchange), close=AsyncMock()))
+    connect = AsyncMock(return_value=connection)
+    monkeypatch.setattr(event_driven.publisher, "connect_robust", connect)
+    return connect, exchange
+
+
+def emitting_app() -> FastAPI:
+    @event_object()
+    class UserInvited(BaseModel):
+        user_id: int
+
+    app = FastAPI()
+    app.add_middleware(SendEventMiddleware)
+
+    @app.post("/invites/{user_id}")
+    async def invite(user_id: int, request: Request):
+        emit_event(request, UserInvited(user_id=user_id), EventType.CREATE)
+        return {"user_id": user_id}
+    return app
+
+
+def test_middleware_starts_the_default_runtime_publisher(config_runtime):
+    connect, exchange = config_runtime
+    with TestClient(emitting_app()) as client:
+        connect.assert_awaited_once_with("amqp://localhost/")
+        assert client.post("/invites/1").status_code == 200
+        assert client.post("/invites/2").status_code == 200
+
+    assert [call.args[0].body for call in exchange.publish.await_args_list] == [b'{"user_id": 1}', b'{"user_id": 2}']
+    assert exchange.publish.await_args.kwargs["routing_key"] == "routing.event.create.user_invited.#"
+
+
+def test_middleware_fails_startup_when_the_publisher_cannot_start(config_runtime):
+    connect, _ = config_runtime
+    connect.side_effect = ConnectionError("refused")
+    with pytest.raises(ConnectionError):
+        with TestClient(emitting_app()):
+            pass
@@ -0,0 +1,57 @@
+import pytest
+import os
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from registry import TaskRegistry
+from executors import TaskExecutor, ExecutionBackend
+
+
+@pytest.fixture
+def tasks_package(make_tasks_package):
+    return make_tasks_package("executor_test_tasks", {
+        "inline": (
+            "async def execute(payload):\n"
+            "    return {'sum': sum(payload['values'])}\n"
+        ),
+        "blocking": (
+            "import threading\n"
+            "EXECUTION_BACKEND = 'thread'\n"
+            "def execute(payload):\n"
+            "    return {'thread': threading.current_thread().name}\n"
+        ),
+        "crunch": (
+            "import os\n"
+            "EXECUTION_BACKEND = 'process'\n"
+            "def execute(payload):\n"
+            "    return {'pid': os.getpid(), 'sum': sum(range(payload['n']))}\n"
+            "def execute_batch(payloads):\n"
+            "    return [sum(range(payload['n'])) for payload in payloads]\n"
+        ),
+    })
+
+
+@pytest.mark.asyncio
+async def test_dispatch_by_backend(tasks_package):
+    registry = TaskRegistry("executor_test_tasks")
+    registry.load()
+    assert registry.get("crunch").backend == ExecutionBackend.PROCESS
+
+    executor = TaskExecutor(registry, thread_workers=2, process_workers=2)
+    executor.start()
+    try:
+        inline = await executor.run(registry.get("inline"), {"values": [1, 2, 3]})
+        assert inline == {"sum": 6}
+
+        blocking = await executor.run(registry.get("blocking"), {})
+        assert blocking["thread"].startswith("task")
+
+        crunch = await executor.run(registry.get("crunch"), {"n": 1000})
+        assert crunch["sum"] == sum(range(1000))
+        assert crunch["pid"] != os.getpid()
+
+        assert await executor.run_batch(registry.get("crunch"), [{"n": 3}, {"n": 4}]) == [3, 6]
+    finally:
+        executor.shutdown()
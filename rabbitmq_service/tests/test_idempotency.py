@@ -0,0 +1,92 @@
+import pytest
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.ext.asyncio import create_async_engine
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from conftest import task_message
+from idempotency import CompletedTasks, TaskOutcome
+from models import Status
+from registry import TaskDefinition
+from service import ConfigModel, RabbitMQService
+
+
+def test_completed_tasks_evicts_least_recently_used():
+    cache = CompletedTasks(max_size=2)
+    cache.put(("app", "1", "resize"), TaskOutcome(1, Status.COMPLETED))
+    cache.put(("app", "2", "resize"), TaskOutcome(2, Status.COMPLETED))
+    cache.get(("app", "1", "resize"))
+    cache.put(("app", "3", "resize"), TaskOutcome(3, Status.FAILED, error="boom"))
+
+    assert cache.get(("app", "2", "resize")) is None
+    assert cache.get(("app", "1", "resize")).id_task == 1
+    assert len(cache) == 2
+
+
+@pytest.mark.asyncio
+async def test_redelivered_task_runs_once(tmp_path):
+    service = RabbitMQService(ConfigModel("amqp://localhost", f"sqlite+aiosqlite:///{tmp_path / 'store.db'}"))
+    await service.init_db()
+    service.task_registry.get = MagicMock(return_value=TaskDefinition("resize", module=None, execute=None, mtime=None))
+    service.task_executor.run = AsyncMock(return_value={"resized": True})
+    try:
+        await service._process_task(task_message("resize", {"width": 10}))
+        # A restarted worker has an empty cache, the stored row answers
+        service.completed_tasks = CompletedTasks()
+        duplicate = task_message("resize", {"width": 10})
+        await service._process_task(duplicate)
+        # And a cached outcome is acked without a query
+        await service._process_task(task_message("resize", {"width": 10}))
+    finally:
+        await service.storage.close()
+
+    assert service.task_executor.run.await_count == 1
+    assert service.metrics.duplicate_tasks.value(task_name="resize") == 2
+    assert service.completed_tasks.get(("app", "corr-1", "resize")).result == {"resized": True}
+
+
+@pytest.mark.asyncio
+async def test_task_running_elsewhere_is_not_run_again(tmp_path):
+    service = RabbitMQService(ConfigModel("amqp://localhost", f"sqlite+aiosqlite:///{tmp_path / 'store.db'}"))
+    await service.init_db()
+    service.task_registry.get = MagicMock(return_value=TaskDefinition("resize", module=None, execute=None, mtime=None))
+    service.task_executor.run = AsyncMock(return_value={"resized": True})
+    try:
+        # The first delivery claimed the task and is still running it
+        task = await service.store_task("app", "corr-1", "resize", {"width": 10})
+        assert await service.storage.claim_task(task.id_task, lease_seconds=600)
+
+        await service._process_task(task_message("resize", {"width": 10}))
+        assert service.task_executor.run.await_count == 0
+        # Acked by message.process() on the way out
+        assert service.metrics.acks.value(queue="tasks", outcome="ack") == 1
+        assert service.metrics.duplicate_tasks.value(task_name="resize") == 1
+
+        # Once the claim has expired, the first run is assumed lost
+        service.config.task_lease_seconds = 0
+        await service._process_task(task_message("resize", {"width": 10}))
+        assert service.task_executor.run.await_count == 1
+    finally:
+        await service.storage.close()
+
+
+@pytest.mark.asyncio
+async def test_startup_requires_the_task_store_constraint(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'store.db'}"
+    legacy = create_async_engine(url)
+    async with legacy.begin() as conn:
+        await conn.exec_driver_sql(
+            "CREATE TABLE task_store (id_task CHAR(32) PRIMARY KEY, correlation_id VARCHAR NOT NULL, "
+            "producer_app VARCHAR NOT NULL, created_at DATETIME NOT NULL, task_name VARCHAR NOT NULL, "
+            "payload JSON NOT NULL, status VARCHAR(9) NOT NULL, result JSON, error VARCHAR)"
+        )
+    await legacy.dispose()
+
+    service = RabbitMQService(ConfigModel("amqp://localhost", url))
+    try:
+        with pytest.raises(RuntimeError, match="uq_task_store_producer_correlation_task"):
+            await service.init_db()
+    finally:
+        await service.storage.close()
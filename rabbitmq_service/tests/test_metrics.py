@@ -0,0 +1,50 @@
+import pytest
+import sys
+from pathlib import Path
+from pydantic import ValidationError
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from metrics import Counter, Histogram, ServiceMetrics
+from service import ConfigModel
+
+
+def test_counter_per_labels():
+    counter = Counter("acks_total", "Acks", ("queue", "outcome"))
+    counter.inc(queue="events", outcome="ack")
+    counter.inc(3, queue="events", outcome="ack")
+    counter.inc(queue="tasks", outcome="reject")
+
+    assert counter.value(queue="events", outcome="ack") == 4
+    assert 'acks_total{queue="tasks",outcome="reject"} 1' in counter.samples()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("task_seconds", "Task time", ("task_name",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, task_name="resize")
+
+    samples = histogram.samples()
+    assert 'task_seconds_bucket{task_name="resize",le="0.1"} 1' in samples
+    assert 'task_seconds_bucket{task_name="resize",le="1.0"} 2' in samples
+    assert 'task_seconds_bucket{task_name="resize",le="+Inf"} 3' in samples
+    assert 'task_seconds_count{task_name="resize"} 3' in samples
+    assert histogram.count(task_name="resize") == 3
+
+
+def test_render_exposition_format():
+    metrics = ServiceMetrics()
+    metrics.messages.inc(queue="events")
+    metrics.add_gauge("rabbitmq_service_inflight", "In flight", ("queue",), lambda: {("events",): 2})
+
+    text = metrics.render()
+    assert "# TYPE rabbitmq_service_messages_total counter" in text
+    assert 'rabbitmq_service_messages_total{queue="events"} 1' in text
+    assert 'rabbitmq_service_inflight{queue="events"} 2' in text
+    assert text.endswith("\n")
+
+
+def test_metrics_need_the_http_api():
+    with pytest.raises(ValidationError, match="http_port"):
+        ConfigModel("amqp://localhost", "sqlite+aiosqlite:///store.db", metrics_enabled=True)
+    assert ConfigModel("amqp://localhost", "sqlite+aiosqlite:///store.db", metrics_enabled=True, http_port=8080).metrics_enabled
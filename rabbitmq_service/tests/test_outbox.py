@@ -0,0 +1,122 @@
+import pytest
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+from aio_pika import DeliveryMode
+from pydantic import BaseModel
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from event_driven.events_driven_utils import event_object
+from event_driven.events_initialization import EventType
+from event_driven.message.codecs import WireFormat, codecs
+from event_driven.message.creation import create_event_message, task_message
+from event_driven.exceptions import PublishException
+from event_driven.outbox import OutboxBase, OutboxMessage, OutboxRelay, add_to_outbox
+from event_driven.publisher import EventPublisher
+from event_driven.runtime import ServiceRuntime
+
+
+@event_object(runtime=ServiceRuntime.from_settings({"service_name": "orders"}))
+class OrderPlaced(BaseModel):
+    order_id: int
+
+
+@pytest.fixture
+async def session_maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'outbox.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(OutboxBase.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def unsent(session_maker) -> int:
+    async with session_maker() as session:
+        return await session.scalar(select(func.count()).where(OutboxMessage.sent_at.is_(None)))
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_committed_events_once(session_maker):
+    async with session_maker() as session, session.begin():
+        for order_id in (1, 2, 3):
+            OrderPlaced(order_id=order_id, __event_type__=EventType.CREATE).add_to_outbox(session, EventType.CREATE)
+
+    # Rolled back with the caller's transaction, never published
+    async with session_maker() as session:
+        async with session.begin():
+            OrderPlaced(order_id=4, __event_type__=EventType.CREATE).add_to_outbox(session, EventType.CREATE)
+            await session.rollback()
+
+    publisher = MagicMock(publish=AsyncMock(), flush=AsyncMock())
+    relay = OutboxRelay(session_maker, publisher, batch_size=2)
+
+    assert await relay.relay_once() == 2
+    assert await relay.relay_once() == 1
+    assert await relay.relay_once() == 0
+
+    assert publisher.flush.await_count == 2
+    messages = [call.args[0] for call in publisher.publish.await_args_list]
+    assert [message.body for message in messages] == [b'{"order_id": 1}', b'{"order_id": 2}', b'{"order_id": 3}']
+    assert messages[0].app_id == "orders"
+    assert publisher.publish.await_args.args[1:] == ("routing.event.create.order_placed.#", "event.exchange")
+    assert await unsent(session_maker) == 0
+
+
+@pytest.mark.asyncio
+async def test_refused_batch_stays_in_outbox(session_maker):
+    async with session_maker() as session, session.begin():
+        OrderPlaced(order_id=1, __event_type__=EventType.CREATE).add_to_outbox(session, EventType.CREATE)
+
+    publisher = MagicMock(publish=AsyncMock(), flush=AsyncMock(side_effect=PublishException("nacked")))
+    relay = OutboxRelay(session_maker, publisher)
+
+    with pytest.raises(PublishException):
+        await relay.relay_once()
+    assert await unsent(session_maker) == 1
+
+    publisher.flush = AsyncMock()
+    assert await relay.relay_once() == 1
+    assert await unsent(session_maker) == 0
+
+
+@pytest.mark.asyncio
+async def test_relay_keeps_id_order_on_one_channel(session_maker):
+    async with session_maker() as session, session.begin():
+        for order_id in range(10):
+            OrderPlaced(order_id=order_id, __event_type__=EventType.CREATE).add_to_outbox(session, EventType.CREATE)
+
+    # A pooled publisher spreads a batch over channels the broker does not order
+    with pytest.raises(ValueError):
+        OutboxRelay(session_maker, EventPublisher(connection=MagicMock(), pool_size=4))
+
+    published = []
+    exchange = MagicMock(publish=AsyncMock(side_effect=lambda message, routing_key: published.append(message.body)))
+    connection = MagicMock()
+    connection.channel = AsyncMock(return_value=MagicMock(get_exchange=AsyncMock(return_value=exchange), close=AsyncMock()))
+    async with EventPublisher(connection=connection, pool_size=1) as publisher:
+        assert await OutboxRelay(session_maker, publisher).relay_once() == 10
+
+    connection.channel.assert_awaited_once()
+    assert published == [f'{{"order_id": {order_id}}}'.encode() for order_id in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_relayed_message_keeps_encoding_priority_and_delivery_mode(session_maker):
+    event = create_event_message("orders", 0, {"order_id": 1}, wire_format=WireFormat(compression="gzip", compress_threshold=0))
+    assert event.content_encoding == "gzip"
+    task = task_message("orders", 0, "send", {}, priority=7)
+    task.delivery_mode = DeliveryMode.PERSISTENT
+    async with session_maker() as session, session.begin():
+        add_to_outbox(session, event, "routing.event.create.order_placed.#")
+        add_to_outbox(session, task, "routing.task.send.invoice")
+
+    publisher = MagicMock(publish=AsyncMock(), flush=AsyncMock())
+    assert await OutboxRelay(session_maker, publisher).relay_once() == 2
+
+    relayed_event, relayed_task = [call.args[0] for call in publisher.publish.await_args_list]
+    assert relayed_event.content_encoding == "gzip"
+    assert codecs.decode(relayed_event.body, relayed_event.content_type, relayed_event.content_encoding) == {"order_id": 1}
+    assert (relayed_task.priority, relayed_task.delivery_mode) == (7, DeliveryMode.PERSISTENT)
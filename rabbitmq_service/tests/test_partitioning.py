@@ -0,0 +1,140 @@
+import pytest
+import contextlib
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from models import Base, EventStore
+from partitioning import EventPartitioner, PartitionInterval, RetentionAction
+
+
+def make_partitioner(interval: PartitionInterval, dialect: str = "postgresql") -> EventPartitioner:
+    engine = Mock()
+    engine.dialect.name = dialect
+    return EventPartitioner(engine, interval)
+
+
+def test_daily_partitions():
+    partitioner = make_partitioner(PartitionInterval.DAILY)
+    start = partitioner._period_start(datetime(2026, 12, 31, 23, 59, tzinfo=timezone.utc))
+
+    assert partitioner.partition_name(start) == "event_store_p20261231"
+    assert partitioner._next_period(start) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+    assert partitioner._partition_start("event_store_p20261231") == start
+
+
+def test_monthly_partitions():
+    partitioner = make_partitioner(PartitionInterval.MONTHLY)
+    start = partitioner._period_start(datetime(2026, 1, 31, 12, tzinfo=timezone.utc))
+
+    assert partitioner.partition_name(start) == "event_store_p202601"
+    assert partitioner._next_period(start) == datetime(2026, 2, 1, tzinfo=timezone.utc)
+    assert partitioner._partition_start("event_store_default") is None
+
+
+def test_partitioning_is_postgres_only():
+    assert make_partitioner(PartitionInterval.DAILY).enabled
+    assert not make_partitioner(PartitionInterval.DAILY, dialect="sqlite").enabled
+    assert not make_partitioner(None).enabled
+
+
+class RecordingConnection:
+    """Postgres connection of a partitioned event_store, recording every statement"""
+
+    def __init__(self, partitions: list):
+        self.partitions = partitions
+        self.statements = []
+
+    async def scalar(self, statement, parameters=None):
+        self.statements.append(str(statement))
+        return "p"
+
+    async def execute(self, statement, parameters=None):
+        self.statements.append(str(statement))
+        if "pg_inherits" in str(statement):
+            return [SimpleNamespace(relname=name) for name in self.partitions]
+        return Mock(rowcount=0)
+
+
+def postgres_partitioner(partitions: list, **kwargs):
+    conn = RecordingConnection(partitions)
+
+    @contextlib.asynccontextmanager
+    async def begin():
+        yield conn
+    engine = Mock(begin=begin)
+    engine.dialect.name = "postgresql"
+    return EventPartitioner(engine, PartitionInterval.MONTHLY, ahead=1, retention_days=60, **kwargs), conn
+
+
+def ddl(conn: RecordingConnection) -> list:
+    return [statement for statement in conn.statements if statement.startswith(("CREATE", "DROP", "ALTER"))]
+
+
+@pytest.mark.asyncio
+async def test_maintain_drops_expired_postgres_partitions():
+    partitions = ["event_store_default", "event_store_p202607", "event_store_p202608", "event_store_p202609",
+                  "event_store_p202610"]
+    partitioner, conn = postgres_partitioner(partitions)
+
+    report = await partitioner.maintain(now=datetime(2026, 10, 17, tzinfo=timezone.utc))
+
+    # The cutoff is 2026-08-18, only partitions ending before it expire
+    assert report["expired"] == ["event_store_p202607"]
+    assert ddl(conn) == [
+        "CREATE TABLE IF NOT EXISTS event_store_p202611 PARTITION OF event_store "
+        "FOR VALUES FROM ('2026-11-01T00:00:00+00:00') TO ('2026-12-01T00:00:00+00:00')",
+        "DROP TABLE event_store_p202607",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_maintain_detaches_expired_postgres_partitions_into_the_archive():
+    partitioner, conn = postgres_partitioner(
+        ["event_store_p202606", "event_store_p202607", "event_store_p202610", "event_store_p202611"],
+        retention_action=RetentionAction.DETACH, archive_schema="archive"
+    )
+
+    report = await partitioner.maintain(now=datetime(2026, 10, 17, tzinfo=timezone.utc))
+
+    assert report["created"] == ["event_store_default"]
+    assert report["expired"] == ["event_store_p202606", "event_store_p202607"]
+    assert ddl(conn)[1:] == [
+        "ALTER TABLE event_store DETACH PARTITION event_store_p202606",
+        "CREATE SCHEMA IF NOT EXISTS archive",
+        "ALTER TABLE event_store_p202606 SET SCHEMA archive",
+        "ALTER TABLE event_store DETACH PARTITION event_store_p202607",
+        "CREATE SCHEMA IF NOT EXISTS archive",
+        "ALTER TABLE event_store_p202607 SET SCHEMA archive",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_maintain_deletes_expired_rows_on_sqlite(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'store.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    now = datetime(2026, 10, 17, tzinfo=timezone.utc)
+    ages = {"old": 45, "expired": 31, "boundary": 30, "recent": 29, "new": 0}
+    async with engine.begin() as conn:
+        await conn.execute(EventStore.__table__.insert(), [
+            {"correlation_id": name, "producer_app": "app", "created_at": now - timedelta(days=days),
+             "headers": {}, "payload": {}}
+            for name, days in ages.items()
+        ])
+
+    try:
+        report = await EventPartitioner(engine, PartitionInterval.DAILY, retention_days=30).maintain(now=now)
+        async with engine.connect() as conn:
+            kept = set((await conn.scalars(select(EventStore.correlation_id))).all())
+    finally:
+        await engine.dispose()
+
+    assert report["deleted_rows"] == 2
+    assert kept == {"boundary", "recent", "new"}
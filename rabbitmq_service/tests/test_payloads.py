@@ -0,0 +1,44 @@
+import pytest
+import sys
+from pathlib import Path
+from unittest.mock import Mock
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+import payloads
+
+
+def make_message(body: bytes, content_type: str | None = None):
+    message = Mock()
+    message.body = body
+    message.content_type = content_type
+    message.content_encoding = None
+    return message
+
+
+def test_json_event_is_passed_through():
+    body = b'{"user_id": 1, "active": true}'
+    payload = payloads.event_payload(make_message(body, payloads.JSON_CONTENT_TYPE))
+
+    assert isinstance(payload, payloads.RawJSON)
+    assert payload == body.decode()
+
+
+def test_legacy_event_is_parsed_as_literal():
+    payload = payloads.event_payload(make_message(str({"user_id": 1, "active": True}).encode()))
+    assert payload == {"user_id": 1, "active": True}
+
+
+def test_invalid_json_is_rejected():
+    with pytest.raises(ValueError):
+        payloads.event_payload(make_message(b"{'user_id': 1}", payloads.JSON_CONTENT_TYPE))
+
+
+def test_legacy_body_is_never_executed():
+    with pytest.raises((ValueError, SyntaxError)):
+        payloads.task_body(make_message(b"__import__('os').getpid()"))
+
+
+def test_task_arguments_are_read_as_payload():
+    body = payloads.task_body(make_message(b'{"task_name": "resize", "arguments": {"width": 10}}', "application/json"))
+    assert body["payload"] == {"width": 10}
@@ -0,0 +1,86 @@
+import pytest
+import asyncio
+import sys
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from aio_pika import Message
+from event_driven.exceptions import PublishException
+from event_driven.publisher import EventPublisher
+
+ROUND_TRIP = 0.02
+
+
+def make_connection(refuse: str | None = None):
+    published = []
+
+    async def publish(message, routing_key):
+        # Every confirm takes a broker round trip
+        await asyncio.sleep(ROUND_TRIP)
+        if routing_key == refuse:
+            raise ConnectionError("nacked")
+        published.append(routing_key)
+
+    def make_channel(publisher_confirms):
+        assert publisher_confirms
+        channel = MagicMock()
+        channel.get_exchange = AsyncMock(return_value=MagicMock(publish=publish))
+        channel.close = AsyncMock()
+        return channel
+
+    connection = MagicMock()
+    connection.channel = AsyncMock(side_effect=make_channel)
+    return connection, published
+
+
+@pytest.mark.asyncio
+async def test_publishes_are_pipelined():
+    connection, published = make_connection()
+    async with EventPublisher(connection=connection, pool_size=2) as publisher:
+        started = time.monotonic()
+        for n in range(50):
+            await publisher.publish(Message(b"{}"), routing_key=f"routing.event.create.stop.{n}")
+        await publisher.flush()
+        elapsed = time.monotonic() - started
+
+    assert len(published) == 50
+    # Far below the 50 round trips of awaiting each confirm in turn
+    assert elapsed < ROUND_TRIP * 10
+    assert connection.channel.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_flush_reports_unconfirmed():
+    connection, published = make_connection(refuse="routing.event.delete.stop")
+    publisher = EventPublisher(connection=connection, pool_size=1)
+    await publisher.start()
+
+    await publisher.publish(Message(b"{}"), routing_key="routing.event.create.stop")
+    confirm = await publisher.publish(Message(b"{}"), routing_key="routing.event.delete.stop")
+    with pytest.raises(PublishException):
+        await publisher.flush()
+    assert isinstance(confirm.exception(), ConnectionError)
+
+    # Failures are reported once
+    await publisher.flush()
+    await publisher.close()
+    assert published == ["routing.event.create.stop"]
+
+
+@pytest.mark.asyncio
+async def test_awaited_failures_are_raised_to_the_caller_only():
+    connection, published = make_connection(refuse="routing.event.delete.stop")
+    async with EventPublisher(connection=connection, pool_size=1) as publisher:
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                await publisher.publish_confirmed(Message(b"{}"), routing_key="routing.event.delete.stop")
+        assert publisher.failed == 0
+
+        for _ in range(3):
+            await publisher.publish(Message(b"{}"), routing_key="routing.event.delete.stop")
+        with pytest.raises(PublishException, match="3 messages"):
+            await publisher.flush()
+        assert publisher.failed == 0
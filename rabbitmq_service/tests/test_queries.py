@@ -0,0 +1,97 @@
+import pytest
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from httpx import ASGITransport, AsyncClient
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from api import create_app
+from models import EventStore
+from queries import EventFilter, event_query, encode_cursor, decode_cursor
+from service import ConfigModel, RabbitMQService
+
+
+def test_cursor_round_trip():
+    position = (datetime(2026, 10, 17, 12, 30, tzinfo=timezone.utc), uuid.uuid4())
+    assert decode_cursor(encode_cursor(position)) == position
+
+
+def test_invalid_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_event_query_filters_and_seeks():
+    position = (datetime(2026, 10, 17, tzinfo=timezone.utc), uuid.uuid4())
+    query = str(event_query(EventFilter(entity_name="stop", event_key="1"), after=position, limit=10))
+
+    assert "event_store.entity_name = :entity_name_1" in query
+    assert "event_store.event_key = :event_key_1" in query
+    assert "(event_store.created_at, event_store.id_event_store) >" in query
+    assert "ORDER BY event_store.created_at, event_store.id_event_store" in query
+    assert "OFFSET" not in query
+
+
+@pytest.fixture
+async def service(tmp_path):
+    service = RabbitMQService(ConfigModel("amqp://localhost", f"sqlite+aiosqlite:///{tmp_path / 'store.db'}"))
+    await service.init_db()
+    # Several events share each timestamp, the id breaks the tie
+    started = datetime(2026, 10, 17, tzinfo=timezone.utc)
+    async with service.async_session() as session, session.begin():
+        session.add_all(
+            EventStore(correlation_id=f"corr-{n}", producer_app="app", created_at=started + timedelta(seconds=n // 4),
+                       headers={}, payload={"n": n}, entity_name="stop" if n % 3 else "route")
+            for n in range(30)
+        )
+    yield service
+    await service.storage.close()
+
+
+def expected_payloads(entity_name: str | None = None):
+    return sorted(n for n in range(30) if entity_name is None or ("stop" if n % 3 else "route") == entity_name)
+
+
+@pytest.mark.asyncio
+async def test_query_events_pages_without_gaps_or_duplicates(service):
+    filters = EventFilter(entity_name="stop")
+    seen, cursor, pages = [], None, 0
+    while True:
+        events, cursor = await service.query_events(filters, limit=4, cursor=cursor)
+        seen.extend(event.id_event_store for event in events)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) == len(expected_payloads("stop"))
+    async with service.async_session() as session:
+        in_order = (await session.scalars(event_query(filters))).all()
+    assert seen == [event.id_event_store for event in in_order]
+    assert pages == 5
+
+
+@pytest.mark.asyncio
+async def test_iter_events_yields_every_row(service):
+    events = [event async for event in service.iter_events(EventFilter(), page_size=7)]
+
+    assert sorted(event.payload["n"] for event in events) == expected_payloads()
+    assert len({event.id_event_store for event in events}) == 30
+
+
+@pytest.mark.asyncio
+async def test_events_endpoint_follows_next_cursor(service):
+    async with AsyncClient(transport=ASGITransport(app=create_app(service)), base_url="http://test") as client:
+        ids, params = [], {"entity_name": "route", "limit": 3}
+        while True:
+            response = await client.get("/events", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            ids.extend(event["id_event_store"] for event in page["events"])
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+
+        assert len(ids) == len(set(ids)) == len(expected_payloads("route"))
+        assert (await client.get("/events", params={"cursor": "not-a-cursor"})).status_code == 400
@@ -0,0 +1,94 @@
+import pytest
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from conftest import task_message
+from registry import TaskRegistry
+from service import ConfigModel, RabbitMQService
+
+TASK_SOURCE = """
+async def execute(payload):
+    return {{"version": {version}}}
+"""
+
+
+@pytest.fixture
+def tasks_package(make_tasks_package):
+    return make_tasks_package("registry_test_tasks", {
+        "send_email": TASK_SOURCE.format(version=1),
+        "helpers": "VALUE = 1\n",
+    })
+
+
+def test_load_resolves_execute(tasks_package):
+    registry = TaskRegistry("registry_test_tasks")
+    registry.load()
+
+    assert registry.names == ["send_email"]
+    assert "helpers" not in registry
+    assert registry.get("unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_picks_up_changes(tasks_package):
+    registry = TaskRegistry("registry_test_tasks")
+    registry.load()
+    assert await registry.get("send_email").execute({}) == {"version": 1}
+
+    task_file = tasks_package / "send_email.py"
+    task_file.write_text(TASK_SOURCE.format(version=2))
+    stat = task_file.stat()
+    os.utime(task_file, (stat.st_atime, stat.st_mtime + 10))
+    (tasks_package / "resize_image.py").write_text(TASK_SOURCE.format(version=1))
+
+    assert registry.refresh() == 2
+    assert await registry.get("send_email").execute({}) == {"version": 2}
+    assert "resize_image" in registry
+    assert registry.refresh() == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("headers, body", [
+    (None, b'{"task_name": "send_email", "payload": {}}'),
+    ({"producer_app": "app", "correlation_id": "1"}, b"not json"),
+    ({"producer_app": "app", "correlation_id": "1"}, b'{"payload": {}}'),
+])
+async def test_malformed_task_is_rejected(tasks_package, tmp_path, headers, body):
+    service = RabbitMQService(ConfigModel(
+        "amqp://localhost", f"sqlite+aiosqlite:///{tmp_path / 'store.db'}", tasks_folder="registry_test_tasks"
+    ))
+    service.task_registry.load()
+    message = task_message("send_email", {})
+    message.headers = headers
+    message.body = body
+    try:
+        await service._process_task(message)
+    finally:
+        await service.storage.close()
+
+    message.reject.assert_awaited_once_with(requeue=False)
+    assert service.metrics.acks.value(queue="tasks", outcome="reject") == 1
+
+
+@pytest.mark.asyncio
+async def test_watch_calls_back_after_a_change(tasks_package):
+    registry = TaskRegistry("registry_test_tasks")
+    registry.load()
+    changes = []
+
+    async def on_change():
+        changes.append(registry.names)
+        watcher.cancel()
+
+    watcher = asyncio.create_task(registry.watch(0.01, on_change=on_change))
+    await asyncio.sleep(0.05)
+    assert changes == []
+
+    (tasks_package / "resize_image.py").write_text(TASK_SOURCE.format(version=1))
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(watcher, 5)
+    assert changes == [["resize_image", "send_email"]]
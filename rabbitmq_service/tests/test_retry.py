@@ -0,0 +1,83 @@
+import pytest
+import json
+import random
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+from pydantic import BaseModel
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from event_driven.events_initialization import EventType
+from event_driven.exceptions import TechnicalException
+from event_driven.message.processing import process_message
+from event_driven.retry import (
+    ORIGINAL_ROUTING_KEY_HEADER, RETRY_DELAY_HEADER, DelayedRetry, retry_tiers_topology
+)
+from event_driven.topology import event_topology
+
+
+class Order(BaseModel):
+    order_id: int
+
+
+def incoming(routing_key: str, headers: dict):
+    message = MagicMock()
+    message.body = json.dumps({"order_id": 1}).encode()
+    message.routing_key = routing_key
+    message.headers = headers
+    message.content_type = "application/json"
+    message.content_encoding = None
+    message.delivery_mode = 2
+    message.priority = None
+    message.expiration = None
+    message.timestamp = None
+    message.ack = AsyncMock()
+    message.nack = AsyncMock()
+    return message
+
+
+def test_delay_picks_tier_with_jitter_below_it():
+    retry = DelayedRetry(MagicMock(), tiers=(1000, 3000, 6000, 12000), initial_delay=3000, jitter=0.2)
+    random.seed(7)
+    delays = [retry.delay_for(0) for _ in range(50)]
+    assert {tier for tier, _ in delays} == {3000}
+    assert all(2400 <= delay <= 3000 for _, delay in delays)
+    assert len({delay for _, delay in delays}) > 1
+    assert retry.delay_for(1)[0] == 6000
+    # Past the longest tier, the longest tier is used
+    assert retry.delay_for(10)[0] == 12000
+
+
+def test_shared_tiers_replace_attempt_queues():
+    queues = event_topology("order", "billing", set(EventType), attempts=0).merge(retry_tiers_topology((1000, 5000))).queues
+    assert not [name for name in queues if name.startswith("attempt.")]
+    assert queues["retry.delay.5000"].arguments == {'x-message-ttl': 5000, 'x-dead-letter-exchange': ''}
+
+
+@pytest.mark.asyncio
+async def test_failed_event_returns_to_its_queue_with_original_routing_key():
+    retry_exchange = MagicMock(publish=AsyncMock())
+    retry = DelayedRetry(retry_exchange, tiers=(1000, 3000, 6000), initial_delay=1000)
+    events_exchange = MagicMock(publish=AsyncMock())
+    handler = AsyncMock(side_effect=TechnicalException("database down"))
+
+    first = incoming("routing.event.create.order.#", {"x-attempt": 0})
+    await process_message(events_exchange, first, handler, Order, "billing", retry=retry)
+
+    first.ack.assert_awaited_once()
+    events_exchange.publish.assert_not_awaited()
+    retried = retry_exchange.publish.await_args.args[0]
+    assert retry_exchange.publish.await_args.kwargs["routing_key"] == "event.create.order.to.billing"
+    assert retried.headers[ORIGINAL_ROUTING_KEY_HEADER] == "routing.event.create.order.#"
+    assert retried.headers[RETRY_DELAY_HEADER] == 1000
+    assert retried.headers["x-attempt"] == 1
+    assert 0.8 <= retried.expiration <= 1.0
+
+    # Dead-lettered back through the default exchange, addressed to the queue
+    second = incoming("event.create.order.to.billing", dict(retried.headers))
+    await process_message(events_exchange, second, handler, Order, "billing", retry=retry)
+    again = retry_exchange.publish.await_args.args[0]
+    assert retry_exchange.publish.await_args.kwargs["routing_key"] == "event.create.order.to.billing"
+    assert again.headers[ORIGINAL_ROUTING_KEY_HEADER] == "routing.event.create.order.#"
+    assert again.headers[RETRY_DELAY_HEADER] == 3000
@@ -0,0 +1,99 @@
+import pytest
+import os
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+from pydantic import BaseModel
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from event_driven.events_driven_utils import event_object
+from event_driven.events_initialization import EventType
+import event_driven.publisher
+import event_driven.runtime
+from event_driven.publisher import EventPublisher
+from event_driven.runtime import ServiceRuntime
+
+
+def write_config(path: Path, service_name: str, mtime: int):
+    path.write_text(f"service_name: {service_name}\n")
+    # Explicit mtimes, two writes within a clock tick would look unchanged
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_reload_swaps_config_only_when_file_changes(tmp_path):
+    path = tmp_path / "config.yaml"
+    write_config(path, "orders", 1_000_000_000)
+    runtime = ServiceRuntime.from_file(str(path))
+    assert runtime.service_name == "orders"
+    assert not runtime.reload()
+
+    write_config(path, "billing", 2_000_000_000)
+    assert runtime.reload()
+    assert runtime.service_name == "billing"
+
+    path.write_text("service_name: [")
+    os.utime(path, ns=(3_000_000_000, 3_000_000_000))
+    with pytest.raises(Exception):
+        runtime.reload()
+    assert runtime.service_name == "billing"
+
+
+@pytest.mark.asyncio
+async def test_bound_runtime_publishes_without_reading_config(tmp_path, monkeypatch):
+    # No config.yaml in the working directory, everything comes from the runtime
+    monkeypatch.chdir(tmp_path)
+    publisher = MagicMock(spec=EventPublisher, publish_confirmed=AsyncMock())
+    runtime = ServiceRuntime.from_settings({"service_name": "orders"}, publisher=publisher)
+
+    @event_object(runtime=runtime)
+    class OrderPlaced(BaseModel):
+        order_id: int
+
+    await OrderPlaced(order_id=1, __event_type__=EventType.CREATE).on_create()
+    await OrderPlaced(order_id=2, __event_type__=EventType.CREATE).on_create()
+
+    # Each event waits for its own confirm
+    assert publisher.publish_confirmed.await_count == 2
+    message = publisher.publish_confirmed.await_args.args[0]
+    assert message.app_id == "orders"
+    assert publisher.publish_confirmed.await_args.kwargs["routing_key"] == "routing.event.create.order_placed.#"
+    assert runtime.routing_key(EventType.CREATE, "order_placed") is runtime.routing_key(EventType.CREATE, "order_placed")
+
+    # An exchange passed by the caller still wins over the runtime's publisher
+    exchange = MagicMock(publish=AsyncMock())
+    await OrderPlaced(order_id=3, __event_type__=EventType.CREATE).on_create(exchange)
+    exchange.publish.assert_awaited_once()
+    assert publisher.publish_confirmed.await_count == 2
+
+
+def fake_connection():
+    exchange = MagicMock(publish=AsyncMock())
+    connection = MagicMock(close=AsyncMock())
+    connection.channel = AsyncMock(return_value=MagicMock(get_exchange=AsyncMock(return_value=exchange), close=AsyncMock()))
+    return connection, exchange
+
+
+@pytest.mark.asyncio
+async def test_default_runtime_from_config_starts_its_publisher_on_first_publish(tmp_path, monkeypatch):
+    # No init_runtime and no bound runtime, config.yaml of the working directory is used
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.yaml").write_text('service_name: orders\nrabbitmq_url: "amqp://localhost/"\n')
+    monkeypatch.setattr(event_driven.runtime, "_default_runtime", None)
+    monkeypatch.setattr(event_driven.runtime, "_file_runtimes", {})
+    connection, exchange = fake_connection()
+    connect = AsyncMock(return_value=connection)
+    monkeypatch.setattr(event_driven.publisher, "connect_robust", connect)
+
+    @event_object()
+    class OrderShipped(BaseModel):
+        order_id: int
+
+    await OrderShipped(order_id=1, __event_type__=EventType.CREATE).on_create()
+    await OrderShipped(order_id=2, __event_type__=EventType.CREATE).on_create()
+
+    connect.assert_awaited_once_with("amqp://localhost/")
+    assert exchange.publish.await_count == 2
+    assert exchange.publish.await_args.kwargs["routing_key"] == "routing.event.create.order_shipped.#"
+    await event_driven.runtime.get_runtime().close()
+    connection.close.assert_awaited_once()
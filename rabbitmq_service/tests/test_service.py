@@ -35,7 +35,6 @@ async def test_store_event(service):
 
         # Сохраняем событие
         event = await service.store_event(
-            session=session,
             producer_app=producer_app,
             correlation_id=correlation_id,
             headers=headers,
@@ -59,7 +58,6 @@ async def test_store_task(service):
 
         # Сохраняем задачу
         task = await service.store_task(
-            session=session,
             producer_app=producer_app,
             correlation_id=correlation_id,
             task_name=task_name,
@@ -78,7 +76,6 @@ async def test_update_task_status(service):
     async with service.async_session() as session:
         # Создаем тестовую задачу
         task = await service.store_task(
-            session=session,
             producer_app="test_app",
             correlation_id="test_correlation_id",
             task_name="test_task",
@@ -87,14 +84,15 @@ async def test_update_task_status(service):
 
         # Обновляем статус задачи
         result = {"result": "success"}
-        updated_task = await service.update_task_status(
-            session=session,
+        updated = await service.update_task_status(
             task_id=task.id_task,
             status=Status.COMPLETED,
             result=result
         )
+        assert updated
 
         # Проверяем обновление
+        updated_task = await session.get(TaskStore, task.id_task)
         assert updated_task.status == Status.COMPLETED
         assert updated_task.result == result
         assert updated_task.error is None
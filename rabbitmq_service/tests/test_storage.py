@@ -0,0 +1,118 @@
+import pytest
+import sys
+from pathlib import Path
+from sqlalchemy import select
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from models import EventStore, Status, TaskStore
+from payloads import RawJSON
+from storage import FileLogBackend, SQLiteBackend
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_uses_wal(tmp_path):
+    backend = SQLiteBackend(f"sqlite+aiosqlite:///{tmp_path / 'store.db'}")
+    await backend.init()
+    try:
+        task = await backend.store_task("app", "corr-1", "resize", {"width": 10})
+        assert await backend.update_task_status(task.id_task, Status.COMPLETED, result={"ok": True})
+
+        async with backend.engine.connect() as conn:
+            assert (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar() == "wal"
+    finally:
+        await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_file_log_rolls_segments_and_offloads(tmp_path):
+    log = FileLogBackend(str(tmp_path / "log"), segment_bytes=1)
+    await log.init()
+    await log.store_event("app", "corr-1", {}, RawJSON('{"a": 1}'), routing_key="routing.event.create.stop")
+    task = await log.store_task("app", "corr-2", "resize", {"width": 10})
+    await log.update_task_status(task.id_task, Status.FAILED, error="boom")
+    await log.close()
+
+    # Every write filled and sealed its segment
+    assert len(log.sealed_segments()) == 3
+    records = FileLogBackend.read_segment(log.sealed_segments()[0])
+    assert records["event"][0]["payload"] == {"a": 1}
+    assert records["event"][0]["routing_key"] == "routing.event.create.stop"
+
+    target = SQLiteBackend(f"sqlite+aiosqlite:///{tmp_path / 'central.db'}")
+    await target.init()
+    try:
+        assert await log.offload(target) == 3
+        async with target.async_session() as session:
+            stored = await session.get(TaskStore, task.id_task)
+            assert stored.task_name == "resize"
+    finally:
+        await target.close()
+    assert log.sealed_segments() == []
+
+
+@pytest.mark.asyncio
+async def test_file_log_skips_torn_tail(tmp_path):
+    segment = tmp_path / "segment-000000000001.log"
+    segment.write_bytes(b'{"kind": "task_status", "id_task": "6f1c1d3c-8a59-4a62-9a36-37c0a2a1c0de", "status": "completed"}\n{"kind": "ev')
+
+    records = FileLogBackend.read_segment(segment)
+    assert len(records["task_status"]) == 1
+    assert records["event"] == []
+
+
+@pytest.mark.asyncio
+async def test_file_log_directory_has_one_writer(tmp_path):
+    log = FileLogBackend(str(tmp_path / "log"))
+    await log.init()
+    try:
+        with pytest.raises(RuntimeError):
+            await FileLogBackend(str(tmp_path / "log")).init()
+    finally:
+        await log.close()
+
+    reopened = FileLogBackend(str(tmp_path / "log"))
+    await reopened.init()
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_file_log_offload_survives_a_crash_before_the_delete(tmp_path):
+    log = FileLogBackend(str(tmp_path / "log"), segment_bytes=1)
+    await log.init()
+    await log.store_event("app", "corr-1", {}, RawJSON('{"a": 1}'))
+    task = await log.store_task("app", "corr-2", "resize", {"width": 10})
+    await log.update_task_status(task.id_task, Status.COMPLETED, result={"ok": True})
+    await log.close()
+    segments = {segment: segment.read_bytes() for segment in log.sealed_segments()}
+
+    target = SQLiteBackend(f"sqlite+aiosqlite:///{tmp_path / 'central.db'}")
+    await target.init()
+    try:
+        assert await log.offload(target) == 3
+        # The segments come back as if the process died before unlinking them
+        for segment, content in segments.items():
+            segment.write_bytes(content)
+        assert await log.offload(target) == 3
+
+        async with target.async_session() as session:
+            assert len((await session.scalars(select(EventStore))).all()) == 1
+            stored = (await session.scalars(select(TaskStore))).one()
+            assert (stored.status, stored.result) == (Status.COMPLETED, {"ok": True})
+    finally:
+        await target.close()
+
+
+@pytest.mark.asyncio
+async def test_store_event_returns_the_payload_as_data(tmp_path):
+    sqlite = SQLiteBackend(f"sqlite+aiosqlite:///{tmp_path / 'store.db'}")
+    log = FileLogBackend(str(tmp_path / "log"))
+    for backend in (sqlite, log):
+        await backend.init()
+        try:
+            raw = await backend.store_event("app", "corr-1", {}, RawJSON('{"a": 1}'))
+            parsed = await backend.store_event("app", "corr-2", {}, {"a": 1})
+        finally:
+            await backend.close()
+        assert raw.payload == parsed.payload == {"a": 1}
+        assert not isinstance(raw.payload, str)
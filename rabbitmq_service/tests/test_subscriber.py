@@ -0,0 +1,122 @@
+import pytest
+import asyncio
+import json
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+from pydantic import BaseModel
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from event_driven.events_driven_utils import event_object
+from event_driven.events_initialization import EventType
+from event_driven.runtime import ServiceRuntime
+from event_driven.subscriber import Subscriber
+
+
+@event_object(runtime=ServiceRuntime.from_settings({"service_name": "billing"}))
+class Order(BaseModel):
+    order_id: int
+
+
+@event_object(runtime=ServiceRuntime.from_settings({"service_name": "billing"}))
+class Refund(BaseModel):
+    refund_id: int
+
+
+def make_connection(log: list):
+    consumers = {}
+
+    def make_channel():
+        channel = MagicMock()
+        channel.get_exchange = AsyncMock()
+        channel.set_qos = AsyncMock(side_effect=lambda prefetch_count: log.append(("qos", channel, prefetch_count)))
+        channel.close = AsyncMock(side_effect=lambda: log.append(("close", channel)))
+
+        async def get_queue(name):
+            queue = MagicMock()
+            queue.name = name
+
+            async def consume(callback):
+                log.append(("consume", channel, name))
+                consumers[name] = callback
+                return f"tag-{name}"
+            queue.consume = consume
+            queue.cancel = AsyncMock(side_effect=lambda tag: log.append(("cancel", tag)))
+            return queue
+        channel.get_queue = get_queue
+        return channel
+
+    connection = MagicMock()
+    connection.channel = AsyncMock(side_effect=lambda: make_channel())
+    return connection, consumers
+
+
+def delivery(body: dict):
+    message = MagicMock()
+    message.body = json.dumps(body).encode()
+    message.content_type = "application/json"
+    message.content_encoding = None
+    message.ack = AsyncMock()
+    return message
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_share_channels_with_their_own_prefetch():
+    log = []
+    connection, consumers = make_connection(log)
+    subscriber = Subscriber(connection, channels=2, prefetch=50)
+    for event_type in (EventType.CREATE, EventType.UPDATE, EventType.DELETE):
+        subscriber.subscribe(Order, event_type, AsyncMock())
+    subscriber.subscribe(Refund, EventType.CREATE, AsyncMock(), prefetch=5)
+
+    await subscriber.start()
+
+    assert connection.channel.await_count == 2
+    assert set(consumers) == {
+        "event.create.order.to.billing", "event.update.order.to.billing",
+        "event.delete.order.to.billing", "event.create.refund.to.billing",
+    }
+    # Every consume on a channel follows the prefetch of its own subscription
+    prefetch_of = {}
+    for entry in log:
+        if entry[0] == "qos":
+            prefetch_of[entry[1]] = entry[2]
+        elif entry[0] == "consume":
+            assert prefetch_of[entry[1]] == (5 if entry[2] == "event.create.refund.to.billing" else 50)
+
+    await subscriber.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_consumers_then_drains_then_closes():
+    log = []
+    connection, consumers = make_connection(log)
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(order: Order):
+        await release.wait()
+        handled.append(order.order_id)
+        log.append(("handled", order.order_id))
+
+    subscriber = Subscriber(connection, channels=2)
+    subscriber.subscribe(Order, EventType.CREATE, handler)
+    await subscriber.start()
+
+    message = delivery({"order_id": 7})
+    running = asyncio.create_task(consumers["event.create.order.to.billing"](message))
+    await asyncio.sleep(0)
+    assert subscriber.inflight == 1
+
+    stopping = asyncio.create_task(subscriber.stop())
+    await asyncio.sleep(0.01)
+    assert not stopping.done()
+    assert ("cancel", "tag-event.create.order.to.billing") in log
+
+    release.set()
+    await asyncio.gather(running, stopping)
+    message.ack.assert_awaited_once()
+    assert handled == [7]
+    steps = [entry[0] for entry in log if entry[0] in ("cancel", "handled", "close")]
+    assert steps == ["cancel", "handled", "close"]
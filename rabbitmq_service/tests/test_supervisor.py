@@ -0,0 +1,113 @@
+import pytest
+import signal
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+import supervisor
+from main import load_config
+from service import ConfigModel
+from supervisor import MAX_RESTART_DELAY, Supervisor
+
+
+class FakeProcess:
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.exitcode = None
+        self.alive = True
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def exit(self, code: int = 1):
+        self.alive = False
+        self.exitcode = code
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(supervisor, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def started(monkeypatch, clock):
+    started = []
+
+    def start_worker(self, state):
+        state.process = FakeProcess(pid=len(started) + 100)
+        state.started_at = clock.now
+        started.append(state.index)
+    monkeypatch.setattr(Supervisor, "_start_worker", start_worker)
+    return started
+
+
+def test_load_config_defaults_the_tasks_package(monkeypatch):
+    monkeypatch.setenv("RABBITMQ_URL", "amqp://localhost")
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///store.db")
+    monkeypatch.delenv("TASKS_PACKAGE", raising=False)
+
+    assert load_config().tasks_folder == "tasks"
+
+
+def test_worker_config_offsets_the_http_port_and_splits_resources():
+    config = ConfigModel("amqp://localhost", "sqlite+aiosqlite:///store.db", http_port=8000)
+    workers = Supervisor(config, workers=3)
+
+    assert [workers._worker_config(index).http_port for index in range(3)] == [8000, 8001, 8002]
+    assert config.http_port == 8000
+    # Workers never share a file log directory
+    assert len({workers._worker_config(index).file_log_dir for index in range(3)}) == 3
+
+    # The workers split the process pool instead of each taking every CPU
+    pooled = Supervisor(ConfigModel("amqp://localhost", "sqlite+aiosqlite:///store.db", task_process_workers=8), workers=3)
+    assert [pooled._worker_config(index).task_process_workers for index in range(3)] == [2, 2, 2]
+    assert Supervisor(config, workers=64)._worker_config(0).task_process_workers == 1
+
+    without_http = Supervisor(ConfigModel("amqp://localhost", "sqlite+aiosqlite:///store.db"), workers=2)
+    assert without_http._worker_config(1).http_port is None
+
+
+def test_crash_loops_back_off_and_long_runs_restart_at_once(clock, started):
+    workers = Supervisor(ConfigModel("amqp://localhost", "sqlite+aiosqlite:///store.db"), workers=2)
+    workers._check_workers()
+    assert started == [0, 1]
+    state = workers._states[0]
+
+    # Each crash right after a start doubles the delay
+    for restarts, delay in enumerate((1.0, 2.0, 4.0), start=1):
+        state.process.exit()
+        workers._check_workers()
+        assert state.process is None and state.restarts == restarts
+        clock.now += delay - 0.1
+        workers._check_workers()
+        assert state.process is None
+        clock.now += 0.1
+        workers._check_workers()
+        assert started.count(0) == restarts + 1
+
+    # A worker that ran longer than the maximum delay starts from scratch
+    clock.now += MAX_RESTART_DELAY + 1
+    state.process.exit()
+    workers._check_workers()
+    assert state.restarts == 1 and state.restart_at == clock.now + 1.0
+
+    # The other worker never crashed and was left alone
+    assert started.count(1) == 1
+
+
+def test_signal_is_forwarded_once_to_live_workers(monkeypatch, started):
+    killed = []
+    monkeypatch.setattr(supervisor.os, "kill", lambda pid, signum: killed.append((pid, signum)))
+    workers = Supervisor(ConfigModel("amqp://localhost", "sqlite+aiosqlite:///store.db"), workers=2)
+    workers._check_workers()
+    workers._states[1].process.exit()
+
+    workers._on_signal(signal.SIGTERM, None)
+    workers._on_signal(signal.SIGTERM, None)
+
+    assert killed == [(workers._states[0].process.pid, signal.SIGTERM)]
+    assert workers._stopping
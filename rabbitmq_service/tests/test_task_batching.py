@@ -0,0 +1,45 @@
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from conftest import task_message
+from models import Status
+from service import ConfigModel, RabbitMQService
+
+
+@pytest.fixture
+def tasks_package(make_tasks_package):
+    return make_tasks_package("batch_test_tasks", {"enrich": (
+        "BATCH_SIZE = 3\n"
+        "calls = []\n"
+        "async def execute(payload):\n"
+        "    raise AssertionError('execute_batch should be used')\n"
+        "async def execute_batch(payloads):\n"
+        "    calls.append(len(payloads))\n"
+        "    return [ValueError('bad id') if payload['id'] < 0 else {'id': payload['id']} for payload in payloads]\n"
+    )})
+
+
+@pytest.mark.asyncio
+async def test_tasks_run_in_one_batch(tasks_package, tmp_path):
+    service = RabbitMQService(ConfigModel(
+        "amqp://localhost", f"sqlite+aiosqlite:///{tmp_path / 'store.db'}", tasks_folder="batch_test_tasks"
+    ))
+    service.task_registry.load()
+    await service.init_db()
+    service._finish_task = AsyncMock()
+    try:
+        await asyncio.gather(*(service._process_task(task_message("enrich", {"id": record_id}, f"corr-{record_id}")) for record_id in (1, -2, 3)))
+    finally:
+        await service.storage.close()
+
+    assert sys.modules["batch_test_tasks.enrich"].calls == [3]
+    outcomes = {call.args[0]: call for call in service._finish_task.await_args_list}
+    statuses = sorted(call.args[1].value for call in outcomes.values())
+    assert statuses == [Status.COMPLETED.value, Status.COMPLETED.value, Status.FAILED.value]
+    failed = next(call for call in outcomes.values() if call.args[1] == Status.FAILED)
+    assert failed.kwargs["error"] == "bad id"
@@ -0,0 +1,227 @@
+import pytest
+import asyncio
+import json
+import sys
+from pathlib import Path
+from sqlalchemy import select
+from unittest.mock import AsyncMock, MagicMock
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from types import SimpleNamespace
+from aio_pika import ExchangeType
+from aio_pika.robust_queue import RobustQueue
+from event_driven.events_initialization import TASK_EXCHANGE
+from event_driven.exceptions import TaskFailedException
+from event_driven.task_client import TaskClient, task_reply_message
+from conftest import task_message
+from idempotency import TaskOutcome
+from models import Status, TaskStore
+from registry import TaskDefinition
+from service import ConfigModel, RabbitMQService
+import service as service_module
+
+
+def make_client():
+    def declare_queue(name, **kwargs):
+        queue = MagicMock()
+        queue.name = name
+        queue.consume = AsyncMock(return_value="ctag")
+        return queue
+    exchange = MagicMock()
+    exchange.publish = AsyncMock()
+    channel = MagicMock()
+    channel.declare_queue = AsyncMock(side_effect=declare_queue)
+    channel.get_exchange = AsyncMock(return_value=exchange)
+    connection = MagicMock()
+    connection.channel = AsyncMock(return_value=channel)
+    return TaskClient(connection, "billing"), exchange
+
+
+async def reply_to_published(client: TaskClient, exchange, status: str, **outcome):
+    while not exchange.publish.await_count:
+        await asyncio.sleep(0)
+    message = exchange.publish.await_args.args[0]
+    assert message.reply_to == client.reply_queue_name
+    assert message.headers["correlation_id"] == message.correlation_id
+    await client._on_reply(task_reply_message(message.correlation_id, "task-1", "resize", status, **outcome))
+
+
+@pytest.mark.asyncio
+async def test_submit_task_returns_result():
+    client, exchange = make_client()
+    await client.start()
+
+    submitted = asyncio.create_task(client.submit_task("resize", {"width": 10}, timeout=1))
+    await reply_to_published(client, exchange, "completed", result={"resized": True})
+
+    assert await submitted == {"resized": True}
+    assert exchange.publish.await_args.kwargs["routing_key"] == "routing.task.resize"
+
+
+class BrokerChannel:
+    """Broker side of a channel, refusing client-declared amq.* queue names like RabbitMQ"""
+
+    def __init__(self):
+        self.declared = []
+        self.consumers = {}
+
+    async def queue_declare(self, queue, **kwargs):
+        if queue.startswith("amq."):
+            raise PermissionError(f"ACCESS_REFUSED - queue name '{queue}' contains reserved prefix 'amq.*'")
+        name = queue or f"amq.gen-{len(self.declared)}"
+        self.declared.append(name)
+        return SimpleNamespace(queue=name)
+
+    async def basic_consume(self, queue, consumer_callback, consumer_tag=None, **kwargs):
+        self.consumers[queue] = consumer_callback
+        return SimpleNamespace(consumer_tag=consumer_tag or f"ctag-{queue}")
+
+
+@pytest.mark.asyncio
+async def test_reply_queue_is_restored_after_a_reconnect():
+    broker = BrokerChannel()
+    channel = MagicMock()
+    channel.get_underlay_channel = AsyncMock(return_value=broker)
+    channel.get_exchange = AsyncMock(return_value=MagicMock(publish=AsyncMock()))
+
+    async def declare_queue(name=None, **kwargs):
+        # What a robust channel does, it restores the queue on reconnect
+        queue = RobustQueue(channel, name, **kwargs)
+        await queue.declare()
+        return queue
+    channel.declare_queue = declare_queue
+    connection = MagicMock()
+    connection.channel = AsyncMock(return_value=channel)
+    client = TaskClient(connection, "billing")
+    await client.start()
+
+    # The exclusive queue died with the old connection, the new one declares it again
+    broker.consumers.clear()
+    await client._reply_queue.restore()
+
+    assert broker.declared == [client.reply_queue_name] * 2
+    assert client.reply_queue_name.startswith("reply.billing.")
+    assert client._reply_queue.name in broker.consumers
+
+
+@pytest.mark.asyncio
+async def test_submit_task_raises_failure():
+    client, exchange = make_client()
+    await client.start()
+
+    submitted = asyncio.create_task(client.submit_task("resize", {"width": 10}, timeout=1))
+    await reply_to_published(client, exchange, "failed", error="boom")
+
+    with pytest.raises(TaskFailedException, match="boom"):
+        await submitted
+
+
+@pytest.mark.asyncio
+async def test_service_replies_to_reply_to():
+    service = RabbitMQService(ConfigModel("amqp://localhost", "sqlite+aiosqlite:///:memory:"))
+    service._reply_exchange = MagicMock()
+    service._reply_exchange.publish = AsyncMock()
+    message = MagicMock(reply_to="amq.gen-reply", correlation_id="corr-1")
+
+    await service._reply(message, "resize", TaskOutcome("task-1", Status.COMPLETED, {"resized": True}))
+
+    reply = service._reply_exchange.publish.await_args.args[0]
+    assert reply.correlation_id == "corr-1"
+    assert service._reply_exchange.publish.await_args.kwargs["routing_key"] == "amq.gen-reply"
+
+
+class FakeBroker:
+    """Records declares and bindings, and routes like RabbitMQ's direct exchanges"""
+
+    def __init__(self):
+        self.exchange_types = {}
+        self.bindings = []
+
+    def connect(self):
+        broker = self
+
+        def make_channel():
+            channel = MagicMock()
+            channel.set_qos = AsyncMock()
+
+            async def declare_exchange(name, type, durable=False):
+                broker.exchange_types[name] = type
+
+            async def declare_queue(name, durable=False, arguments=None):
+                queue = MagicMock()
+                queue.name = name
+                queue.consume = AsyncMock(return_value=f"tag-{name}")
+                queue.cancel = AsyncMock()
+
+                async def bind(exchange, routing_key):
+                    broker.bindings.append((exchange, routing_key, name))
+                queue.bind = bind
+                return queue
+            channel.declare_exchange = declare_exchange
+            channel.declare_queue = declare_queue
+            return channel
+
+        connection = MagicMock()
+        connection.channel = AsyncMock(side_effect=make_channel)
+        connection.close = AsyncMock()
+        return connection
+
+    def route(self, exchange: str, routing_key: str) -> set:
+        assert self.exchange_types[exchange] == ExchangeType.DIRECT
+        return {queue for bound, key, queue in self.bindings if bound == exchange and key == routing_key}
+
+
+@pytest.fixture
+def tasks_package(make_tasks_package):
+    return make_tasks_package("client_test_tasks", {
+        "resize": "async def execute(payload):\n    return payload\n",
+        "export": "DEDICATED_QUEUE = True\nasync def execute(payload):\n    return payload\n",
+    })
+
+
+@pytest.mark.asyncio
+async def test_submitted_tasks_reach_the_service_queues(tasks_package, monkeypatch):
+    broker = FakeBroker()
+    monkeypatch.setattr(service_module, "connect_robust", AsyncMock(return_value=broker.connect()))
+    service = RabbitMQService(ConfigModel("amqp://localhost", "sqlite+aiosqlite:///:memory:", tasks_folder="client_test_tasks"))
+    service.task_registry.load()
+    # Stopped before it starts: setup_rabbitmq declares everything and returns
+    service.stop()
+    await service.setup_rabbitmq()
+
+    client, exchange = make_client()
+    await client.start()
+    for task_name, queue in (("resize", "tasks"), ("export", "tasks.export")):
+        exchange.publish.reset_mock()
+        submitted = asyncio.create_task(client.submit_task(task_name, {}, timeout=1))
+        await reply_to_published(client, exchange, "completed")
+        await submitted
+        assert broker.route(TASK_EXCHANGE, exchange.publish.await_args.kwargs["routing_key"]) == {queue}
+
+
+@pytest.mark.asyncio
+async def test_status_is_stored_before_the_reply(tmp_path):
+    service = RabbitMQService(ConfigModel("amqp://localhost", f"sqlite+aiosqlite:///{tmp_path / 'store.db'}"))
+    await service.init_db()
+    service.task_registry.get = MagicMock(return_value=TaskDefinition("resize", module=None, execute=None, mtime=None))
+    # Not JSON serializable, neither the task store nor the reply can hold it
+    service.task_executor.run = AsyncMock(return_value={"at": object()})
+    replies = []
+
+    async def publish(reply, routing_key):
+        async with service.async_session() as session:
+            stored = (await session.scalars(select(TaskStore))).one()
+        replies.append((json.loads(reply.body), stored.status))
+    service._reply_exchange = MagicMock()
+    service._reply_exchange.publish = publish
+
+    message = task_message("resize", {}, reply_to="amq.gen-reply")
+    try:
+        await service._process_task(message)
+    finally:
+        await service.storage.close()
+
+    [(reply, stored_status)] = replies
+    assert stored_status == Status.FAILED
+    assert reply["status"] == "failed" and "not JSON serializable" in reply["error"]
@@ -0,0 +1,66 @@
+import pytest
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from models import Status, TaskStore
+from service import ConfigModel, RabbitMQService
+
+
+@pytest.fixture
+async def service(tmp_path):
+    service = RabbitMQService(ConfigModel(
+        "amqp://localhost", f"sqlite+aiosqlite:///{tmp_path / 'store.db'}",
+        task_status_write_behind=True, task_status_batch_size=2, task_status_linger_ms=60000
+    ))
+    await service.init_db()
+    yield service
+    await service.storage.close()
+
+
+async def stored_statuses(service, tasks):
+    async with service.async_session() as session:
+        return [(await session.get(TaskStore, task.id_task)).status for task in tasks]
+
+
+async def store_tasks(service, count: int):
+    return [await service.store_task("app", f"corr-{i}", "resize", {"width": i}) for i in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_statuses_are_written_as_one_batch(service):
+    tasks = await store_tasks(service, 2)
+    service.storage.update_task_statuses = AsyncMock(wraps=service.storage.update_task_statuses)
+
+    await service._finish_task(tasks[0].id_task, Status.COMPLETED, result={"ok": True})
+    await service._finish_task(tasks[1].id_task, Status.FAILED, error="boom")
+
+    service.storage.update_task_statuses.assert_awaited_once()
+    assert await stored_statuses(service, tasks) == [Status.COMPLETED, Status.FAILED]
+
+
+@pytest.mark.asyncio
+async def test_status_lands_when_the_batch_fails(service):
+    tasks = await store_tasks(service, 2)
+    service.storage.update_task_statuses = AsyncMock(side_effect=RuntimeError("deadlock"))
+    service.storage.update_task_status = AsyncMock(wraps=service.storage.update_task_status)
+
+    await service._finish_task(tasks[0].id_task, Status.COMPLETED, result={"ok": True})
+    await service._finish_task(tasks[1].id_task, Status.COMPLETED, result={"ok": True})
+
+    assert service.storage.update_task_status.await_count == 2
+    assert await stored_statuses(service, tasks) == [Status.COMPLETED, Status.COMPLETED]
+
+
+@pytest.mark.asyncio
+async def test_buffered_status_lands_on_stop(service):
+    tasks = await store_tasks(service, 1)
+    await service._finish_task(tasks[0].id_task, Status.COMPLETED, result={"ok": True})
+    assert await stored_statuses(service, tasks) == [Status.PENDING]
+
+    # What setup_rabbitmq does on stop, before the storage is closed
+    await service.task_status_batcher.close()
+
+    assert await stored_statuses(service, tasks) == [Status.COMPLETED]
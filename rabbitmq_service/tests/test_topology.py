@@ -0,0 +1,154 @@
+import pytest
+import asyncio
+import json
+import sys
+from pathlib import Path
+from pydantic import BaseModel
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+from event_driven.events_driven_utils import event_object
+from event_driven.events_initialization import (
+    EventType, MAX_RETRIES, MAX_TASK_PRIORITY, create_attempt_queues_event, create_event, create_event_exchange,
+    create_task
+)
+from event_driven.runtime import ServiceRuntime
+from event_driven.topology import TopologyRegistry, event_topology, sync_topology, task_topology, topology_registry
+
+ROUND_TRIP = 0.005
+
+
+class InFlight:
+    """Round trips outstanding across channels, and the most seen at once"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+
+class RecordingChannel:
+    """Channel answering every declare after a round trip, one at a time like a real channel"""
+
+    def __init__(self, declared: set, in_flight: InFlight | None = None):
+        self.declared = declared
+        self.in_flight = in_flight or InFlight()
+        self._lock = asyncio.Lock()
+
+    async def _round_trip(self, record):
+        async with self._lock:
+            self.in_flight.current += 1
+            self.in_flight.peak = max(self.in_flight.peak, self.in_flight.current)
+            try:
+                await asyncio.sleep(ROUND_TRIP)
+            finally:
+                self.in_flight.current -= 1
+            self.declared.add(record)
+
+    async def declare_exchange(self, name, type, durable=False):
+        await self._round_trip(("exchange", name, type.value, durable))
+
+    async def get_exchange(self, name):
+        return name
+
+    async def declare_queue(self, name, durable=False, arguments=None):
+        await self._round_trip(("queue", name, durable, tuple(sorted((arguments or {}).items()))))
+        channel = self
+
+        class Queue:
+            async def bind(self, exchange, routing_key, arguments=None):
+                await channel._round_trip(("binding", name, exchange, routing_key))
+        return Queue()
+
+
+@pytest.mark.asyncio
+async def test_topology_matches_sequential_declares_and_runs_concurrently():
+    sequential, sequential_in_flight = set(), InFlight()
+    channel = RecordingChannel(sequential, sequential_in_flight)
+    await create_event_exchange(channel)
+    for event_type in EventType:
+        await create_event(channel, "order", "billing", event_type)
+        await create_attempt_queues_event(channel, event_type, "order", "billing", MAX_RETRIES)
+
+    concurrent, concurrent_in_flight = set(), InFlight()
+    result = await sync_topology(
+        [RecordingChannel(concurrent, concurrent_in_flight) for _ in range(4)],
+        event_topology("order", "billing", set(EventType))
+    )
+
+    assert concurrent == sequential
+    assert not result.skipped
+    # Every channel had a declare outstanding at once, instead of one at a time
+    assert sequential_in_flight.peak == 1
+    assert concurrent_in_flight.peak == 4
+
+
+@pytest.mark.asyncio
+async def test_unchanged_fingerprint_skips_declaring(tmp_path):
+    fingerprint_path = str(tmp_path / "topology.sha256")
+    declared = set()
+    topology = event_topology("order", "billing", {EventType.CREATE})
+
+    first = await sync_topology(RecordingChannel(declared), topology, fingerprint_path)
+    declared.clear()
+    second = await sync_topology(RecordingChannel(declared), topology, fingerprint_path)
+    assert not first.skipped and second.skipped
+    assert second.fingerprint == first.fingerprint
+    assert declared == set()
+
+    changed = event_topology("order", "billing", {EventType.CREATE, EventType.DELETE})
+    assert not (await sync_topology(RecordingChannel(declared), changed, fingerprint_path)).skipped
+    assert declared
+
+
+@pytest.mark.asyncio
+async def test_task_queue_priority_is_opt_in():
+    def max_priorities(declared):
+        return [dict(record[3]).get("x-max-priority") for record in declared if record[:2] == ("queue", "task.send.invoice")]
+
+    for max_priority in (None, MAX_TASK_PRIORITY):
+        sequential, concurrent = set(), set()
+        await create_task(RecordingChannel(sequential), "send", "invoice", max_priority=max_priority)
+        await sync_topology(RecordingChannel(concurrent), task_topology("send", "invoice", max_priority=max_priority))
+        assert max_priorities(sequential) == max_priorities(concurrent) == [max_priority]
+
+    # Queues declared before priorities existed must still match the defaults
+    default = set()
+    await create_task(RecordingChannel(default), "send", "invoice")
+    assert max_priorities(default) == [None]
+
+
+def test_registry_exports_definitions_and_diffs_snapshots(tmp_path):
+    @event_object(runtime=ServiceRuntime.from_settings({"service_name": "billing"}))
+    class Invoice(BaseModel):
+        invoice_id: int
+
+    assert topology_registry.event_objects["invoice"] is Invoice
+
+    registry = TopologyRegistry()
+    registry.add_event_object(Invoice)
+    registry.add_subscription(Invoice, {EventType.CREATE})
+    registry.add_task("send", "invoice")
+    assert registry.routing_table()[("create", "invoice")] == "routing.event.create.invoice.#"
+
+    path = str(tmp_path / "definitions.json")
+    definitions = registry.export_definitions(path)
+    with open(path) as f:
+        assert json.load(f) == definitions
+    queue_names = {queue["name"] for queue in definitions["queues"]}
+    assert {"event.create.invoice.to.billing", "task.send.invoice", "dead.task.send.invoice"} <= queue_names
+    assert registry.diff_definitions(path).in_sync
+
+    # Broker snapshot with a queue missing, another with other arguments and an unrelated one
+    snapshot = json.loads(json.dumps(definitions))
+    snapshot["queues"] = [queue for queue in snapshot["queues"] if queue["name"] != "dead.task.send.invoice"]
+    for queue in snapshot["queues"]:
+        if queue["name"] == "task.send.invoice":
+            queue["arguments"]["x-max-priority"] = 5
+    snapshot["queues"].append({"name": "legacy", "vhost": "/", "durable": True, "arguments": {}})
+    snapshot["queues"].append({"name": "other.vhost", "vhost": "staging", "durable": True, "arguments": {}})
+
+    diff = registry.diff_definitions(snapshot)
+    assert not diff.in_sync
+    assert diff.missing_queues == ["dead.task.send.invoice"]
+    assert diff.changed_queues == ["task.send.invoice"]
+    assert diff.extra_queues == ["legacy"]